@@ -116,36 +116,66 @@ EMAIL_ADMIN = "admin@swipetonpro.fr"
 client = AsyncIOMotorClient(MONGO_URL)
 db = client[DB_NAME]
 
+# Cache des admins authentifiés (clé : id admin)
+from backend.cache import TTLCache
+
+ADMIN_CACHE_TTL_SECONDS = float(os.getenv("ADMIN_CACHE_TTL_SECONDS", "30"))
+ADMIN_CACHE_MAX_SIZE = int(os.getenv("ADMIN_CACHE_MAX_SIZE", "1024"))
+admin_principal_cache = TTLCache(maxsize=ADMIN_CACHE_MAX_SIZE, ttl=ADMIN_CACHE_TTL_SECONDS)
+
+def invalidate_admin_principal(admin_id: str):
+    admin_principal_cache.invalidate(admin_id)
+
+# Compteurs matérialisés (lecture O(1) pour /stats)
+from backend.platform_counters import PlatformCounters, counter_value
+
+platform_counters = PlatformCounters(db)
+
+# Pagination par curseur (created_at, id)
+from backend.pagination import InvalidCursor, paginate
+
 # --- Configuration Boost Swipe ---
 DEFAULT_BOOST_COST = 5  # crédits
 DEFAULT_BOOST_ENABLED = False
+DEFAULT_BOOST_DURATION_MINUTES = 60
 
 # Collection de configuration boost (1 document global, ou par pro)
+from backend.boost_config import BoostConfigCache
+
+BOOST_CONFIG_CACHE_TTL_SECONDS = float(os.getenv("BOOST_CONFIG_CACHE_TTL_SECONDS", "60"))
+boost_config_cache = BoostConfigCache(
+    db.boost_configs,
+    defaults={"cost": DEFAULT_BOOST_COST, "enabled": DEFAULT_BOOST_ENABLED,
+              "duration_minutes": DEFAULT_BOOST_DURATION_MINUTES},
+    ttl=BOOST_CONFIG_CACHE_TTL_SECONDS,
+)
+
 async def get_boost_config(pro_id: Optional[str] = None):
-    if pro_id:
-        conf = await db.boost_configs.find_one({"pro_id": pro_id})
-        if conf:
-            return conf
-    conf = await db.boost_configs.find_one({"pro_id": None})
-    if conf:
-        return conf
-    # Valeurs par défaut si rien en base
-    return {"cost": DEFAULT_BOOST_COST, "enabled": DEFAULT_BOOST_ENABLED}
+    return await boost_config_cache.get(pro_id)
 
-async def set_boost_config(cost: int = None, enabled: bool = None, pro_id: Optional[str] = None):
+async def set_boost_config(cost: int = None, enabled: bool = None, pro_id: Optional[str] = None,
+                           duration_minutes: int = None):
     update = {}
     if cost is not None:
         update["cost"] = cost
     if enabled is not None:
         update["enabled"] = enabled
+    if duration_minutes is not None:
+        update["duration_minutes"] = duration_minutes
     if not update:
         return
     await db.boost_configs.update_one({"pro_id": pro_id}, {"$set": update}, upsert=True)
+    boost_config_cache.invalidate(pro_id)
 
 # Security
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
+# Hachage bcrypt hors de la boucle événementielle
+from backend.passwords import AsyncPasswordHasher, PasswordServiceBusy
+
+password_hasher = AsyncPasswordHasher(pwd_context)
+
 # App
 app = FastAPI(title="Career Tinder Admin", docs_url="/docs", redoc_url="/redoc")
 
@@ -203,6 +233,80 @@ async def purchase_credits(
         await log_action(pro_id, "purchase_credits_checkout_error", {"credits": credits, "error": str(e)}, request=request, status_code=500)
         raise HTTPException(status_code=500, detail="Erreur lors de la création de la session de paiement.")
 
+# --- Solde de crédits (grand livre append-only + solde matérialisé) ---
+from backend.credits import CreditLedger, InsufficientCredits
+
+credit_ledger = CreditLedger(db)
+
+@app.on_event("startup")
+async def repair_credit_ledger():
+    # Termine les écritures du grand livre interrompues par un arrêt brutal
+    repaired = await credit_ledger.repair()
+    if repaired:
+        logging.getLogger(__name__).warning("%d écritures de crédits réparées", repaired)
+
+@app.get("/credits")
+async def get_credits(
+    limit: int = Query(20, ge=1, le=100),
+    current_admin = Depends(get_current_admin)
+):
+    """
+    Solde de crédits du pro (une lecture) et ses derniers mouvements.
+    """
+    pro_id = current_admin["id"]
+    return {
+        "balance": await credit_ledger.balance(pro_id),
+        "history": await credit_ledger.history(pro_id, limit),
+    }
+
+# --- Achat d'un boost (fenêtre starts_at -> ends_at, activée par BoostScheduler côté API) ---
+from backend.boost_scheduler import new_boost
+
+class BoostPurchase(BaseModel):
+    starts_at: Optional[datetime] = None
+
+@app.post("/swipe/boost")
+async def purchase_boost(
+    purchase: Optional[BoostPurchase] = None,
+    request: Request = None,
+    current_admin = Depends(get_current_admin)
+):
+    """
+    Débite le coût du boost et enregistre sa fenêtre d'activation.
+    """
+    pro_id = current_admin["id"]
+    pro = await db.users.find_one({"id": pro_id, "is_professional": True}, {"_id": 0, "id": 1})
+    if not pro:
+        await log_action(pro_id, "purchase_boost_forbidden", {}, request=request, status_code=403)
+        raise HTTPException(status_code=403, detail="Seuls les pros peuvent acheter un boost.")
+
+    conf = await get_boost_config(pro_id)
+    if not conf["enabled"]:
+        raise HTTPException(status_code=403, detail="Le boost n'est pas disponible.")
+
+    cost = conf["cost"]
+    starts_at = purchase.starts_at if purchase else None
+    boost = new_boost(pro_id, timedelta(minutes=conf["duration_minutes"]), starts_at, cost=cost)
+    # Débit conditionnel sur le solde matérialisé : jamais de solde négatif, même avec des achats simultanés
+    try:
+        await credit_ledger.debit(pro_id, cost, "boost", ref=boost["id"])
+    except InsufficientCredits:
+        await log_action(pro_id, "purchase_boost_insufficient_credits", {"cost": cost}, request=request, status_code=402)
+        raise HTTPException(status_code=402, detail="Crédits insuffisants pour acheter un boost.")
+
+    try:
+        await db.boosts.insert_one(dict(boost))
+    except Exception:
+        await credit_ledger.credit(pro_id, cost, "boost_refund", ref=boost["id"])
+        raise
+    await log_action(pro_id, "purchase_boost", {"boost_id": boost["id"], "cost": cost}, request=request, status_code=200)
+    return {
+        "boost_id": boost["id"],
+        "starts_at": boost["starts_at"],
+        "ends_at": boost["ends_at"],
+        "cost": cost,
+    }
+
 # --- Gestion centralisée des erreurs ---
 from fastapi.responses import JSONResponse
 from fastapi.exception_handlers import RequestValidationError
@@ -233,6 +337,18 @@ async def validation_exception_handler(request, exc):
         },
     )
 
+@app.exception_handler(PasswordServiceBusy)
+async def password_service_busy_handler(request, exc):
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": "1"},
+        content={
+            "success": False,
+            "error": "service_busy",
+            "message": "Trop de connexions en cours. Merci de réessayer dans un instant."
+        },
+    )
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     return JSONResponse(
@@ -261,6 +377,24 @@ class AdminLogin(BaseModel):
 
 
 from fastapi import Request
+from backend.audit_log import AuditLogWriter
+
+# Journal d'audit écrit par lots en arrière-plan
+audit_log_writer = AuditLogWriter(
+    db.logs,
+    max_queue=int(os.getenv("AUDIT_LOG_MAX_QUEUE", "10000")),
+    batch_size=int(os.getenv("AUDIT_LOG_BATCH_SIZE", "200")),
+    flush_interval=float(os.getenv("AUDIT_LOG_FLUSH_INTERVAL", "0.5")),
+    overflow=os.getenv("AUDIT_LOG_OVERFLOW", "drop")
+)
+
+@app.on_event("startup")
+async def start_audit_log_writer():
+    audit_log_writer.start()
+
+@app.on_event("shutdown")
+async def stop_audit_log_writer():
+    await audit_log_writer.stop()
 
 def get_log_action():
     # Pour éviter les problèmes d'import, on définit la fonction après l'init de db
@@ -273,7 +407,7 @@ def get_log_action():
             meta["method"] = request.method
         if status_code:
             meta["status_code"] = status_code
-        await db.logs.insert_one({
+        await audit_log_writer.enqueue({
             "user_id": user_id,
             "action": action,
             "details": details or {},
@@ -293,7 +427,7 @@ async def login_admin(data: AdminLogin, request: Request):
         await log_action(None, "login_blocked", {"email": data.email}, request=request, status_code=429)
         raise HTTPException(status_code=429, detail="Trop de tentatives. Réessayez dans 15 minutes.")
     admin = await db.admins.find_one({"email": data.email})
-    if not admin or not verify_password(data.password, admin["password_hash"]):
+    if not admin or not await verify_password(data.password, admin["password_hash"]):
         register_attempt(data.email.lower())
         await log_action(None, "login_failed", {"email": data.email}, request=request, status_code=401)
         raise HTTPException(status_code=401, detail="Identifiants invalides")
@@ -343,8 +477,8 @@ class DocumentValidationRequest(BaseModel):
     comment: str = ""
 
 # Utility functions
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    return await password_hasher.verify(plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
@@ -371,10 +505,15 @@ async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(
     except jwt.PyJWTError:
         raise credentials_exception
     
-    admin = await db.admins.find_one({"id": admin_id})
+    admin = admin_principal_cache.get(admin_id)
     if admin is None:
+        admin = await db.admins.find_one({"id": admin_id})
+        if admin is None:
+            raise credentials_exception
+        admin_principal_cache.set(admin_id, admin)
+    if not admin.get("is_active", True):
         raise credentials_exception
-    return admin
+    return dict(admin)
 
 # Models
 class AdminLogin(BaseModel):
@@ -419,18 +558,17 @@ async def get_current_admin_profile(current_admin = Depends(get_current_admin)):
 
 @app.get("/stats")
 async def get_platform_stats(current_admin = Depends(get_current_admin)):
-    total_users = await db.users.count_documents({})
-    total_professionals = await db.users.count_documents({"is_professional": True})
-    total_admins = await db.admins.count_documents({})
-    total_reports = await db.reports.count_documents({}) if 'reports' in await db.list_collection_names() else 0
-    pending_reports = await db.reports.count_documents({"status": "pending"}) if 'reports' in await db.list_collection_names() else 0
+    counters = await platform_counters.read()
     
     return {
-        "total_users": total_users,
-        "total_professionals": total_professionals,
-        "total_admins": total_admins,
-        "total_reports": total_reports,
-        "pending_reports": pending_reports,
+        "total_users": counter_value(counters, "users"),
+        "total_professionals": counter_value(counters, "users", "is_professional", True),
+        "total_admins": counter_value(counters, "admins"),
+        "total_reports": counter_value(counters, "reports"),
+        "pending_reports": counter_value(counters, "reports", "status", "pending"),
+        "total_tickets": counter_value(counters, "support_tickets"),
+        "open_tickets": counter_value(counters, "support_tickets", "status", "open"),
+        "urgent_tickets": counter_value(counters, "support_tickets", "priority", "urgent"),
         "stats_generated_at": datetime.utcnow()
     }
 
@@ -438,11 +576,15 @@ async def get_platform_stats(current_admin = Depends(get_current_admin)):
 async def list_users(
     page: int = 1,
     limit: int = 20,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
     current_admin = Depends(get_current_admin)
 ):
-    skip = (page - 1) * limit
-    users = await db.users.find().skip(skip).limit(limit).to_list(limit)
-    total = await db.users.count_documents({})
+    try:
+        result = await paginate(db.users, {}, limit, cursor=cursor, page=page, include_total=include_total)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+    users = result["items"]
     
     return {
         "users": [
@@ -458,9 +600,22 @@ async def list_users(
             }
             for user in users
         ],
-        "total": total,
+        "total": result.get("total"),
         "page": page,
-        "limit": limit
+        "limit": limit,
+        "next_cursor": result["next_cursor"],
+        "has_more": result["has_more"]
+    }
+
+@app.get("/system/metrics")
+async def system_metrics(current_admin = Depends(get_current_admin)):
+    check_admin_permission(current_admin, required_role="super_admin")
+    return {
+        "admin_principal_cache": admin_principal_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "audit_log": audit_log_writer.stats(),
+        "boost_config_cache": boost_config_cache.stats(),
+        "timestamp": datetime.utcnow()
     }
 
 @app.get("/admins")
@@ -499,9 +654,10 @@ async def create_support_admin(invite_data: AdminInvite, request: Request, curre
         "permissions": invite_data.permissions or [],
         "created_at": datetime.utcnow(),
         "is_active": True,
-        "password_hash": pwd_context.hash(str(uuid.uuid4())) # mot de passe temporaire à réinitialiser
+        "password_hash": await password_hasher.hash(str(uuid.uuid4())) # mot de passe temporaire à réinitialiser
     }
     await db.admins.insert_one(new_admin)
+    await platform_counters.record_insert("admins", new_admin)
     await log_action(
         current_admin["id"],
         "admin_create",
@@ -523,6 +679,7 @@ async def update_admin_permissions(admin_id: str, update: AdminPermissionsUpdate
     if result.matched_count == 0:
         await log_action(current_admin["id"], "admin_update_permissions_not_found", {"target_admin_id": admin_id}, request=request, status_code=404)
         raise HTTPException(status_code=404, detail="Admin non trouvé")
+    invalidate_admin_principal(admin_id)
     await log_action(
         current_admin["id"],
         "admin_update_permissions",
@@ -534,14 +691,33 @@ async def update_admin_permissions(admin_id: str, update: AdminPermissionsUpdate
     )
     return {"message": "Droits mis à jour"}
 
+# Désactiver un admin support
+@app.put("/admins/{admin_id}/deactivate")
+async def deactivate_admin(admin_id: str, request: Request, current_admin = Depends(get_current_admin)):
+    check_admin_permission(current_admin, required_role="super_admin")
+    result = await db.admins.update_one({"id": admin_id}, {"$set": {"is_active": False}})
+    if result.matched_count == 0:
+        await log_action(current_admin["id"], "admin_deactivate_not_found", {"target_admin_id": admin_id}, request=request, status_code=404)
+        raise HTTPException(status_code=404, detail="Admin non trouvé")
+    invalidate_admin_principal(admin_id)
+    await log_action(
+        current_admin["id"],
+        "admin_deactivate",
+        {"target_admin_id": admin_id},
+        request=request, status_code=200
+    )
+    return {"message": "Admin désactivé"}
+
 # Supprimer un admin support
 @app.delete("/admins/{admin_id}")
 async def delete_admin(admin_id: str, request: Request, current_admin = Depends(get_current_admin)):
     check_admin_permission(current_admin, required_role="super_admin")
-    result = await db.admins.delete_one({"id": admin_id})
-    if result.deleted_count == 0:
+    deleted = await db.admins.find_one_and_delete({"id": admin_id})
+    if deleted is None:
         await log_action(current_admin["id"], "admin_delete_not_found", {"target_admin_id": admin_id}, request=request, status_code=404)
         raise HTTPException(status_code=404, detail="Admin non trouvé")
+    invalidate_admin_principal(admin_id)
+    await platform_counters.record_delete("admins", deleted)
     await log_action(
         current_admin["id"],
         "admin_delete",
@@ -596,12 +772,6 @@ async def validate_document(document_id: str, req: DocumentValidationRequest, cu
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Document non trouvé")
     return {"message": f"Document {req.status}"}
-    if current_admin.get("role") != "super_admin":
-        raise HTTPException(status_code=403, detail="Seul le super_admin peut supprimer un admin.")
-    result = await db.admins.delete_one({"id": admin_id})
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Admin non trouvé")
-    return {"message": "Admin supprimé"}
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark : latence de la boucle événementielle pendant 50 connexions simultanées
+
+Compare la vérification bcrypt exécutée directement dans la coroutine
+(comportement historique) avec AsyncPasswordHasher.
+
+    python -m backend.bench_password_hashing [--logins 50] [--workers 4]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from passlib.context import CryptContext
+
+from backend.passwords import AsyncPasswordHasher
+
+TICK_SECONDS = 0.005
+
+
+async def measure_loop_lag(stop: asyncio.Event, samples: list):
+    """Mesure le retard de réveil d'une tâche qui dort TICK_SECONDS"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        samples.append((time.perf_counter() - start - TICK_SECONDS) * 1000)
+
+
+async def run_scenario(verify, logins: int):
+    samples = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(measure_loop_lag(stop, samples))
+    await asyncio.sleep(TICK_SECONDS * 2)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(verify() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await probe
+    samples.sort()
+    return {
+        "total_s": elapsed,
+        "lag_p50_ms": statistics.median(samples) if samples else 0.0,
+        "lag_p99_ms": samples[int(len(samples) * 0.99) - 1] if samples else 0.0,
+        "lag_max_ms": samples[-1] if samples else 0.0,
+    }
+
+
+async def main(logins: int, workers: int):
+    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    hashed = pwd_context.hash("admin123")
+    hasher = AsyncPasswordHasher(pwd_context, max_workers=workers, max_pending=logins)
+
+    async def inline_verify():
+        return pwd_context.verify("admin123", hashed)
+
+    async def offloaded_verify():
+        return await hasher.verify("admin123", hashed)
+
+    results = {
+        "inline (avant)": await run_scenario(inline_verify, logins),
+        "executor (après)": await run_scenario(offloaded_verify, logins),
+    }
+    hasher.shutdown()
+
+    print(f"{logins} connexions simultanées, {workers} workers")
+    print(f"{'scénario':<18} {'total (s)':>10} {'lag p50 (ms)':>13} {'lag p99 (ms)':>13} {'lag max (ms)':>13}")
+    for name, r in results.items():
+        print(f"{name:<18} {r['total_s']:>10.2f} {r['lag_p50_ms']:>13.1f} {r['lag_p99_ms']:>13.1f} {r['lag_max_ms']:>13.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.workers))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark : classement des candidats du deck
+
+Compare le score calculé document par document (Python pur) avec le
+classement vectorisé NumPy de backend.ranking, tri compris. La colonne
+« score+tri » exclut l'extraction des caractéristiques depuis les documents.
+
+    python -m backend.bench_ranking [--sizes 1000 10000 100000] [--repeat 5]
+"""
+
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from backend.ranking import DEFAULT_WEIGHTS, CandidateFeatures, rank, score_features, score_python
+
+CENTER = (2.35, 48.85)
+
+
+def make_candidates(n: int, now: datetime):
+    rng = random.Random(n)
+    return [
+        {
+            "id": f"artisan-{i}",
+            "rating": round(rng.uniform(0, 5), 1),
+            "verified": rng.random() < 0.3,
+            "geo": {"type": "Point", "coordinates": [CENTER[0] + rng.uniform(-1, 1), CENTER[1] + rng.uniform(-1, 1)]},
+            "profile_data": {"experience_years": rng.randint(0, 40)},
+            "created_at": now - timedelta(days=rng.uniform(0, 400)),
+        }
+        for i in range(n)
+    ]
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main(sizes, repeat: int):
+    now = datetime.utcnow()
+    print(f"{'candidats':>10} {'python (ms)':>12} {'numpy (ms)':>11} {'score+tri (ms)':>15} {'gain':>6}")
+    for n in sizes:
+        docs = make_candidates(n, now)
+        boosted = {doc["id"] for doc in docs[::50]}
+
+        def python_rank():
+            scores = {doc["id"]: score_python(doc, DEFAULT_WEIGHTS, CENTER, boosted, now) for doc in docs}
+            sorted(docs, key=lambda doc: (-scores[doc["id"]], doc["id"]))
+
+        python_ms = timed(python_rank, repeat)
+        numpy_ms = timed(lambda: rank(docs, DEFAULT_WEIGHTS, CENTER, boosted, now), repeat)
+        features = CandidateFeatures.from_documents(docs, boosted, now)
+        ids = np.array(features.ids)
+        score_ms = timed(lambda: np.lexsort((ids, -score_features(features, DEFAULT_WEIGHTS, CENTER))), repeat)
+        print(f"{n:>10} {python_ms:>12.1f} {numpy_ms:>11.1f} {score_ms:>15.1f} {python_ms / numpy_ms:>5.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    main(args.sizes, args.repeat)
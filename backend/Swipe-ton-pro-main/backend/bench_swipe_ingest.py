@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark : débit d'ingestion des swipes sur un worker
+
+Envoie --swipes swipes répartis sur --users particuliers via SwipeIngestor
+(sans la couche HTTP) et mesure le débit d'acquittement et le débit
+d'écriture jusqu'à ce que tout soit en base. Utilise une base jetable
+(DB_NAME + "_bench_swipes"), supprimée à la fin.
+
+    MONGO_URL=mongodb://localhost:27017 python -m backend.bench_swipe_ingest [--swipes 50000] [--batch 1]
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from backend.seen_filter import SeenSetStore
+from backend.swipe_ingest import SwipeIngestor
+
+
+async def client_loop(ingestor: SwipeIngestor, user_id: str, swipes: int, batch: int):
+    for start in range(0, swipes, batch):
+        await ingestor.submit(user_id, [
+            {"target_id": f"artisan-{i}", "direction": "right" if i % 3 else "left"}
+            for i in range(start, min(start + batch, swipes))
+        ])
+
+
+async def main(swipes: int, users: int, batch: int, durability: str):
+    client = AsyncIOMotorClient(os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    db_name = os.getenv("DB_NAME", "test_database") + "_bench_swipes"
+    db = client[db_name]
+    await client.drop_database(db_name)
+    ingestor = SwipeIngestor(db, SeenSetStore(db), durability=durability, max_queue=max(swipes, 1))
+    try:
+        ingestor.start()
+        start = time.perf_counter()
+        per_user = swipes // users
+        await asyncio.gather(*(client_loop(ingestor, f"user-{u}", per_user, batch) for u in range(users)))
+        acked = time.perf_counter() - start
+        while ingestor.written + ingestor.failed < per_user * users:
+            await asyncio.sleep(0.01)
+        written = time.perf_counter() - start
+        await ingestor.stop()
+
+        total = per_user * users
+        stats = ingestor.stats()
+        print(f"{total} swipes, {users} utilisateurs, lots de {batch}, mode {durability}")
+        print(f"  acquittement : {total / acked:,.0f} swipes/s")
+        print(f"  écriture     : {total / written:,.0f} swipes/s ({stats['flushes']} lots, max {stats['max_flush_ms']} ms)")
+        print(f"  en base      : {await db.swipes.count_documents({})}, échecs : {stats['failed']}")
+    finally:
+        await client.drop_database(db_name)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--swipes", type=int, default=50000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=1, help="swipes par appel (1 = POST /api/swipe)")
+    parser.add_argument("--durability", choices=["ack", "durable"], default="ack")
+    args = parser.parse_args()
+    asyncio.run(main(args.swipes, args.users, args.batch, args.durability))
@@ -0,0 +1,68 @@
+"""
+Cached boost configuration
+
+The boost_configs collection holds one global document ({"pro_id": None})
+and optional per-pro overrides. The effective configuration of a pro is
+defaults <- global <- override, field by field.
+
+A lookup reads the global document and the pro's override with at most
+one `$in` query; both (including "no override") are cached. Other workers
+see a change once their entry expires (`ttl`).
+"""
+
+from typing import Any, Dict, Iterable, Optional
+
+from backend.cache import TTLCache
+
+GLOBAL = None  # pro_id of the global document
+
+_MISSING = object()
+
+
+class BoostConfigCache:
+    def __init__(self, collection, defaults: Dict[str, Any], maxsize: int = 4096, ttl: float = 60.0):
+        self.collection = collection
+        self.defaults = dict(defaults)
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.queries = 0
+        self._generation = 0
+
+    async def get(self, pro_id: Optional[str] = None) -> Dict[str, Any]:
+        return (await self.get_many([pro_id]))[pro_id]
+
+    async def get_many(self, pro_ids: Iterable[Optional[str]]) -> Dict[Optional[str], Dict[str, Any]]:
+        """Effective configuration for every pro id (None for the global configuration)"""
+        pro_ids = list(dict.fromkeys(pro_ids))
+        overrides: Dict[Optional[str], Dict[str, Any]] = {}
+        missing = []
+        for key in dict.fromkeys([GLOBAL, *pro_ids]):
+            value = self.cache.get(key, _MISSING)
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                overrides[key] = value
+        if missing:
+            overrides.update(await self._load(missing))
+
+        base = {**self.defaults, **overrides[GLOBAL]}
+        return {pro_id: {**base, **overrides.get(pro_id, {})} for pro_id in pro_ids}
+
+    async def _load(self, keys) -> Dict[Optional[str], Dict[str, Any]]:
+        generation = self._generation
+        self.queries += 1
+        found = {}
+        async for doc in self.collection.find({"pro_id": {"$in": list(keys)}}, {"_id": 0}):
+            found[doc.pop("pro_id", GLOBAL)] = doc
+        loaded = {key: found.get(key, {}) for key in keys}
+        # An invalidation that raced with the query would be undone by caching its result
+        if generation == self._generation:
+            for key, value in loaded.items():
+                self.cache.set(key, value)
+        return loaded
+
+    def invalidate(self, pro_id: Optional[str] = None):
+        self._generation += 1
+        self.cache.invalidate(pro_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), "queries": self.queries}
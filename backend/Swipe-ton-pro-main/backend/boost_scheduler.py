@@ -0,0 +1,142 @@
+"""
+Time-windowed boosts
+
+A boost puts a pro in the boosted set of the deck ranker between
+`starts_at` and `ends_at`. Boost documents (the `boosts` collection) are
+the persisted state; each API process keeps its own schedule in two
+min-heaps (starts, ends) and wakes up exactly when the next boost starts or
+expires, so activation and expiry never poll the database.
+
+Boosts bought through another process are picked up by `sync()`, an
+indexed read of the boosts created since the last sync, every
+`sync_interval` seconds.
+"""
+
+import asyncio
+import heapq
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+_Event = Tuple[datetime, str, str]  # (time, boost id, pro id)
+
+
+def new_boost(pro_id: str, duration: timedelta, starts_at: Optional[datetime] = None,
+              cost: int = 0, **extra: Any) -> Dict[str, Any]:
+    now = datetime.utcnow()
+    starts_at = max(starts_at or now, now)
+    return {
+        "id": str(uuid.uuid4()),
+        "pro_id": pro_id,
+        "starts_at": starts_at,
+        "ends_at": starts_at + duration,
+        "cost": cost,
+        "created_at": now,
+        **extra,
+    }
+
+
+class BoostScheduler:
+    def __init__(self, collection, sync_interval: float = 5.0,
+                 clock: Callable[[], datetime] = datetime.utcnow):
+        self.collection = collection
+        self.sync_interval = sync_interval
+        self._clock = clock
+        self._starts: List[_Event] = []
+        self._ends: List[_Event] = []
+        self._scheduled: Set[str] = set()
+        self._active_counts: Dict[str, int] = {}
+        # Pro ids with at least one running boost: what the ranker reads
+        self.active: Set[str] = set()
+        # Bumped whenever `active` changes, so cached rankings know to refresh
+        self.version = 0
+        self._last_sync: Optional[datetime] = None
+        self._wakeup = asyncio.Event()
+
+    def is_boosted(self, pro_id: str) -> bool:
+        return pro_id in self.active
+
+    def schedule(self, boost: Dict[str, Any]) -> bool:
+        """Add a boost to the in-memory schedule; already known or expired boosts are ignored"""
+        if boost["id"] in self._scheduled or boost["ends_at"] <= self._clock():
+            return False
+        self._scheduled.add(boost["id"])
+        heapq.heappush(self._starts, (boost["starts_at"], boost["id"], boost["pro_id"]))
+        heapq.heappush(self._ends, (boost["ends_at"], boost["id"], boost["pro_id"]))
+        self._wakeup.set()
+        return True
+
+    def advance(self, now: Optional[datetime] = None) -> Optional[datetime]:
+        """Apply every start and expiry due at `now`; return the time of the next one"""
+        now = now or self._clock()
+        while self._starts and self._starts[0][0] <= now:
+            _, _, pro_id = heapq.heappop(self._starts)
+            self._active_counts[pro_id] = self._active_counts.get(pro_id, 0) + 1
+            if pro_id not in self.active:
+                self.active.add(pro_id)
+                self.version += 1
+        # A boost always starts before it ends, so its start was applied above
+        while self._ends and self._ends[0][0] <= now:
+            _, boost_id, pro_id = heapq.heappop(self._ends)
+            self._scheduled.discard(boost_id)
+            remaining = self._active_counts.get(pro_id, 0) - 1
+            if remaining > 0:
+                self._active_counts[pro_id] = remaining
+            else:
+                self._active_counts.pop(pro_id, None)
+                self.active.discard(pro_id)
+                self.version += 1
+        upcoming = [heap[0][0] for heap in (self._starts, self._ends) if heap]
+        return min(upcoming) if upcoming else None
+
+    async def add(self, boost: Dict[str, Any]):
+        await self.collection.insert_one(dict(boost))
+        self.schedule(boost)
+        self.advance()
+
+    async def load(self):
+        """Rebuild the schedule from every boost that has not expired yet"""
+        self._last_sync = self._clock()
+        async for boost in self.collection.find({"ends_at": {"$gt": self._last_sync}}, {"_id": 0}):
+            self.schedule(boost)
+        self.advance()
+
+    async def sync(self):
+        since, self._last_sync = self._last_sync, self._clock()
+        # Overlap by one interval to tolerate clock skew between processes; schedule() dedups
+        query = {"created_at": {"$gte": since - timedelta(seconds=self.sync_interval)}} if since else {}
+        async for boost in self.collection.find(query, {"_id": 0}):
+            self.schedule(boost)
+
+    async def run(self):
+        """Background job: sleep until the next start/expiry or the next sync"""
+        await self.load()
+        next_sync = asyncio.get_running_loop().time() + self.sync_interval
+        while True:
+            next_event = self.advance()
+            loop_time = asyncio.get_running_loop().time()
+            timeout = next_sync - loop_time
+            if next_event is not None:
+                timeout = min(timeout, (next_event - self._clock()).total_seconds())
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
+            if asyncio.get_running_loop().time() >= next_sync:
+                try:
+                    await self.sync()
+                except Exception:
+                    logger.exception("Boost schedule sync failed")
+                next_sync = asyncio.get_running_loop().time() + self.sync_interval
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active_pros": len(self.active),
+            "version": self.version,
+            "scheduled": len(self._scheduled),
+            "pending_starts": len(self._starts),
+        }
@@ -0,0 +1,132 @@
+"""
+Credit ledger
+
+`credit_ledger` is append-only: one entry per movement (delta, reason,
+reference, balance after). `credit_balances` holds the materialized balance
+of each user, so reading a balance is a single document fetch.
+
+A debit is one conditional find_one_and_update ({"balance": {"$gte": cost}}):
+concurrent debits can never take the balance below zero, and no
+transaction is needed. The same update pushes the ledger entry into the
+balance document's `pending` list; the entry is then appended to the
+ledger and removed from `pending`. If the process dies in between,
+repair() finishes the job, so the ledger always ends up matching the
+balance.
+
+Accounts are opened lazily from the legacy `users.credits` field.
+"""
+
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+class InsufficientCredits(Exception):
+    def __init__(self, balance: int, cost: int):
+        super().__init__(f"Balance {balance} is lower than {cost}")
+        self.balance = balance
+        self.cost = cost
+
+
+class CreditLedger:
+    def __init__(self, db):
+        self.db = db
+
+    async def balance(self, user_id: str) -> int:
+        doc = await self.db.credit_balances.find_one({"_id": user_id}, {"balance": 1})
+        if doc is None:
+            return await self._open_account(user_id)
+        return doc["balance"]
+
+    async def debit(self, user_id: str, cost: int, reason: str, ref: Optional[str] = None) -> Dict[str, Any]:
+        """Take `cost` credits; raises InsufficientCredits, never overdraws"""
+        if cost < 0:
+            raise ValueError("cost must be positive")
+        entry = self._entry(user_id, -cost, reason, ref)
+        for _ in range(2):
+            doc = await self.db.credit_balances.find_one_and_update(
+                {"_id": user_id, "balance": {"$gte": cost}},
+                {"$inc": {"balance": -cost}, "$push": {"pending": entry}, "$set": {"updated_at": entry["created_at"]}},
+                projection={"balance": 1},
+                return_document=ReturnDocument.AFTER,
+            )
+            if doc is not None:
+                return await self._commit(user_id, entry, doc["balance"])
+            balance = await self.balance(user_id)
+            if balance < cost:
+                raise InsufficientCredits(balance, cost)
+            # The account was just opened: retry once
+        raise InsufficientCredits(await self.balance(user_id), cost)
+
+    async def credit(self, user_id: str, amount: int, reason: str, ref: Optional[str] = None) -> Dict[str, Any]:
+        if amount < 0:
+            raise ValueError("amount must be positive")
+        await self.balance(user_id)
+        entry = self._entry(user_id, amount, reason, ref)
+        doc = await self.db.credit_balances.find_one_and_update(
+            {"_id": user_id},
+            {"$inc": {"balance": amount}, "$push": {"pending": entry}, "$set": {"updated_at": entry["created_at"]}},
+            projection={"balance": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        return await self._commit(user_id, entry, doc["balance"])
+
+    async def history(self, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        return await self.db.credit_ledger.find(
+            {"user_id": user_id}, {"_id": 0}
+        ).sort("created_at", -1).limit(limit).to_list(limit)
+
+    async def has_entry(self, user_id: str, ref: str) -> bool:
+        """Whether a movement with this reference was applied (ledger or still pending)"""
+        if await self.db.credit_ledger.find_one({"user_id": user_id, "ref": ref}, {"_id": 1}):
+            return True
+        return await self.db.credit_balances.find_one({"_id": user_id, "pending.ref": ref}, {"_id": 1}) is not None
+
+    async def repair(self) -> int:
+        """Append the entries a crash left in `pending`; returns how many were found"""
+        repaired = 0
+        async for doc in self.db.credit_balances.find({"pending.id": {"$exists": True}}, {"pending": 1}):
+            for entry in doc["pending"]:
+                await self._commit(doc["_id"], entry, None)
+                repaired += 1
+        return repaired
+
+    def _entry(self, user_id: str, delta: int, reason: str, ref: Optional[str]) -> Dict[str, Any]:
+        return {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "delta": delta,
+            "reason": reason,
+            "ref": ref,
+            "created_at": datetime.utcnow(),
+        }
+
+    async def _commit(self, user_id: str, entry: Dict[str, Any], balance_after: Optional[int]) -> Dict[str, Any]:
+        entry = {**entry, "balance_after": balance_after}
+        try:
+            await self.db.credit_ledger.insert_one(dict(entry))
+        except DuplicateKeyError:
+            pass
+        await self.db.credit_balances.update_one({"_id": user_id}, {"$pull": {"pending": {"id": entry["id"]}}})
+        return entry
+
+    async def _open_account(self, user_id: str) -> int:
+        user = await self.db.users.find_one({"id": user_id}, {"_id": 0, "credits": 1})
+        opening = int((user or {}).get("credits") or 0)
+        entry = self._entry(user_id, opening, "opening_balance", None)
+        try:
+            await self.db.credit_balances.insert_one({
+                "_id": user_id,
+                "balance": opening,
+                "pending": [entry],
+                "updated_at": entry["created_at"],
+            })
+        except DuplicateKeyError:
+            # Opened concurrently by another request
+            doc = await self.db.credit_balances.find_one({"_id": user_id}, {"balance": 1})
+            return doc["balance"]
+        await self._commit(user_id, entry, opening)
+        return opening
@@ -0,0 +1,160 @@
+"""
+Per-user swipe deck cache
+
+A particulier pages through the same few candidate pools while swiping, so
+each pool is read and ranked once and kept per user: the following pages
+only drop the cards swiped since (seen-set lookup) and resume after the
+cursor's (score, id), with no query and no ranking.
+
+The cache is an LRU over users bounded by entry count and total size, and
+a user's entry (all their cached pools) is capped in size; pools larger
+than the cap are not cached. Entries expire after `ttl` seconds, which also
+bounds how long another worker's invalidations take to show up here.
+
+Invalidation:
+- invalidate_user(): the particulier's location (or anything else keying
+  their deck) changed.
+- invalidate_artisan(): the artisan was suspended, banned or deleted; their
+  card is filtered out of every pool loaded before that moment.
+- boost changes: pools are tagged with the boost scheduler's version and
+  re-ranked in memory when it moved.
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set
+
+import bson
+
+from backend.geo import Coordinates
+from backend.ranking import rank
+
+DECK_CACHE_SIZE = int(os.getenv("DECK_CACHE_SIZE", "5000"))
+DECK_CACHE_TTL_SECONDS = float(os.getenv("DECK_CACHE_TTL_SECONDS", "120"))
+DECK_CACHE_MAX_ENTRY_BYTES = int(os.getenv("DECK_CACHE_MAX_ENTRY_BYTES", str(256 * 1024)))
+DECK_CACHE_MAX_BYTES = int(os.getenv("DECK_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+class CachedPool:
+    def __init__(self, cards: List[Dict[str, Any]], pool_end: Optional[Dict[str, Any]],
+                 more_pools: bool, boost_version: int, loaded_at: float,
+                 affinity: Optional[Dict[str, float]] = None):
+        self.cards = cards
+        self.affinity = affinity
+        self.pool_end = pool_end
+        self.more_pools = more_pools
+        self.boost_version = boost_version
+        self.loaded_at = loaded_at
+        self.size = len(bson.encode({"cards": cards}))
+
+    def rerank(self, weights: Dict[str, float], center: Optional[Coordinates],
+               boosted_ids: Optional[Set[str]], boost_version: int):
+        self.cards = rank(self.cards, weights, center, boosted_ids, affinity=self.affinity)
+        self.boost_version = boost_version
+
+
+class _UserDeck:
+    def __init__(self, expires_at: float):
+        self.pools: "OrderedDict[Hashable, CachedPool]" = OrderedDict()
+        self.size = 0
+        self.expires_at = expires_at
+
+
+class DeckCache:
+    def __init__(self, maxsize: int = DECK_CACHE_SIZE, ttl: float = DECK_CACHE_TTL_SECONDS,
+                 max_entry_bytes: int = DECK_CACHE_MAX_ENTRY_BYTES, max_bytes: int = DECK_CACHE_MAX_BYTES,
+                 clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_entry_bytes = max_entry_bytes
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._decks: "OrderedDict[str, _UserDeck]" = OrderedDict()
+        self._removed: Dict[str, float] = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.oversized = 0
+
+    def get(self, user_id: str, pool_key: Hashable) -> Optional[CachedPool]:
+        deck = self._decks.get(user_id)
+        if deck is not None and deck.expires_at <= self._clock():
+            self._drop(user_id)
+            deck = None
+        pool = deck.pools.get(pool_key) if deck else None
+        if pool is None:
+            self.misses += 1
+            return None
+        self._decks.move_to_end(user_id)
+        self.hits += 1
+        return pool
+
+    def put(self, user_id: str, pool_key: Hashable, pool: CachedPool):
+        if pool.size > self.max_entry_bytes:
+            self.oversized += 1
+            return
+        deck = self._decks.get(user_id)
+        if deck is None or deck.expires_at <= self._clock():
+            self._drop(user_id)
+            deck = self._decks[user_id] = _UserDeck(self._clock() + self.ttl)
+        previous = deck.pools.pop(pool_key, None)
+        if previous is not None:
+            self._resize(deck, -previous.size)
+        # Keep the user's entry under the cap: their oldest pools go first
+        while deck.pools and deck.size + pool.size > self.max_entry_bytes:
+            _, oldest = deck.pools.popitem(last=False)
+            self._resize(deck, -oldest.size)
+        deck.pools[pool_key] = pool
+        self._resize(deck, pool.size)
+        self._decks.move_to_end(user_id)
+        while len(self._decks) > self.maxsize or (self.size > self.max_bytes and len(self._decks) > 1):
+            self._drop(next(iter(self._decks)))
+            self.evictions += 1
+
+    def visible(self, pool: CachedPool) -> List[Dict[str, Any]]:
+        """The pool's cards minus artisans removed after it was loaded"""
+        if not self._removed:
+            return pool.cards
+        removed = self._removed
+        return [card for card in pool.cards if card["id"] not in removed or removed[card["id"]] < pool.loaded_at]
+
+    def invalidate_user(self, user_id: str) -> bool:
+        return self._drop(user_id)
+
+    def invalidate_artisan(self, artisan_id: str):
+        now = self._clock()
+        # Pools older than the TTL are gone anyway: so are their tombstones
+        self._removed = {key: at for key, at in self._removed.items() if at > now - self.ttl}
+        self._removed[artisan_id] = now
+
+    def now(self) -> float:
+        return self._clock()
+
+    def _resize(self, deck: _UserDeck, delta: int):
+        deck.size += delta
+        self.size += delta
+
+    def _drop(self, user_id: str) -> bool:
+        deck = self._decks.pop(user_id, None)
+        if deck is None:
+            return False
+        self.size -= deck.size
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._decks),
+            "maxsize": self.maxsize,
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "oversized": self.oversized,
+            "removed_artisans": len(self._removed),
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
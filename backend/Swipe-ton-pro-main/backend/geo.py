@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Offline geocoding and geospatial queries
+
+Free-form locations ({"city": ..., "postal_code": ..., "lat": ..., "lon": ...})
+are normalized to a GeoJSON point stored in the document's `geo` field,
+which carries a 2dsphere index. Postal codes are resolved from a local table
+and never through a network call: exact postal code first, then the city
+name, then the department average.
+
+The bundled table (data/postal_codes.csv) only covers the main French
+cities. Point POSTAL_CODES_FILE at the full La Poste export
+(laposte_hexasmal.csv) for complete coverage; the server logs a warning at
+startup while it runs on the bundled table.
+
+Backfill `geo` on existing users and projects:
+
+    python -m backend.geo --backfill
+"""
+
+import argparse
+import asyncio
+import csv
+import logging
+import math
+import os
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6378.1
+DEFAULT_POSTAL_CODES_FILE = Path(__file__).parent / "data" / "postal_codes.csv"
+
+Coordinates = Tuple[float, float]  # (lon, lat), GeoJSON order
+
+
+def _normalize_name(name: str) -> str:
+    name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    return " ".join(name.lower().replace("-", " ").split())
+
+
+def _department(postal_code: str) -> str:
+    # Overseas departments use three digits (971..976)
+    return postal_code[:3] if postal_code.startswith("97") else postal_code[:2]
+
+
+class PostalCodeTable:
+    def __init__(self, rows: List[Tuple[str, str, float, float]]):
+        self.by_postal_code: Dict[str, Coordinates] = {}
+        self.by_city: Dict[str, Coordinates] = {}
+        sums: Dict[str, List[float]] = {}
+        for postal_code, city, lat, lon in rows:
+            self.by_postal_code.setdefault(postal_code, (lon, lat))
+            self.by_city.setdefault(_normalize_name(city), (lon, lat))
+            acc = sums.setdefault(_department(postal_code), [0.0, 0.0, 0])
+            acc[0] += lon
+            acc[1] += lat
+            acc[2] += 1
+        self.by_department = {dep: (lon / n, lat / n) for dep, (lon, lat, n) in sums.items()}
+
+    @classmethod
+    def load(cls, path: Path) -> "PostalCodeTable":
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            sample = f.readline()
+            f.seek(0)
+            if ";" in sample:
+                return cls(list(_read_laposte(f)))
+            return cls([
+                (row["postal_code"].zfill(5), row["city"], float(row["lat"]), float(row["lon"]))
+                for row in csv.DictReader(f)
+            ])
+
+    def lookup(self, postal_code: Optional[str] = None, city: Optional[str] = None) -> Optional[Coordinates]:
+        if postal_code:
+            postal_code = postal_code.strip().zfill(5)
+            if postal_code in self.by_postal_code:
+                return self.by_postal_code[postal_code]
+        if city and _normalize_name(city) in self.by_city:
+            return self.by_city[_normalize_name(city)]
+        if postal_code:
+            return self.by_department.get(_department(postal_code))
+        return None
+
+
+def _read_laposte(f):
+    """La Poste 'base officielle des codes postaux' export (';' separated)"""
+    for row in csv.DictReader(f, delimiter=";"):
+        row = {key.lstrip("#").strip().lower(): value for key, value in row.items() if key}
+        postal_code = row.get("code_postal")
+        city = row.get("nom_de_la_commune") or row.get("nom_commune") or ""
+        if row.get("latitude") and row.get("longitude"):
+            lat, lon = row["latitude"], row["longitude"]
+        elif row.get("coordonnees_gps") and "," in row["coordonnees_gps"]:
+            lat, lon = row["coordonnees_gps"].split(",", 1)
+        else:
+            continue
+        try:
+            yield postal_code.zfill(5), city, float(lat), float(lon)
+        except (AttributeError, ValueError):
+            continue
+
+
+@lru_cache(maxsize=1)
+def postal_code_table() -> PostalCodeTable:
+    return PostalCodeTable.load(Path(os.getenv("POSTAL_CODES_FILE", DEFAULT_POSTAL_CODES_FILE)))
+
+
+def load_postal_codes() -> PostalCodeTable:
+    """Load the table geocode() uses now, warning when it is the bundled one"""
+    table = postal_code_table()
+    if not os.getenv("POSTAL_CODES_FILE"):
+        logger.warning(
+            "POSTAL_CODES_FILE is not set: geocoding uses the bundled table of %d postal codes; "
+            "point it at the La Poste export (laposte_hexasmal.csv) for complete coverage",
+            len(table.by_postal_code),
+        )
+    return table
+
+
+def geocode(location: Optional[Dict[str, Any]]) -> Optional[Coordinates]:
+    if not location:
+        return None
+    try:
+        lat, lon = float(location["lat"]), float(location["lon"])
+        if -90 <= lat <= 90 and -180 <= lon <= 180:
+            return lon, lat
+    except (KeyError, TypeError, ValueError):
+        pass
+    return postal_code_table().lookup(location.get("postal_code"), location.get("city"))
+
+
+def geo_point(coordinates: Coordinates) -> Dict[str, Any]:
+    lon, lat = coordinates
+    return {"type": "Point", "coordinates": [lon, lat]}
+
+
+def location_geo(location: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """GeoJSON point for a free-form location, or None if it cannot be placed"""
+    coordinates = geocode(location)
+    return geo_point(coordinates) if coordinates else None
+
+
+def within_radius(center: Coordinates, radius_km: float, field: str = "geo") -> Dict[str, Any]:
+    if radius_km < 0:
+        raise ValueError(f"radius_km must not be negative, got {radius_km}")
+    return {field: {"$geoWithin": {"$centerSphere": [list(center), radius_km / EARTH_RADIUS_KM]}}}
+
+
+def within_bbox(min_lon: float, min_lat: float, max_lon: float, max_lat: float,
+                field: str = "geo") -> Dict[str, Any]:
+    ring = [[min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat], [min_lon, max_lat], [min_lon, min_lat]]
+    return {field: {"$geoWithin": {"$geometry": {"type": "Polygon", "coordinates": [ring]}}}}
+
+
+def haversine_km(a: Coordinates, b: Coordinates) -> float:
+    lon1, lat1, lon2, lat2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+def point_coordinates(doc: Dict[str, Any], field: str = "geo") -> Optional[Coordinates]:
+    point = doc.get(field)
+    if point and point.get("coordinates"):
+        lon, lat = point["coordinates"]
+        return lon, lat
+    return None
+
+
+async def backfill_geo(db, collections=("users", "projects"), batch_size: int = 500) -> Dict[str, int]:
+    """Set `geo` on documents that have a location but no point yet"""
+    from pymongo import UpdateOne
+
+    updated = {}
+    for name in collections:
+        count, ops = 0, []
+        cursor = db[name].find({"location": {"$ne": None}, "geo": None}, {"_id": 1, "location": 1})
+        async for doc in cursor:
+            point = location_geo(doc["location"])
+            if point:
+                ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"geo": point}}))
+            if len(ops) >= batch_size:
+                count += (await db[name].bulk_write(ops, ordered=False)).modified_count
+                ops = []
+        if ops:
+            count += (await db[name].bulk_write(ops, ordered=False)).modified_count
+        updated[name] = count
+    return updated
+
+
+async def main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[os.getenv("DB_NAME", "test_database")]
+    try:
+        for name, count in (await backfill_geo(db)).items():
+            print(f"{name}: {count} documents géolocalisés")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backfill", action="store_true", help="set geo on users and projects")
+    args = parser.parse_args()
+    if args.backfill:
+        asyncio.run(main())
+    else:
+        parser.print_help()
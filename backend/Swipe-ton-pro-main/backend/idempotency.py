@@ -0,0 +1,114 @@
+"""
+Idempotency keys
+
+A client sends the same `Idempotency-Key` header on every retry of one
+logical request. begin() claims the key with a single insert into
+`idempotency_keys` (_id "<scope>:<key>"); a repeated key within the window
+gets the stored response back instead of running the request again.
+
+While a request runs, its key holds a short lease: a concurrent retry gets
+IdempotencyKeyInProgress. If the attempt fails or its worker dies, the
+lease lapses and the next retry takes the key over, together with the `charge_id` generated on the
+first attempt, so side effects keyed on it are not repeated.
+
+Completed responses are also kept in a per-worker TTLCache, so replays of
+hot keys (double taps) do not reach the database.
+"""
+
+import hashlib
+import json
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from backend.cache import TTLCache
+
+
+class IdempotencyKeyInProgress(Exception):
+    pass
+
+
+class IdempotencyKeyReused(Exception):
+    """The key was already used for a different request"""
+
+
+def fingerprint(request: Dict[str, Any]) -> str:
+    payload = json.dumps(request, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(self, collection, window_seconds: float = 86400, lease_seconds: float = 30,
+                 cache_size: int = 10000):
+        self.collection = collection
+        self.window = timedelta(seconds=window_seconds)
+        self.lease = timedelta(seconds=lease_seconds)
+        self.cache = TTLCache(maxsize=cache_size, ttl=window_seconds)
+        self.replays = 0
+
+    async def begin(self, scope: str, key: str, request_fingerprint: str) -> Dict[str, Any]:
+        """
+        Claim the key. The returned record has a `response` when the request
+        already completed (replay it), otherwise a `charge_id` to run it with.
+        """
+        key_id = f"{scope}:{key}"
+        cached = self.cache.get(key_id)
+        if cached is not None:
+            self._check_fingerprint(cached, request_fingerprint)
+            self.replays += 1
+            return cached
+
+        now = datetime.utcnow()
+        record = {
+            "_id": key_id,
+            "fingerprint": request_fingerprint,
+            "charge_id": str(uuid.uuid4()),
+            "response": None,
+            "locked_until": now + self.lease,
+            "expires_at": now + self.window,
+        }
+        try:
+            await self.collection.insert_one(dict(record))
+            return record
+        except DuplicateKeyError:
+            pass
+
+        existing = await self.collection.find_one({"_id": key_id})
+        if existing is None or existing["expires_at"] <= now:
+            # Past the window (the TTL monitor has not removed it yet): start over
+            await self.collection.replace_one({"_id": key_id}, record, upsert=True)
+            return record
+        self._check_fingerprint(existing, request_fingerprint)
+        if existing["response"] is not None:
+            self.cache.set(key_id, existing)
+            self.replays += 1
+            return existing
+        if existing["locked_until"] > now:
+            raise IdempotencyKeyInProgress()
+        # The previous attempt died: take the lease over, keeping its charge_id
+        taken = await self.collection.find_one_and_update(
+            {"_id": key_id, "locked_until": existing["locked_until"], "response": None},
+            {"$set": {"locked_until": now + self.lease}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if taken is None:
+            raise IdempotencyKeyInProgress()
+        return taken
+
+    async def complete(self, record: Dict[str, Any], response: Dict[str, Any]):
+        await self.collection.update_one({"_id": record["_id"]}, {"$set": {"response": response}})
+        self.cache.set(record["_id"], {**record, "response": response})
+
+    async def abandon(self, record: Dict[str, Any]):
+        """Release a key whose request was rejected before any side effect"""
+        await self.collection.delete_one({"_id": record["_id"], "response": None})
+
+    def _check_fingerprint(self, record: Dict[str, Any], request_fingerprint: str):
+        if record["fingerprint"] != request_fingerprint:
+            raise IdempotencyKeyReused()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), "replays": self.replays}
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Declarative MongoDB index registry
+
+apply_indexes() is run at API startup and is idempotent: create_index is a
+no-op for an index that already exists with the same specification. Indexes
+are created one by one, so one conflicting index (e.g. a unique index over
+duplicates) is reported without skipping the others of its collection.
+
+Check that every registered query shape is served by an index:
+
+    python -m backend.indexes --check
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+from backend.geo import within_radius
+from backend.swipe_deck import DECK_INDEXES, DECK_SORT, GEO_INDEXES
+
+logger = logging.getLogger(__name__)
+
+
+class IndexSpec(NamedTuple):
+    keys: List[Tuple[str, Any]]
+    unique: bool = False
+    sparse: bool = False
+    expire_after_seconds: Optional[int] = None
+
+
+class QueryShape(NamedTuple):
+    collection: str
+    filter: Dict[str, Any]
+    sort: Optional[List[Tuple[str, int]]] = None
+
+
+KEYSET = [("created_at", DESCENDING), ("id", DESCENDING)]
+
+INDEXES: Dict[str, List[IndexSpec]] = {
+    "users": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("email", ASCENDING)]),
+        IndexSpec(KEYSET),
+        IndexSpec([("status", ASCENDING)]),
+        IndexSpec([("user_type", ASCENDING), ("status", ASCENDING)]),
+    ] + [IndexSpec(keys) for keys in DECK_INDEXES + GEO_INDEXES],
+    "admins": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("email", ASCENDING)], unique=True),
+        IndexSpec([("role", ASCENDING)]),
+    ],
+    "invitations": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("email", ASCENDING), ("status", ASCENDING)]),
+        IndexSpec([("token", ASCENDING)]),
+    ],
+    "logs": [
+        IndexSpec([("timestamp", DESCENDING)]),
+        IndexSpec([("action", ASCENDING), ("timestamp", DESCENDING)]),
+        IndexSpec([("user_id", ASCENDING), ("timestamp", DESCENDING)]),
+    ],
+    "reports": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec(KEYSET),
+        IndexSpec([("status", ASCENDING)] + KEYSET),
+    ],
+    "support_tickets": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec(KEYSET),
+        IndexSpec([("status", ASCENDING)] + KEYSET),
+        IndexSpec([("priority", ASCENDING)] + KEYSET),
+        IndexSpec([("status", ASCENDING), ("assigned_to", ASCENDING)]),
+    ],
+    "payments": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("status", ASCENDING), ("paid_at", DESCENDING)]),
+    ],
+    "matches": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        # A pair matches at most once (matches created before pair_key existed are skipped)
+        IndexSpec([("pair_key", ASCENDING)], unique=True, sparse=True),
+        IndexSpec([("particulier_id", ASCENDING)]),
+        IndexSpec([("created_at", ASCENDING)]),
+    ],
+    "projects": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("geo", "2dsphere")]),
+        IndexSpec([("category", ASCENDING), ("geo", "2dsphere")]),
+        IndexSpec([("fanout_status", ASCENDING), ("created_at", ASCENDING)]),
+        IndexSpec([("fanout_status", ASCENDING), ("fanout_started_at", ASCENDING)]),
+    ],
+    "leads": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("project_id", ASCENDING), ("artisan_id", ASCENDING)], unique=True),
+        IndexSpec([("artisan_id", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    "proposals": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("project_id", ASCENDING), ("artisan_id", ASCENDING)], unique=True),
+        IndexSpec([("project_id", ASCENDING)] + KEYSET),
+    ],
+    "ticket_messages": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("ticket_id", ASCENDING)] + KEYSET),
+    ],
+    "lead_quotas": [
+        IndexSpec([("artisan_id", ASCENDING), ("day", ASCENDING)], unique=True),
+    ],
+    "boost_configs": [
+        IndexSpec([("pro_id", ASCENDING)]),
+    ],
+    "boosts": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("ends_at", ASCENDING)]),
+        IndexSpec([("created_at", ASCENDING)]),
+    ],
+    "swipes": [
+        IndexSpec([("user_id", ASCENDING), ("target_id", ASCENDING)]),
+        # Users who swiped since the last recommendations run
+        IndexSpec([("created_at", ASCENDING)]),
+    ],
+    "swipe_quotas": [
+        IndexSpec([("user_id", ASCENDING), ("day", ASCENDING)], unique=True),
+    ],
+    "seen_filters": [
+        IndexSpec([("user_id", ASCENDING)], unique=True),
+    ],
+    "credit_ledger": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("user_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexSpec([("user_id", ASCENDING), ("ref", ASCENDING)]),
+    ],
+    "credit_balances": [
+        # Only balances with an unfinished ledger write are indexed
+        IndexSpec([("pending.id", ASCENDING)], sparse=True),
+    ],
+    "recommendations": [
+        IndexSpec([("user_id", ASCENDING)], unique=True),
+    ],
+    "recommendation_models": [
+        IndexSpec([("model_id", ASCENDING), ("chunk", ASCENDING)]),
+    ],
+    "idempotency_keys": [
+        # Keys are removed by the TTL monitor once their replay window is over
+        IndexSpec([("expires_at", ASCENDING)], expire_after_seconds=0),
+    ],
+}
+
+_SAMPLE_DATE = datetime(2024, 1, 1)
+
+QUERY_SHAPES: List[QueryShape] = [
+    QueryShape("users", {"id": "x"}),
+    QueryShape("users", {"email": "x@example.com"}),
+    QueryShape("users", {}, KEYSET),
+    QueryShape("users", {"created_at": {"$gte": _SAMPLE_DATE}}),
+    QueryShape("users", {"status": "active"}),
+    QueryShape("users", {"user_type": "artisan"}),
+    QueryShape("admins", {"id": "x"}),
+    QueryShape("admins", {"email": "x@example.com"}),
+    QueryShape("admins", {"role": "super_admin"}),
+    QueryShape("invitations", {"email": "x@example.com", "status": "pending"}),
+    QueryShape("invitations", {"email": "x@example.com", "token": "t", "status": "pending"}),
+    QueryShape("logs", {}, [("timestamp", DESCENDING)]),
+    QueryShape("logs", {"action": "login_failed"}, [("timestamp", DESCENDING)]),
+    QueryShape("logs", {"user_id": "x"}, [("timestamp", DESCENDING)]),
+    QueryShape("reports", {"id": "x"}),
+    QueryShape("reports", {}, KEYSET),
+    QueryShape("reports", {"status": "pending"}, KEYSET),
+    QueryShape("support_tickets", {"id": "x"}),
+    QueryShape("support_tickets", {"status": "open"}, KEYSET),
+    QueryShape("support_tickets", {"status": "open", "assigned_to": None}),
+    QueryShape("support_tickets", {"status": {"$in": ["open", "in_progress"]}, "assigned_to": {"$in": ["x"]}}),
+    QueryShape("payments", {"status": "completed", "paid_at": {"$gte": _SAMPLE_DATE}}),
+    QueryShape("boost_configs", {"pro_id": "x"}),
+    QueryShape("boost_configs", {"pro_id": {"$in": [None, "x"]}}),
+    QueryShape("boosts", {"ends_at": {"$gt": _SAMPLE_DATE}}),
+    QueryShape("boosts", {"created_at": {"$gte": _SAMPLE_DATE}}),
+    QueryShape("swipes", {"user_id": "x"}),
+    QueryShape("seen_filters", {"user_id": "x", "version": 3}),
+    QueryShape("swipe_quotas", {"user_id": "x", "day": "2024-01-01"}),
+    QueryShape("swipes", {"created_at": {"$gte": _SAMPLE_DATE}}),
+    QueryShape("matches", {"created_at": {"$gte": _SAMPLE_DATE}}),
+    QueryShape("matches", {"particulier_id": {"$in": ["x"]}}),
+    QueryShape("recommendations", {"user_id": "x"}),
+    QueryShape("recommendation_models", {"model_id": "x", "chunk": {"$gte": 0}}, [("chunk", ASCENDING)]),
+    QueryShape("credit_ledger", {"user_id": "x"}, [("created_at", DESCENDING)]),
+    QueryShape("credit_ledger", {"user_id": "x", "ref": "r"}),
+    QueryShape("credit_balances", {"pending.id": {"$exists": True}}),
+    QueryShape("users", {"user_type": "artisan", "status": "active", "id": {"$nin": ["x"]}}, DECK_SORT),
+    QueryShape("users", {"user_type": "artisan", "status": "active", "categories": "plomberie"}, DECK_SORT),
+    QueryShape("users", {"user_type": "artisan", "status": "active", "categories": "plomberie",
+                         "location.city": "Paris"}, DECK_SORT),
+    QueryShape("users", {"user_type": "artisan", "status": "active", "categories": "plomberie",
+                         **within_radius((2.35, 48.85), 20)}, DECK_SORT),
+    QueryShape("projects", {"category": "plomberie", **within_radius((2.35, 48.85), 20)}),
+    QueryShape("projects", {"id": "x", "fanout_status": "pending"}),
+    QueryShape("projects", {"fanout_status": "pending", "created_at": {"$lt": _SAMPLE_DATE}}, [("created_at", ASCENDING)]),
+    QueryShape("projects", {"fanout_status": "running", "fanout_started_at": {"$lt": _SAMPLE_DATE}}),
+    QueryShape("leads", {"artisan_id": "x"}, [("created_at", DESCENDING)]),
+    QueryShape("proposals", {"project_id": "x"}, KEYSET),
+    QueryShape("proposals", {"project_id": "x", "artisan_id": "y"}),
+    QueryShape("ticket_messages", {"ticket_id": "x"}, KEYSET),
+    QueryShape("lead_quotas", {"artisan_id": "x", "day": "2024-01-01", "count": {"$lt": 20}}),
+]
+
+
+def index_name(keys: List[Tuple[str, Any]]) -> str:
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+
+async def apply_indexes(db, registry: Dict[str, List[IndexSpec]] = INDEXES) -> List[Tuple[str, str, str]]:
+    """Create every registered index; returns (collection, index name, error) for those that failed"""
+    failures = []
+    for collection, specs in registry.items():
+        for spec in specs:
+            name = index_name(spec.keys)
+            options = {"expireAfterSeconds": spec.expire_after_seconds} if spec.expire_after_seconds is not None else {}
+            try:
+                await db[collection].create_index(spec.keys, name=name, unique=spec.unique, sparse=spec.sparse,
+                                                  **options)
+            except OperationFailure as exc:
+                logger.error("Could not create index %s on %s: %s", name, collection, exc)
+                failures.append((collection, name, str(exc)))
+    return failures
+
+
+def plan_stages(plan: Dict[str, Any]):
+    yield plan.get("stage")
+    if "inputStage" in plan:
+        yield from plan_stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        yield from plan_stages(child)
+
+
+async def check_query_shapes(db, shapes: List[QueryShape] = QUERY_SHAPES) -> List[Tuple[QueryShape, str]]:
+    """Return (shape, winning stages) for every shape that falls back to COLLSCAN"""
+    failures = []
+    for shape in shapes:
+        cursor = db[shape.collection].find(shape.filter)
+        if shape.sort:
+            cursor = cursor.sort(shape.sort)
+        explain = await cursor.explain()
+        stages = list(plan_stages(explain["queryPlanner"]["winningPlan"]))
+        if "COLLSCAN" in stages:
+            failures.append((shape, " <- ".join(filter(None, stages))))
+    return failures
+
+
+async def main(check: bool):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[os.getenv("DB_NAME", "test_database")]
+    try:
+        index_failures = await apply_indexes(db)
+        for collection, name, error in index_failures:
+            print(f"❌ Index {collection}.{name} non créé: {error}")
+        print(f"Indexes appliqués sur {len(INDEXES)} collections")
+        if not check:
+            return 1 if index_failures else 0
+        failures = await check_query_shapes(db)
+        for shape, stages in failures:
+            print(f"❌ COLLSCAN {shape.collection} {shape.filter} sort={shape.sort}: {stages}")
+        print(f"{len(QUERY_SHAPES) - len(failures)}/{len(QUERY_SHAPES)} requêtes servies par un index")
+        return 1 if failures or index_failures else 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--check", action="store_true", help="explain() every registered query shape")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.check)))
@@ -0,0 +1,297 @@
+"""
+Project lead fan-out
+
+POST /api/projects stores the project with `fanout_status: "pending"` and
+hands its id to LeadFanout, which returns immediately; worker tasks then,
+per project:
+- claim it (pending -> running, one conditional update, so a project is
+  fanned out by a single worker across processes),
+- read eligible artisans (active, project category, within `radius_km` of
+  the project) through the deck's category/geo indexes, best rated first,
+- order them with backend.ranking,
+- reserve a lead on the best ones against their daily cap (LeadQuota: one
+  bulk_write of conditional $inc on `lead_quotas`), moving on to the next
+  candidates when an artisan is capped,
+- insert the leads with one insert_many and publish one notification per
+  lead in a single batch (NotificationBus.publish_many),
+- mark the project done.
+
+The queue only carries ids and is bounded; a project that does not fit, or
+whose worker died mid-way, stays pending/running in the database and is
+picked up by the periodic sweep.
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from backend.geo import geocode, point_coordinates
+from backend.ranking import load_weights, rank
+from backend.swipe_deck import CARD_PROJECTION, DECK_SORT, candidate_query
+from backend.swipe_ingest import quota_day
+
+logger = logging.getLogger(__name__)
+
+LEAD_RADIUS_KM = float(os.getenv("LEAD_RADIUS_KM", "30"))
+LEADS_PER_PROJECT = int(os.getenv("LEADS_PER_PROJECT", "10"))
+LEAD_DAILY_CAP = int(os.getenv("LEAD_DAILY_CAP", "20"))
+LEAD_CANDIDATES = int(os.getenv("LEAD_CANDIDATES", "200"))
+LEAD_FANOUT_WORKERS = int(os.getenv("LEAD_FANOUT_WORKERS", "4"))
+LEAD_FANOUT_MAX_QUEUE = int(os.getenv("LEAD_FANOUT_MAX_QUEUE", "10000"))
+LEAD_FANOUT_SWEEP_SECONDS = float(os.getenv("LEAD_FANOUT_SWEEP_SECONDS", "30"))
+LEAD_FANOUT_MAX_ATTEMPTS = 3
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+PROJECT_PROJECTION = {"_id": 0, "id": 1, "user_id": 1, "title": 1, "category": 1,
+                      "location": 1, "geo": 1, "budget_range": 1, "fanout_attempts": 1}
+
+_DUPLICATE_KEY = 11000
+
+
+class LeadQuota:
+    """
+    Leads per artisan and UTC day. A reservation is an upsert conditioned on
+    `count < cap`: once the cap is reached the filter no longer matches, the
+    upsert collides with the unique (artisan_id, day) index and the artisan
+    is reported as capped. Concurrent workers can never push an artisan over
+    the cap.
+    """
+
+    def __init__(self, collection, cap: int):
+        self.collection = collection
+        self.cap = cap
+
+    async def reserve(self, artisan_ids: List[str], day: str) -> List[str]:
+        """Take one lead for each artisan still under the cap; return those that got one"""
+        if self.cap <= 0:
+            return list(artisan_ids)
+        refused = await self._increment(artisan_ids, day)
+        if refused:
+            # Two first-of-the-day upserts for the same artisan collide although
+            # the cap is not reached: retry once, the document exists by now
+            retried = await self._increment([artisan_ids[i] for i in refused], day)
+            refused = {refused[i] for i in retried}
+        return [artisan_id for i, artisan_id in enumerate(artisan_ids) if i not in refused]
+
+    async def release(self, artisan_ids: List[str], day: str):
+        """Give back reservations whose leads were not stored"""
+        if self.cap > 0 and artisan_ids:
+            await self.collection.bulk_write([
+                UpdateOne({"artisan_id": artisan_id, "day": day, "count": {"$gt": 0}}, {"$inc": {"count": -1}})
+                for artisan_id in artisan_ids
+            ], ordered=False)
+
+    async def _increment(self, artisan_ids: List[str], day: str) -> List[int]:
+        if not artisan_ids:
+            return []
+        try:
+            await self.collection.bulk_write([
+                UpdateOne({"artisan_id": artisan_id, "day": day, "count": {"$lt": self.cap}},
+                          {"$inc": {"count": 1}}, upsert=True)
+                for artisan_id in artisan_ids
+            ], ordered=False)
+        except BulkWriteError as exc:
+            errors = exc.details.get("writeErrors", [])
+            if any(error.get("code") != _DUPLICATE_KEY for error in errors):
+                raise
+            return sorted(error["index"] for error in errors)
+        return []
+
+
+class LeadFanout:
+    def __init__(self, db, publish_many: Callable[[List[Tuple[str, dict]]], Awaitable[None]],
+                 boosted_ids: Optional[Set[str]] = None, weights: Optional[Dict[str, float]] = None,
+                 radius_km: float = LEAD_RADIUS_KM, leads_per_project: int = LEADS_PER_PROJECT,
+                 daily_cap: int = LEAD_DAILY_CAP, candidates: int = LEAD_CANDIDATES,
+                 workers: int = LEAD_FANOUT_WORKERS, max_queue: int = LEAD_FANOUT_MAX_QUEUE,
+                 sweep_interval: float = LEAD_FANOUT_SWEEP_SECONDS,
+                 clock: Callable[[], datetime] = datetime.utcnow):
+        self.db = db
+        self.publish_many = publish_many
+        self.boosted_ids = boosted_ids
+        self.weights = load_weights(weights)
+        self.radius_km = radius_km
+        self.leads_per_project = leads_per_project
+        self.candidates = candidates
+        self.quota = LeadQuota(db.lead_quotas, daily_cap)
+        self.workers = workers
+        self.max_queue = max_queue
+        self.sweep_interval = sweep_interval
+        self._clock = clock
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.submitted = 0
+        self.deferred = 0
+        self.processed = 0
+        self.failed = 0
+        self.leads_sent = 0
+        self.swept = 0
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    def start(self):
+        if not self.running:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+            self._tasks.append(asyncio.create_task(self._run_sweep()))
+
+    async def stop(self):
+        """Stop the workers; queued projects stay pending and are swept on the next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, project_id: str) -> bool:
+        """Queue a project without waiting; False when it is left to the sweep"""
+        if not self.running:
+            self.deferred += 1
+            return False
+        try:
+            self._queue.put_nowait(project_id)
+        except asyncio.QueueFull:
+            self.deferred += 1
+            return False
+        self.submitted += 1
+        return True
+
+    async def _work(self):
+        while True:
+            project_id = await self._queue.get()
+            try:
+                await self.process(project_id)
+            except Exception:
+                logger.exception("Lead fan-out failed for project %s", project_id)
+
+    async def _run_sweep(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Lead fan-out sweep failed")
+
+    async def sweep(self) -> int:
+        """Requeue projects left pending, or running on a worker that died"""
+        now = self._clock()
+        stale = now - timedelta(seconds=max(self.sweep_interval, 60) * 2)
+        await self.db.projects.update_many(
+            {"fanout_status": RUNNING, "fanout_started_at": {"$lt": stale}},
+            {"$set": {"fanout_status": PENDING}},
+        )
+        room = self._queue.maxsize - self._queue.qsize() if self._queue else 0
+        if room <= 0:
+            return 0
+        # Projects created in the last seconds are most likely still queued
+        cursor = self.db.projects.find(
+            {"fanout_status": PENDING, "created_at": {"$lt": now - timedelta(seconds=5)}}, {"_id": 0, "id": 1}
+        ).sort("created_at", 1).limit(room)
+        requeued = 0
+        async for project in cursor:
+            if self.submit(project["id"]):
+                requeued += 1
+        self.swept += requeued
+        return requeued
+
+    async def process(self, project_id: str) -> int:
+        """Fan one project out; returns the number of leads sent (0 if another worker has it)"""
+        project = await self.db.projects.find_one_and_update(
+            {"id": project_id, "fanout_status": PENDING},
+            {"$set": {"fanout_status": RUNNING, "fanout_started_at": self._clock()}, "$inc": {"fanout_attempts": 1}},
+            projection=PROJECT_PROJECTION,
+        )
+        if project is None:
+            return 0
+        try:
+            sent = await self._fan_out(project)
+        except Exception:
+            self.failed += 1
+            attempts = project.get("fanout_attempts", 0) + 1
+            status = FAILED if attempts >= LEAD_FANOUT_MAX_ATTEMPTS else PENDING
+            await self.db.projects.update_one({"id": project_id}, {"$set": {"fanout_status": status}})
+            raise
+        await self.db.projects.update_one(
+            {"id": project_id},
+            {"$set": {"fanout_status": DONE, "leads_sent": sent, "fanout_done_at": self._clock()}},
+        )
+        self.processed += 1
+        self.leads_sent += sent
+        return sent
+
+    async def _fan_out(self, project: Dict[str, Any]) -> int:
+        center = point_coordinates(project) or geocode(project.get("location"))
+        query = candidate_query(project["category"], center=center, radius_km=self.radius_km if center else None)
+        query["id"] = {"$ne": project["user_id"]}
+        candidates = await self.db.users.find(query, CARD_PROJECTION).sort(DECK_SORT).limit(self.candidates).to_list(
+            length=self.candidates)
+        ranked = rank(candidates, self.weights, center, self.boosted_ids)
+
+        now = self._clock()
+        day = quota_day(now)
+        chosen: List[Dict[str, Any]] = []
+        position = 0
+        while len(chosen) < self.leads_per_project and position < len(ranked):
+            batch = ranked[position:position + self.leads_per_project - len(chosen)]
+            position += len(batch)
+            granted = set(await self.quota.reserve([card["id"] for card in batch], day))
+            chosen.extend(card for card in batch if card["id"] in granted)
+        if not chosen:
+            return 0
+
+        leads = [{
+            "id": str(uuid.uuid4()),
+            "project_id": project["id"],
+            "artisan_id": card["id"],
+            "particulier_id": project["user_id"],
+            "category": project["category"],
+            "score": card["score"],
+            "status": "new",
+            "created_at": now,
+        } for card in chosen]
+        try:
+            await self.db.leads.insert_many(leads, ordered=False)
+        except BulkWriteError as exc:
+            errors = exc.details.get("writeErrors", [])
+            if any(error.get("code") != _DUPLICATE_KEY for error in errors):
+                raise
+            # A retried project: artisans who already have this lead keep the first one
+            duplicates = {leads[error["index"]]["artisan_id"] for error in errors}
+            await self.quota.release(sorted(duplicates), day)
+            leads = [lead for lead in leads if lead["artisan_id"] not in duplicates]
+
+        # The leads are stored and listed to the artisans: a lost notification is not retried
+        try:
+            await self.publish_many([(lead["artisan_id"], {
+                "type": "new_lead",
+                "lead_id": lead["id"],
+                "project_id": project["id"],
+                "title": project.get("title"),
+                "category": project["category"],
+                "budget_range": project.get("budget_range"),
+                "city": (project.get("location") or {}).get("city"),
+            }) for lead in leads])
+        except Exception:
+            logger.exception("Lead notifications failed for project %s", project["id"])
+        return len(leads)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "max_queue": self.max_queue,
+            "submitted": self.submitted,
+            "deferred": self.deferred,
+            "processed": self.processed,
+            "failed": self.failed,
+            "leads_sent": self.leads_sent,
+            "swept": self.swept,
+        }
@@ -0,0 +1,106 @@
+"""
+Match unlock
+
+The artisan of a match pays to unlock it with credits, debited through
+backend.credits; credits themselves are bought through the payment
+provider's checkout. A payment reported by the client is never trusted,
+so there is no card path here. Each request carries an idempotency key
+(backend.idempotency) whose `charge_id` references the charge, so a retry
+never charges twice.
+
+The match is claimed before charging: a conditional update sets
+`unlock_payment_id` to the charge id only while the match is still locked
+and unclaimed. Two unlocks of one match with different keys cannot both
+charge. The claim is released when the balance is too low; after any other
+failure, claim and key stay with the charge id, so the client's retry
+finishes the same charge (the debit is skipped if the ledger already has
+it).
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from backend.credits import InsufficientCredits
+from backend.idempotency import IdempotencyStore, fingerprint
+
+
+class MatchNotFound(Exception):
+    pass
+
+
+class UnlockForbidden(Exception):
+    pass
+
+
+class UnlockInProgress(Exception):
+    pass
+
+
+class MatchUnlocker:
+    def __init__(self, db, ledger, idempotency: IdempotencyStore, cost: int):
+        self.db = db
+        self.ledger = ledger
+        self.idempotency = idempotency
+        self.cost = cost
+
+    async def unlock(self, match_id: str, user_id: str, key: str) -> Dict[str, Any]:
+        """Unlock once per key; a repeated key returns the first response"""
+        request = {"match_id": match_id}
+        record = await self.idempotency.begin(user_id, key, fingerprint(request))
+        if record["response"] is not None:
+            return {**record["response"], "replayed": True}
+        try:
+            response = await self._unlock(match_id, user_id, record["charge_id"])
+        except (MatchNotFound, UnlockForbidden, UnlockInProgress, InsufficientCredits):
+            # Rejected before anything was charged: the key can be used again
+            await self.idempotency.abandon(record)
+            raise
+        # Any other failure keeps the key leased: the retry resumes with the same charge_id
+        await self.idempotency.complete(record, response)
+        return {**response, "replayed": False}
+
+    async def _unlock(self, match_id: str, user_id: str, charge_id: str) -> Dict[str, Any]:
+        match = await self.db.matches.find_one(
+            {"id": match_id}, {"_id": 0, "artisan_id": 1, "unlocked": 1, "unlock_payment_id": 1}
+        )
+        if match is None:
+            raise MatchNotFound()
+        if match["artisan_id"] != user_id:
+            raise UnlockForbidden()
+        if match.get("unlocked"):
+            # Resumed after the flip, or unlocked by an earlier request
+            resumed = match["unlock_payment_id"] == charge_id
+            return self._response(match_id, match["unlock_payment_id"], "credits" if resumed else None)
+
+        claimed = await self.db.matches.find_one_and_update(
+            {"id": match_id, "unlocked": False, "unlock_payment_id": {"$in": [None, charge_id]}},
+            {"$set": {"unlock_payment_id": charge_id}},
+        )
+        if claimed is None:
+            raise UnlockInProgress()
+
+        try:
+            if not await self.ledger.has_entry(user_id, charge_id):
+                await self.ledger.debit(user_id, self.cost, "match_unlock", ref=charge_id)
+        except InsufficientCredits:
+            await self.db.matches.update_one(
+                {"id": match_id, "unlocked": False, "unlock_payment_id": charge_id},
+                {"$set": {"unlock_payment_id": None}},
+            )
+            raise
+
+        await self.db.matches.update_one(
+            {"id": match_id, "unlock_payment_id": charge_id},
+            {"$set": {"unlocked": True, "unlocked_at": datetime.utcnow()}},
+        )
+        return self._response(match_id, charge_id, "credits")
+
+    def _response(self, match_id: str, unlock_payment_id: str, method: Optional[str]) -> Dict[str, Any]:
+        """`method` is None when this request charged nothing"""
+        return {
+            "match_id": match_id,
+            "unlocked": True,
+            "unlock_payment_id": unlock_payment_id,
+            "charged_with": method,
+            "credits": self.cost if method == "credits" else 0,
+        }
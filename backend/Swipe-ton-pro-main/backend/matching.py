@@ -0,0 +1,116 @@
+"""
+Mutual-match detection
+
+Every swipe is folded into one `swipe_pairs` document per pair of users,
+whose _id is the ordered pair "<lower id>:<higher id>". Each side stores
+its latest direction, so recording a swipe and learning whether the other
+side already swiped right is a single indexed upsert.
+
+When both sides are "right", the match is inserted with the pair key under
+a unique index: concurrent right swipes from both sides may both see the
+mutual state, but only one insert succeeds, so a match is created and
+notified exactly once.
+"""
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+Notify = Callable[[str, dict], Awaitable[None]]
+
+RIGHT = "right"
+
+
+def pair_key(user_id: str, target_id: str) -> Tuple[str, str]:
+    """Pair key and the side ("a" = lower id, "b" = higher id) of `user_id`"""
+    low, high = sorted((user_id, target_id))
+    return f"{low}:{high}", "a" if user_id == low else "b"
+
+
+class MatchMaker:
+    def __init__(self, db, notify: Optional[Notify] = None):
+        self.db = db
+        self.notify = notify
+        self.matches_created = 0
+
+    async def record_swipe(self, user_id: str, target_id: str, direction: str,
+                           swiped_at: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """Store the swipe on its pair; return the match if this swipe completed one"""
+        key, side = pair_key(user_id, target_id)
+        update = {
+            "$set": {side: direction, f"{side}_at": swiped_at or datetime.utcnow()},
+            "$setOnInsert": {"users": sorted((user_id, target_id))},
+        }
+        try:
+            pair = await self.db.swipe_pairs.find_one_and_update(
+                {"_id": key}, update, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Two first swipes on the same pair raced on the insert: the document exists now
+            pair = await self.db.swipe_pairs.find_one_and_update(
+                {"_id": key}, update, return_document=ReturnDocument.AFTER
+            )
+        if direction == RIGHT and pair.get("a") == RIGHT and pair.get("b") == RIGHT:
+            return await self._create_match(key, pair["users"])
+        return None
+
+    async def record_many(self, swipes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Record a batch: pairs concurrently, the swipes of one pair in batch order"""
+        by_pair: Dict[str, List[Dict[str, Any]]] = {}
+        for swipe in swipes:
+            by_pair.setdefault(pair_key(swipe["user_id"], swipe["target_id"])[0], []).append(swipe)
+
+        async def record_pair(pair_swipes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            # Concurrent upserts on one pair would keep whichever lands last, not the latest swipe
+            matches = []
+            for swipe in pair_swipes:
+                match = await self.record_swipe(swipe["user_id"], swipe["target_id"], swipe["direction"],
+                                                swipe.get("created_at"))
+                if match:
+                    matches.append(match)
+            return matches
+
+        results = await asyncio.gather(*(record_pair(pair_swipes) for pair_swipes in by_pair.values()))
+        return [match for matches in results for match in matches]
+
+    async def _create_match(self, key: str, users: List[str]) -> Optional[Dict[str, Any]]:
+        profiles = await self.db.users.find(
+            {"id": {"$in": users}}, {"_id": 0, "id": 1, "user_type": 1}
+        ).to_list(len(users))
+        by_type = {profile.get("user_type"): profile["id"] for profile in profiles}
+        if "particulier" not in by_type or "artisan" not in by_type:
+            return None
+
+        match = {
+            "id": str(uuid.uuid4()),
+            "pair_key": key,
+            "particulier_id": by_type["particulier"],
+            "artisan_id": by_type["artisan"],
+            "project_details": {},
+            "status": "active",
+            "created_at": datetime.utcnow(),
+            "unlocked": False,
+            "unlock_payment_id": None,
+        }
+        try:
+            await self.db.matches.insert_one(dict(match))
+        except DuplicateKeyError:
+            return None
+        self.matches_created += 1
+        await self.db.users.update_many({"id": {"$in": users}}, {"$inc": {"total_matches": 1}})
+
+        if self.notify:
+            for user_id, other_id in ((match["particulier_id"], match["artisan_id"]),
+                                      (match["artisan_id"], match["particulier_id"])):
+                try:
+                    await self.notify(user_id, {"type": "match", "match_id": match["id"], "with_user_id": other_id})
+                except Exception:
+                    logger.exception("Match notification failed for user %s", user_id)
+        return match
@@ -0,0 +1,175 @@
+"""
+Cross-worker notification bus
+
+Any worker publishes; every worker runs a subscriber that hands each message
+to its local ConnectionManager, so the worker holding the user's socket
+delivers it. Messages are delivered in publication order, hence in order
+per user.
+
+Backends:
+- "memory": in-process fan-out, for tests and single-worker deployments
+- "mongo": capped collection read with a tailable await cursor
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[str, dict], Awaitable[Any]]
+
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+class NotificationBus(ABC):
+    """Common bookkeeping: end-to-end latency of delivered messages"""
+
+    def __init__(self, latency_window: int = 1000):
+        self.published = 0
+        self.received = 0
+        self.handler_errors = 0
+        self._latencies_ms = deque(maxlen=latency_window)
+
+    def _message(self, user_id: str, payload: dict) -> Dict[str, Any]:
+        return {"user_id": user_id, "payload": payload, "published_at": time.time(), "origin": WORKER_ID}
+
+    async def _dispatch(self, message: Dict[str, Any], handler: Handler):
+        self.received += 1
+        try:
+            await handler(message["user_id"], message["payload"])
+        except Exception:
+            self.handler_errors += 1
+            logger.exception("Notification handler failed for user %s", message["user_id"])
+        self._latencies_ms.append((time.time() - message["published_at"]) * 1000)
+
+    async def prepare(self):
+        """Called once by a publishing process before its first publish"""
+
+    @abstractmethod
+    async def publish(self, user_id: str, payload: dict):
+        """Deliver `payload` to the worker holding `user_id`'s socket"""
+
+    async def publish_many(self, messages: List[Tuple[str, dict]]):
+        """Publish (user_id, payload) pairs; backends override this to write them at once"""
+        for user_id, payload in messages:
+            await self.publish(user_id, payload)
+
+    @abstractmethod
+    async def run(self, handler: Handler):
+        """Hand every message to `handler(user_id, payload)` until cancelled"""
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies_ms)
+        return {
+            "backend": type(self).__name__,
+            "worker": WORKER_ID,
+            "published": self.published,
+            "received": self.received,
+            "handler_errors": self.handler_errors,
+            "latency_p50_ms": round(latencies[len(latencies) // 2], 2) if latencies else None,
+            "latency_p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 2) if latencies else None,
+            "latency_max_ms": round(latencies[-1], 2) if latencies else None,
+        }
+
+
+class InProcessBus(NotificationBus):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._subscribers: List[asyncio.Queue] = []
+
+    async def publish(self, user_id: str, payload: dict):
+        message = self._message(user_id, payload)
+        for queue in self._subscribers:
+            queue.put_nowait(message)
+        self.published += 1
+
+    async def run(self, handler: Handler):
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.append(queue)
+        try:
+            while True:
+                await self._dispatch(await queue.get(), handler)
+        finally:
+            self._subscribers.remove(queue)
+
+
+class MongoCappedBus(NotificationBus):
+    def __init__(self, db, collection_name: str = "notification_bus",
+                 size_bytes: int = 16 * 1024 * 1024, retry_delay: float = 1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.db = db
+        self.collection_name = collection_name
+        self.size_bytes = size_bytes
+        self.retry_delay = retry_delay
+
+    @property
+    def collection(self):
+        return self.db[self.collection_name]
+
+    async def ensure_collection(self):
+        try:
+            await self.db.create_collection(self.collection_name, capped=True, size=self.size_bytes)
+        except CollectionInvalid:
+            pass
+        # A tailable cursor on an empty capped collection dies immediately
+        if await self.collection.find_one() is None:
+            await self.collection.insert_one({"type": "init", "published_at": time.time()})
+
+    async def prepare(self):
+        # Publishing first would create a regular (uncapped) collection
+        await self.ensure_collection()
+
+    async def publish(self, user_id: str, payload: dict):
+        await self.collection.insert_one(self._message(user_id, payload))
+        self.published += 1
+
+    async def publish_many(self, messages: List[Tuple[str, dict]]):
+        if messages:
+            await self.collection.insert_many([self._message(user_id, payload) for user_id, payload in messages])
+            self.published += len(messages)
+
+    async def _last_id(self):
+        docs = await self.collection.find().sort("$natural", -1).limit(1).to_list(1)
+        return docs[0]["_id"] if docs else None
+
+    async def run(self, handler: Handler):
+        await self.ensure_collection()
+        last_id = await self._last_id()
+        while True:
+            try:
+                # Natural order is insertion order: replay up to last_id, deliver what follows
+                skipping = last_id is not None
+                cursor = self.collection.find({}, cursor_type=CursorType.TAILABLE_AWAIT)
+                while cursor.alive:
+                    async for doc in cursor:
+                        if skipping:
+                            skipping = doc["_id"] != last_id
+                            continue
+                        last_id = doc["_id"]
+                        if "user_id" in doc:
+                            await self._dispatch(doc, handler)
+                    if skipping:
+                        logger.warning("Notification bus position rolled out of the capped collection")
+                        skipping = False
+            except PyMongoError:
+                logger.exception("Notification bus cursor failed, retrying")
+            await asyncio.sleep(self.retry_delay)
+
+
+def build_notification_bus(backend: str, db=None) -> NotificationBus:
+    if backend == "memory":
+        return InProcessBus()
+    if backend == "mongo":
+        if db is None:
+            raise ValueError("The mongo notification bus needs a database")
+        return MongoCappedBus(db)
+    raise ValueError(f"Unknown notification bus backend: {backend}")
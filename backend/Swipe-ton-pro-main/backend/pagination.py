@@ -0,0 +1,97 @@
+"""
+Keyset (cursor) pagination on (created_at, id)
+
+Documents are returned newest first. The cursor is an opaque token holding
+the sort key of the last document of the previous page, so fetching the
+next page is an index range scan whatever the page depth.
+
+Legacy documents without `created_at` sort after every dated one (a
+missing field sorts as null), ordered by id among themselves.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+SORT_ORDER = [("created_at", -1), ("id", -1)]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_token(payload: Dict[str, Any]) -> str:
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_token(token: str) -> Dict[str, Any]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except ValueError as exc:
+        raise InvalidCursor("Invalid pagination cursor") from exc
+    if not isinstance(payload, dict):
+        raise InvalidCursor("Invalid pagination cursor")
+    return payload
+
+
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    created_at = doc.get("created_at")
+    return encode_token({"c": created_at.isoformat() if created_at else None, "i": doc["id"]})
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], str]:
+    payload = decode_token(cursor)
+    try:
+        created_at = payload["c"]
+        return (datetime.fromisoformat(created_at) if created_at is not None else None), str(payload["i"])
+    except (ValueError, KeyError, TypeError) as exc:
+        raise InvalidCursor("Invalid pagination cursor") from exc
+
+
+def after_cursor(query: Dict[str, Any], cursor: str) -> Dict[str, Any]:
+    """Restrict `query` to documents sorting strictly after `cursor`"""
+    created_at, doc_id = decode_cursor(cursor)
+    if created_at is None:
+        # Only undated documents sort after an undated one
+        keyset: Dict[str, Any] = {"created_at": None, "id": {"$lt": doc_id}}
+    else:
+        keyset = {"$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": doc_id}},
+            {"created_at": None},
+        ]}
+    return {"$and": [query, keyset]} if query else keyset
+
+
+async def paginate(
+    collection,
+    query: Dict[str, Any],
+    limit: int,
+    cursor: Optional[str] = None,
+    page: int = 1,
+    include_total: bool = False,
+    projection: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Fetch one page. With a cursor the page is located by keyset; without one
+    the legacy `page` number is honoured with skip (page 1 costs nothing extra).
+    """
+    limit = max(limit, 1)
+    if cursor:
+        find = collection.find(after_cursor(query, cursor), projection)
+    else:
+        find = collection.find(query, projection).skip(max(page - 1, 0) * limit)
+    docs: List[Dict[str, Any]] = await find.sort(SORT_ORDER).limit(limit + 1).to_list(limit + 1)
+
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    result = {
+        "items": docs,
+        "next_cursor": encode_cursor(docs[-1]) if has_more and docs else None,
+        "has_more": has_more,
+    }
+    if include_total:
+        result["total"] = await collection.count_documents(query)
+    return result
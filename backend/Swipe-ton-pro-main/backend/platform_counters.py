@@ -0,0 +1,134 @@
+"""
+Materialized platform counters
+
+One document per collection in `platform_counters`, e.g.
+
+    {"_id": "users", "total": 1200,
+     "user_type": {"artisan": 400, "particulier": 800},
+     "status": {"active": 1150, "suspended": 50},
+     "is_professional": {"true": 400, "false": 800}}
+
+Write paths call record_insert / record_update / record_delete, which apply
+a single atomic $inc. A periodic reconciliation recounts everything with one
+$facet per collection to correct drift from writes made outside the API.
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Collection name -> (dimension, default value when the field is missing)
+COUNTED_COLLECTIONS: Dict[str, Dict[str, Any]] = {
+    "users": {"user_type": "particulier", "status": "active", "is_professional": False},
+    "admins": {},
+    "reports": {"status": "pending"},
+    "support_tickets": {"status": "open", "priority": "medium"},
+}
+
+
+def counter_key(value: Any) -> str:
+    """Field name used to store a dimension value"""
+    if isinstance(value, Enum):
+        value = value.value
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if value is None:
+        return "none"
+    return str(value).replace(".", "_").lstrip("$")
+
+
+class PlatformCounters:
+    def __init__(self, db, collection_name: str = "platform_counters"):
+        self.db = db
+        self.collection = db[collection_name]
+
+    def _dimension_values(self, scope: str, doc: Dict[str, Any]) -> Dict[str, str]:
+        return {
+            dimension: counter_key(doc.get(dimension, default))
+            for dimension, default in COUNTED_COLLECTIONS[scope].items()
+        }
+
+    async def _apply(self, scope: str, inc: Dict[str, int]):
+        inc = {path: delta for path, delta in inc.items() if delta}
+        if inc:
+            await self.collection.update_one(
+                {"_id": scope},
+                {"$inc": inc, "$set": {"updated_at": datetime.utcnow()}},
+                upsert=True
+            )
+
+    async def record_insert(self, scope: str, doc: Dict[str, Any]):
+        inc = {"total": 1}
+        for dimension, value in self._dimension_values(scope, doc).items():
+            inc[f"{dimension}.{value}"] = 1
+        await self._apply(scope, inc)
+
+    async def record_delete(self, scope: str, doc: Dict[str, Any]):
+        inc = {"total": -1}
+        for dimension, value in self._dimension_values(scope, doc).items():
+            inc[f"{dimension}.{value}"] = -1
+        await self._apply(scope, inc)
+
+    async def record_update(self, scope: str, before: Dict[str, Any], changes: Dict[str, Any]):
+        """`before` is the pre-image returned by find_one_and_update"""
+        old_values = self._dimension_values(scope, before)
+        new_values = self._dimension_values(scope, {**before, **changes})
+        inc: Dict[str, int] = {}
+        for dimension, old in old_values.items():
+            new = new_values[dimension]
+            if old != new:
+                inc[f"{dimension}.{old}"] = inc.get(f"{dimension}.{old}", 0) - 1
+                inc[f"{dimension}.{new}"] = inc.get(f"{dimension}.{new}", 0) + 1
+        await self._apply(scope, inc)
+
+    async def read(self) -> Dict[str, Dict[str, Any]]:
+        """All counters in one round trip, rebuilding any scope never counted"""
+        docs = {doc["_id"]: doc async for doc in self.collection.find({})}
+        for scope in COUNTED_COLLECTIONS:
+            if scope not in docs:
+                docs[scope] = await self.reconcile_scope(scope)
+        return docs
+
+    async def reconcile_scope(self, scope: str) -> Dict[str, Any]:
+        dimensions = COUNTED_COLLECTIONS[scope]
+        facets = {"total": [{"$count": "n"}]}
+        for dimension, default in dimensions.items():
+            facets[dimension] = [
+                {"$group": {"_id": {"$ifNull": [f"${dimension}", default]}, "n": {"$sum": 1}}}
+            ]
+        result = await self.db[scope].aggregate([{"$facet": facets}]).to_list(1)
+        result = result[0] if result else {}
+
+        total_rows = result.get("total") or []
+        doc = {"total": total_rows[0]["n"] if total_rows else 0}
+        for dimension in dimensions:
+            doc[dimension] = {counter_key(row["_id"]): row["n"] for row in result.get(dimension) or []}
+        doc["updated_at"] = datetime.utcnow()
+        doc["reconciled_at"] = doc["updated_at"]
+
+        await self.collection.replace_one({"_id": scope}, doc, upsert=True)
+        return {"_id": scope, **doc}
+
+    async def reconcile(self):
+        await asyncio.gather(*(self.reconcile_scope(scope) for scope in COUNTED_COLLECTIONS))
+
+    async def run_reconciliation(self, interval_seconds: float):
+        """Background job: recount every `interval_seconds`"""
+        while True:
+            try:
+                await self.reconcile()
+            except Exception:
+                logger.exception("Platform counters reconciliation failed")
+            await asyncio.sleep(interval_seconds)
+
+
+def counter_value(counters: Dict[str, Dict[str, Any]], scope: str,
+                  dimension: Optional[str] = None, value: Any = None) -> int:
+    doc = counters.get(scope) or {}
+    if dimension is None:
+        return max(doc.get("total", 0), 0)
+    return max((doc.get(dimension) or {}).get(counter_key(value), 0), 0)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Project proposals
+
+Proposals are stored in their own `proposals` collection, one document per
+(project, artisan), and read a page at a time through the (project_id,
+created_at, id) index. The project only carries the denormalized
+`proposal_count` and `best_price`, updated by a single pipeline update
+after each insert, so reading a project never loads its proposals and
+concurrent proposals do not rewrite a growing array.
+
+Projects created before this stored their proposals in an embedded
+`proposals` array. Move them out (idempotent, can be re-run):
+
+    python -m backend.proposals --migrate
+
+An embedded proposal that collides with a different stored proposal (a
+second proposal of the same artisan, or several without an artisan) is
+not moved, and its project keeps the whole array for manual review.
+"""
+
+import argparse
+import asyncio
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from backend.pagination import paginate
+
+PROPOSAL_PROJECTION = {"_id": 0}
+MAX_PROPOSALS_PAGE = 100
+MIGRATION_BATCH_SIZE = int(os.getenv("PROPOSALS_MIGRATION_BATCH_SIZE", "500"))
+
+_DUPLICATE_KEY = 11000
+
+
+class DuplicateProposal(Exception):
+    pass
+
+
+def proposal_totals_update(price: float) -> List[Dict[str, Any]]:
+    """One more proposal at `price`; $min ignores a missing or null best_price"""
+    return [{"$set": {
+        "proposal_count": {"$add": [{"$ifNull": ["$proposal_count", 0]}, 1]},
+        "best_price": {"$min": ["$best_price", price]},
+    }}]
+
+
+class ProposalStore:
+    def __init__(self, db):
+        self.db = db
+
+    async def submit(self, project_id: str, artisan_id: str, price: float, message: str,
+                     **extra: Any) -> Dict[str, Any]:
+        """Store the artisan's proposal; raises DuplicateProposal if they already made one"""
+        proposal = {
+            "id": str(uuid.uuid4()),
+            "project_id": project_id,
+            "artisan_id": artisan_id,
+            "price": price,
+            "message": message,
+            "status": "pending",
+            "created_at": datetime.utcnow(),
+            **extra,
+        }
+        try:
+            await self.db.proposals.insert_one(proposal)
+        except DuplicateKeyError as exc:
+            raise DuplicateProposal() from exc
+        await self.db.projects.update_one({"id": project_id}, proposal_totals_update(price))
+        proposal.pop("_id", None)
+        return proposal
+
+    async def page(self, project_id: str, limit: int, cursor: Optional[str] = None) -> Dict[str, Any]:
+        return await paginate(self.db.proposals, {"project_id": project_id}, limit, cursor=cursor,
+                              projection=PROPOSAL_PROJECTION)
+
+    async def find(self, project_id: str, artisan_id: str) -> Optional[Dict[str, Any]]:
+        """The artisan's proposal for the project, if they made one"""
+        return await self.db.proposals.find_one({"project_id": project_id, "artisan_id": artisan_id},
+                                                PROPOSAL_PROJECTION)
+
+    async def recount(self, project_ids: List[str]) -> int:
+        """Recompute proposal_count and best_price from the proposals collection"""
+        if not project_ids:
+            return 0
+        totals = {project_id: (0, None) for project_id in project_ids}
+        async for row in self.db.proposals.aggregate([
+            {"$match": {"project_id": {"$in": project_ids}}},
+            {"$group": {"_id": "$project_id", "count": {"$sum": 1}, "best_price": {"$min": "$price"}}},
+        ]):
+            totals[row["_id"]] = (row["count"], row["best_price"])
+        result = await self.db.projects.bulk_write([
+            UpdateOne({"id": project_id}, {"$set": {"proposal_count": count, "best_price": best_price}})
+            for project_id, (count, best_price) in totals.items()
+        ], ordered=False)
+        return result.modified_count
+
+
+def _embedded_proposal(project: Dict[str, Any], index: int, embedded: Dict[str, Any]) -> Dict[str, Any]:
+    # Ids derived from the position keep a re-run from inserting copies
+    return {
+        **embedded,
+        "id": embedded.get("id") or str(uuid.uuid5(uuid.NAMESPACE_URL, f"proposal:{project['id']}:{index}")),
+        "project_id": project["id"],
+        "artisan_id": embedded.get("artisan_id") or embedded.get("user_id"),
+        "price": embedded.get("price", embedded.get("amount")),
+        "status": embedded.get("status", "pending"),
+        "created_at": embedded.get("created_at") or project.get("created_at") or datetime.utcnow(),
+    }
+
+
+async def _migrate_batch(store: ProposalStore, projects: List[Dict[str, Any]]) -> Dict[str, int]:
+    proposals = [
+        _embedded_proposal(project, index, embedded)
+        for project in projects
+        for index, embedded in enumerate(project["proposals"])
+    ]
+    skipped: List[Dict[str, Any]] = []
+    try:
+        await store.db.proposals.insert_many(proposals, ordered=False)
+    except BulkWriteError as exc:
+        errors = exc.details.get("writeErrors", [])
+        if any(error.get("code") != _DUPLICATE_KEY for error in errors):
+            raise
+        skipped = [proposals[error["index"]] for error in errors]
+    # Only a proposal whose id is stored was moved by an earlier run; the others
+    # collided on (project_id, artisan_id) with a different proposal
+    moved = set()
+    if skipped:
+        moved = {doc["id"] async for doc in store.db.proposals.find(
+            {"id": {"$in": [proposal["id"] for proposal in skipped]}}, {"_id": 0, "id": 1})}
+    unmigrated = [proposal for proposal in skipped if proposal["id"] not in moved]
+    kept = {proposal["project_id"] for proposal in unmigrated}
+
+    await store.recount([project["id"] for project in projects])
+    # Only unset arrays the batch read: a proposal pushed meanwhile stays for the next run
+    unset = [
+        UpdateOne({"_id": project["_id"], "proposals": {"$size": len(project["proposals"])}},
+                  {"$unset": {"proposals": ""}})
+        for project in projects if project["id"] not in kept
+    ]
+    if unset:
+        await store.db.projects.bulk_write(unset, ordered=False)
+    return {"projects": len(projects) - len(kept), "proposals": len(proposals) - len(skipped),
+            "duplicates": len(moved), "unmigrated": len(unmigrated), "kept_projects": len(kept)}
+
+
+async def migrate_embedded_proposals(db, batch_size: int = MIGRATION_BATCH_SIZE) -> Dict[str, int]:
+    """Stream embedded Project.proposals into the proposals collection, `batch_size` proposals at a time"""
+    store = ProposalStore(db)
+    totals = {"projects": 0, "proposals": 0, "duplicates": 0, "unmigrated": 0, "kept_projects": 0}
+    # Projects whose array is empty only lose the field
+    await db.projects.update_many({"proposals": {"$size": 0}}, {"$unset": {"proposals": ""}})
+    cursor = db.projects.find({"proposals.0": {"$exists": True}},
+                              {"_id": 1, "id": 1, "created_at": 1, "proposals": 1})
+    batch: List[Dict[str, Any]] = []
+    pending = 0
+    async for project in cursor:
+        batch.append(project)
+        pending += len(project["proposals"])
+        if pending >= batch_size:
+            for key, count in (await _migrate_batch(store, batch)).items():
+                totals[key] += count
+            batch, pending = [], 0
+    if batch:
+        for key, count in (await _migrate_batch(store, batch)).items():
+            totals[key] += count
+    return totals
+
+
+async def main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[os.getenv("DB_NAME", "test_database")]
+    try:
+        totals = await migrate_embedded_proposals(db)
+        print(f"{totals['projects']} projets migrés, {totals['proposals']} propositions déplacées, "
+              f"{totals['duplicates']} doublons ignorés")
+        if totals["unmigrated"]:
+            print(f"{totals['unmigrated']} propositions en conflit non déplacées : "
+                  f"{totals['kept_projects']} projets gardent leur tableau `proposals`")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--migrate", action="store_true", help="move embedded Project.proposals to their collection")
+    args = parser.parse_args()
+    if args.migrate:
+        asyncio.run(main())
+    else:
+        parser.print_help()
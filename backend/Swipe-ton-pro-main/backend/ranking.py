@@ -0,0 +1,193 @@
+"""
+Vectorized ranking of swipe candidates
+
+Candidate features are loaded once into NumPy arrays and every candidate is
+scored and sorted in a single pass:
+
+    score = Σ weight_f · feature_f
+
+with every feature normalized to [0, 1]:
+- rating: rating / 5 (unrated artisans get the neutral 0.5)
+- distance: exp(-distance_km / distance_scale_km), 0.5 when unknown
+- verified, boost: 0 or 1
+- experience: min(experience_years, experience_cap_years) / experience_cap_years
+- freshness: halves every freshness_half_life_days since last activity
+- affinity: collaborative-filtering score of the artisan for this user
+  (backend.recommendations), 0 when not recommended
+"""
+
+import json
+import math
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+from backend.geo import EARTH_RADIUS_KM, Coordinates, haversine_km, point_coordinates
+
+DEFAULT_WEIGHTS: Dict[str, float] = {
+    "rating": 0.35,
+    "distance": 0.25,
+    "verified": 0.10,
+    "experience": 0.10,
+    "freshness": 0.10,
+    "boost": 0.10,
+    "affinity": 0.10,
+}
+
+DISTANCE_SCALE_KM = 15.0
+EXPERIENCE_CAP_YEARS = 20.0
+FRESHNESS_HALF_LIFE_DAYS = 30.0
+SCORE_DECIMALS = 6
+
+FEATURES = tuple(DEFAULT_WEIGHTS)
+
+
+def merge_weights(*overrides: Optional[Dict[str, float]]) -> Dict[str, float]:
+    """DEFAULT_WEIGHTS with each (possibly partial) override applied in turn"""
+    weights = dict(DEFAULT_WEIGHTS)
+    for override in overrides:
+        weights.update(override or {})
+    unknown = set(weights) - set(FEATURES)
+    if unknown:
+        raise ValueError(f"Unknown ranking features: {sorted(unknown)}")
+    return weights
+
+
+def load_weights(overrides: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """Defaults, then RANKING_WEIGHTS (JSON) from the environment, then `overrides`"""
+    return merge_weights(json.loads(os.getenv("RANKING_WEIGHTS", "{}")), overrides)
+
+
+def _experience_years(doc: Dict[str, Any]) -> float:
+    try:
+        return float((doc.get("profile_data") or {}).get("experience_years") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _last_activity(doc: Dict[str, Any]) -> Optional[datetime]:
+    return doc.get("last_login") or doc.get("created_at")
+
+
+class CandidateFeatures:
+    """Column-oriented features for a batch of candidate documents"""
+
+    def __init__(self, ids: List[str], rating: np.ndarray, lon: np.ndarray, lat: np.ndarray,
+                 verified: np.ndarray, experience: np.ndarray, age_days: np.ndarray, boosted: np.ndarray,
+                 affinity: np.ndarray):
+        # age_days is NaN when the document has neither last_login nor created_at
+        self.ids = ids
+        self.rating = rating
+        self.lon = lon
+        self.lat = lat
+        self.verified = verified
+        self.experience = experience
+        self.age_days = age_days
+        self.boosted = boosted
+        self.affinity = affinity
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_documents(cls, docs: List[Dict[str, Any]], boosted_ids: Optional[Set[str]] = None,
+                       now: Optional[datetime] = None,
+                       affinity: Optional[Dict[str, float]] = None) -> "CandidateFeatures":
+        """One pass over the documents; everything after this is array arithmetic"""
+        boosted_ids = boosted_ids or set()
+        affinity = affinity or {}
+        now = now or datetime.utcnow()
+        nan = math.nan
+        rows = []
+        for doc in docs:
+            coordinates = point_coordinates(doc) or (nan, nan)
+            rating = doc.get("rating")
+            activity = _last_activity(doc)
+            rows.append((
+                nan if rating is None else rating,
+                coordinates[0],
+                coordinates[1],
+                1.0 if doc.get("verified") else 0.0,
+                _experience_years(doc),
+                (now - activity).total_seconds() / 86400 if activity else nan,
+                1.0 if doc["id"] in boosted_ids else 0.0,
+                affinity.get(doc["id"], 0.0),
+            ))
+        columns = np.array(rows, dtype=np.float64).reshape(len(docs), 8).T
+        return cls([doc["id"] for doc in docs], *columns)
+
+
+def distances_km(features: CandidateFeatures, center: Coordinates) -> np.ndarray:
+    """Haversine distance from `center` to every candidate (NaN when unknown)"""
+    lon1, lat1 = np.radians(center[0]), np.radians(center[1])
+    lon2, lat2 = np.radians(features.lon), np.radians(features.lat)
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(h))
+
+
+def score_features(features: CandidateFeatures, weights: Dict[str, float],
+                   center: Optional[Coordinates] = None) -> np.ndarray:
+    rating = np.where(np.isnan(features.rating), 0.5, np.clip(features.rating / 5.0, 0.0, 1.0))
+    if center is not None:
+        distance = np.exp(-distances_km(features, center) / DISTANCE_SCALE_KM)
+        distance = np.where(np.isnan(distance), 0.5, distance)
+    else:
+        distance = np.full(len(features), 0.5)
+    experience = np.minimum(features.experience, EXPERIENCE_CAP_YEARS) / EXPERIENCE_CAP_YEARS
+    freshness = np.exp2(-np.maximum(features.age_days, 0.0) / FRESHNESS_HALF_LIFE_DAYS)
+    freshness = np.where(np.isnan(freshness), 0.0, freshness)
+
+    return (
+        weights["rating"] * rating
+        + weights["distance"] * distance
+        + weights["verified"] * features.verified
+        + weights["experience"] * experience
+        + weights["freshness"] * freshness
+        + weights["boost"] * features.boosted
+        + weights["affinity"] * features.affinity
+    )
+
+
+def rank(docs: List[Dict[str, Any]], weights: Optional[Dict[str, float]] = None,
+         center: Optional[Coordinates] = None, boosted_ids: Optional[Set[str]] = None,
+         now: Optional[datetime] = None, affinity: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+    """Copies of `docs` sorted by descending score then id, each annotated with `score`
+
+    `weights` may be partial: missing features keep their DEFAULT_WEIGHTS value.
+    """
+    if not docs:
+        return []
+    features = CandidateFeatures.from_documents(docs, boosted_ids, now, affinity)
+    scores = np.round(score_features(features, merge_weights(weights), center), SCORE_DECIMALS)
+    # (score desc, id asc) is a total order, so a page can resume after (score, id)
+    order = np.lexsort((np.array(features.ids), -scores))
+    return [{**docs[i], "score": float(scores[i])} for i in order]
+
+
+def score_python(doc: Dict[str, Any], weights: Dict[str, float], center: Optional[Coordinates] = None,
+                 boosted_ids: Iterable[str] = (), now: Optional[datetime] = None,
+                 affinity: Optional[Dict[str, float]] = None) -> float:
+    """Per-document reference scorer, kept for benchmarks and tests"""
+    weights = merge_weights(weights)
+    now = now or datetime.utcnow()
+    rating = doc.get("rating")
+    rating = 0.5 if rating is None else min(max(rating / 5.0, 0.0), 1.0)
+    coordinates = point_coordinates(doc)
+    if center is not None and coordinates:
+        distance = math.exp(-haversine_km(center, coordinates) / DISTANCE_SCALE_KM)
+    else:
+        distance = 0.5
+    experience = min(_experience_years(doc), EXPERIENCE_CAP_YEARS) / EXPERIENCE_CAP_YEARS
+    activity = _last_activity(doc)
+    freshness = 2 ** (-max((now - activity).total_seconds() / 86400, 0.0) / FRESHNESS_HALF_LIFE_DAYS) if activity else 0.0
+    return (
+        weights["rating"] * rating
+        + weights["distance"] * distance
+        + weights["verified"] * float(bool(doc.get("verified")))
+        + weights["experience"] * experience
+        + weights["freshness"] * freshness
+        + weights["boost"] * float(doc["id"] in boosted_ids)
+        + weights["affinity"] * (affinity or {}).get(doc["id"], 0.0)
+    )
@@ -0,0 +1,161 @@
+"""
+WebSocket connection registry with per-connection send queues
+
+Every socket gets a bounded queue drained by its own writer task, so a slow
+or dead client never delays delivery to the others. A connection whose
+queue overflows or whose send exceeds `send_timeout` is evicted.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Close code 1013 = "Try Again Later"
+EVICTION_CLOSE_CODE = 1013
+
+
+class ClientConnection:
+    def __init__(self, manager: "ConnectionManager", user_id: str, websocket):
+        self.manager = manager
+        self.user_id = user_id
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=manager.max_queue)
+        self.task: Optional[asyncio.Task] = None
+        self.sent = 0
+
+    def start(self):
+        self.task = asyncio.create_task(self._writer())
+
+    def enqueue(self, message: dict, delivered: Optional[asyncio.Future] = None) -> bool:
+        try:
+            self.queue.put_nowait((message, time.perf_counter(), delivered))
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _writer(self):
+        while True:
+            message, enqueued_at, delivered = await self.queue.get()
+            try:
+                await asyncio.wait_for(self.websocket.send_json(message), self.manager.send_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                if delivered and not delivered.done():
+                    delivered.set_result(None)
+                reason = "timeout" if isinstance(exc, asyncio.TimeoutError) else "send_error"
+                await self.manager.evict(self, reason)
+                return
+            self.sent += 1
+            latency_ms = (time.perf_counter() - enqueued_at) * 1000
+            if delivered and not delivered.done():
+                delivered.set_result(latency_ms)
+
+    def fail_pending(self):
+        while not self.queue.empty():
+            _, _, delivered = self.queue.get_nowait()
+            if delivered and not delivered.done():
+                delivered.set_result(None)
+
+
+class ConnectionManager:
+    def __init__(self, max_queue: int = 100, send_timeout: float = 5.0):
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.active_connections: Dict[str, List[ClientConnection]] = {}
+        self.evicted = {"queue_full": 0, "timeout": 0, "send_error": 0}
+        self.last_broadcast: Dict[str, Any] = {}
+
+    async def connect(self, user_id: str, websocket):
+        await websocket.accept()
+        connection = ClientConnection(self, user_id, websocket)
+        self.active_connections.setdefault(user_id, []).append(connection)
+        connection.start()
+        return connection
+
+    def _remove(self, connection: ClientConnection) -> bool:
+        connections = self.active_connections.get(connection.user_id)
+        if not connections or connection not in connections:
+            return False
+        connections.remove(connection)
+        if not connections:
+            del self.active_connections[connection.user_id]
+        return True
+
+    def disconnect(self, user_id: str, websocket):
+        for connection in list(self.active_connections.get(user_id, [])):
+            if connection.websocket is websocket:
+                self._remove(connection)
+                connection.fail_pending()
+                if connection.task and connection.task is not asyncio.current_task():
+                    connection.task.cancel()
+
+    async def evict(self, connection: ClientConnection, reason: str):
+        if not self._remove(connection):
+            return
+        self.evicted[reason] += 1
+        logger.warning("Evicting WebSocket of user %s (%s)", connection.user_id, reason)
+        connection.fail_pending()
+        if connection.task and connection.task is not asyncio.current_task():
+            connection.task.cancel()
+        try:
+            await connection.websocket.close(code=EVICTION_CLOSE_CODE)
+        except Exception:
+            pass
+
+    def _enqueue(self, connection: ClientConnection, message: dict, delivered=None) -> bool:
+        if connection.enqueue(message, delivered):
+            return True
+        asyncio.create_task(self.evict(connection, "queue_full"))
+        return False
+
+    async def send_personal_message(self, user_id: str, message: dict) -> int:
+        """Queue `message` on every socket of the user; returns sockets reached"""
+        return sum(
+            self._enqueue(connection, message)
+            for connection in list(self.active_connections.get(user_id, []))
+        )
+
+    async def broadcast(self, message: dict, wait: bool = True) -> Dict[str, Any]:
+        """
+        Queue `message` on every socket. With `wait`, also wait (up to
+        send_timeout) for the writers and report delivery latency.
+        """
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        pending = []
+        rejected = 0
+        for connections in list(self.active_connections.values()):
+            for connection in list(connections):
+                delivered = loop.create_future() if wait else None
+                if self._enqueue(connection, message, delivered):
+                    if delivered is not None:
+                        pending.append(delivered)
+                else:
+                    rejected += 1
+
+        report: Dict[str, Any] = {"recipients": len(pending) + rejected, "rejected": rejected}
+        if wait and pending:
+            done, not_done = await asyncio.wait(pending, timeout=self.send_timeout)
+            latencies = sorted(f.result() for f in done if f.result() is not None)
+            report.update({
+                "delivered": len(latencies),
+                "failed": len(pending) - len(latencies),
+                "latency_p50_ms": round(latencies[len(latencies) // 2], 2) if latencies else None,
+                "latency_max_ms": round(latencies[-1], 2) if latencies else None,
+            })
+        report["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        self.last_broadcast = report
+        return report
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "users": len(self.active_connections),
+            "connections": sum(len(c) for c in self.active_connections.values()),
+            "queued": sum(c.queue.qsize() for cs in self.active_connections.values() for c in cs),
+            "evicted": dict(self.evicted),
+            "last_broadcast": self.last_broadcast,
+        }
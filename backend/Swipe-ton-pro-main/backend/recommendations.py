@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Collaborative-filtering recommendations ("particuliers like you also liked")
+
+Offline job, run outside the API processes:
+1. Interactions: right swipe +1, left swipe -0.5, match +2, summed per
+   (particulier, artisan), form a sparse user × artisan matrix X.
+2. Truncated SVD, randomized and NumPy-only: X ≈ U Σ Vᵀ with `factors`
+   components. Sparse products are computed one column at a time with
+   np.bincount, so memory stays O(interactions + (users + artisans) · factors).
+3. Each particulier's row is projected on the artisan factors,
+   scores = x_u V Vᵀ; artisans they already interacted with are skipped and
+   the top N with a positive score are written to `recommendations`.
+
+The artisan factors V are stored in `recommendation_models`. An incremental
+run only reloads the interactions of particuliers who swiped or matched
+since the previous run and projects them on the stored factors, with no new
+factorization; artisans who joined since are picked up by the next full run.
+
+The deck ranker reads `recommendations` as its `affinity` feature
+(backend.ranking).
+
+    python -m backend.recommendations [--full]
+    python -m backend.recommendations --bench 1000000
+"""
+
+import argparse
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+from pymongo import UpdateOne
+
+RECOMMENDATIONS_FACTORS = int(os.getenv("RECOMMENDATIONS_FACTORS", "32"))
+RECOMMENDATIONS_TOP_N = int(os.getenv("RECOMMENDATIONS_TOP_N", "50"))
+
+INTERACTION_WEIGHTS = {"right": 1.0, "left": -0.5, "match": 2.0}
+MODEL_STATE_ID = "current"
+MODEL_CHUNK_ROWS = 20000
+WRITE_BATCH = 1000
+FOLD_IN_BATCH = 10000
+# Swipes are stamped when queued and written a moment later
+SINCE_OVERLAP = timedelta(minutes=5)
+SCORE_BUDGET = 1 << 22  # floats per block of the dense score matrix (32 MiB)
+MIN_SCORE = 1e-9  # below this a "positive" projection is floating-point noise
+
+
+class InteractionMatrix:
+    """Sparse matrix in COO form, rows sorted, duplicate (row, col) summed"""
+
+    def __init__(self, rows: np.ndarray, cols: np.ndarray, values: np.ndarray,
+                 user_ids: np.ndarray, artisan_ids: np.ndarray):
+        self.rows = rows
+        self.cols = cols
+        self.values = values
+        self.user_ids = user_ids
+        self.artisan_ids = artisan_ids
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self.user_ids), len(self.artisan_ids)
+
+    @classmethod
+    def from_triples(cls, users: List[str], artisans: List[str], values: Iterable[float],
+                     artisan_ids: Optional[np.ndarray] = None) -> "InteractionMatrix":
+        """Build from (user, artisan, value); with `artisan_ids`, unknown artisans are dropped"""
+        values = np.asarray(values, dtype=np.float64)
+        artisans = np.asarray(artisans, dtype=object)
+        if artisan_ids is None:
+            artisan_ids, cols = np.unique(artisans, return_inverse=True)
+        else:
+            index = {artisan_id: i for i, artisan_id in enumerate(artisan_ids)}
+            cols = np.fromiter((index.get(artisan_id, -1) for artisan_id in artisans), np.int64, len(artisans))
+            known = cols >= 0
+            users, cols, values = np.asarray(users, dtype=object)[known], cols[known], values[known]
+        user_ids, rows = np.unique(np.asarray(users, dtype=object), return_inverse=True)
+
+        keys, inverse = np.unique(rows.astype(np.int64) * len(artisan_ids) + cols, return_inverse=True)
+        summed = np.bincount(inverse, weights=values, minlength=len(keys))
+        return cls(keys // len(artisan_ids), keys % len(artisan_ids), summed, user_ids, np.asarray(artisan_ids))
+
+    def matmul(self, dense: np.ndarray) -> np.ndarray:
+        """X @ dense"""
+        out = np.empty((self.shape[0], dense.shape[1]))
+        for j in range(dense.shape[1]):
+            out[:, j] = np.bincount(self.rows, weights=self.values * dense[self.cols, j], minlength=self.shape[0])
+        return out
+
+    def rmatmul(self, dense: np.ndarray) -> np.ndarray:
+        """Xᵀ @ dense"""
+        out = np.empty((self.shape[1], dense.shape[1]))
+        for j in range(dense.shape[1]):
+            out[:, j] = np.bincount(self.cols, weights=self.values * dense[self.rows, j], minlength=self.shape[1])
+        return out
+
+    def row_bounds(self) -> np.ndarray:
+        """Interactions of row r are [bounds[r], bounds[r + 1])"""
+        return np.searchsorted(self.rows, np.arange(self.shape[0] + 1))
+
+
+def truncated_svd(matrix: InteractionMatrix, k: int, oversample: int = 10, power_iterations: int = 3,
+                  seed: int = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Randomized SVD (Halko et al.): U (users × k), Σ (k), V (artisans × k)"""
+    width = min(k + oversample, *matrix.shape)
+    k = min(k, width)
+    rng = np.random.default_rng(seed)
+    q, _ = np.linalg.qr(matrix.matmul(rng.standard_normal((matrix.shape[1], width))))
+    for _ in range(power_iterations):
+        z, _ = np.linalg.qr(matrix.rmatmul(q))
+        q, _ = np.linalg.qr(matrix.matmul(z))
+    u_small, sigma, vt = np.linalg.svd(matrix.rmatmul(q).T, full_matrices=False)
+    return (q @ u_small)[:, :k], sigma[:k], vt[:k].T
+
+
+def top_n(matrix: InteractionMatrix, item_factors: np.ndarray,
+          n: int) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    """(row, artisan indices, scores) per user, best first, excluding artisans already interacted with"""
+    user_vectors = matrix.matmul(item_factors)
+    bounds = matrix.row_bounds()
+    n_users, n_artisans = matrix.shape
+    n = min(n, n_artisans)
+    block = max(1, SCORE_BUDGET // max(n_artisans, 1))
+    for start in range(0, n_users, block):
+        end = min(start + block, n_users)
+        scores = user_vectors[start:end] @ item_factors.T
+        lo, hi = bounds[start], bounds[end]
+        scores[matrix.rows[lo:hi] - start, matrix.cols[lo:hi]] = -np.inf
+        best = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        for offset in range(end - start):
+            keep = best_scores[offset] > MIN_SCORE
+            yield start + offset, best[offset][keep], best_scores[offset][keep]
+
+
+def affinity_scores(artisan_ids: List[str]) -> Dict[str, float]:
+    """Ranking feature from a recommendation list: 1 for the first artisan, decreasing linearly"""
+    n = len(artisan_ids)
+    return {artisan_id: 1.0 - position / n for position, artisan_id in enumerate(artisan_ids)}
+
+
+class RecommendationJob:
+    def __init__(self, db, factors: int = RECOMMENDATIONS_FACTORS, top_n: int = RECOMMENDATIONS_TOP_N):
+        self.db = db
+        self.factors = factors
+        self.top_n = top_n
+
+    async def run(self, full: bool = False) -> Dict[str, Any]:
+        state = None if full else await self.db.recommendation_models.find_one({"_id": MODEL_STATE_ID})
+        if state is None:
+            return await self.run_full()
+        return await self.run_incremental(state)
+
+    async def run_full(self) -> Dict[str, Any]:
+        started = datetime.utcnow()
+        previous = await self.db.recommendation_models.find_one({"_id": MODEL_STATE_ID})
+        artisans = await self._artisan_ids()
+        matrix = InteractionMatrix.from_triples(*await self._interactions(artisans))
+        if not matrix.values.size:
+            await self.db.recommendations.delete_many({})
+            return {"mode": "full", "users": 0, "interactions": 0}
+        _, _, item_factors = truncated_svd(matrix, self.factors)
+
+        model_id = str(uuid.uuid4())
+        await self._save_model(model_id, matrix.artisan_ids, item_factors)
+        written = len(await self._write(matrix, item_factors, model_id))
+        # Particuliers left out of this model would keep the previous model's list
+        await self.db.recommendations.delete_many({"model_id": {"$ne": model_id}})
+        await self.db.recommendation_models.replace_one({"_id": MODEL_STATE_ID}, {
+            "_id": MODEL_STATE_ID,
+            "model_id": model_id,
+            "factors": item_factors.shape[1],
+            "built_at": started,
+            "last_run": started,
+        }, upsert=True)
+        if previous:
+            await self.db.recommendation_models.delete_many({"model_id": previous["model_id"], "chunk": {"$gte": 0}})
+        return {"mode": "full", "users": written, "artisans": matrix.shape[1], "interactions": matrix.values.size}
+
+    async def run_incremental(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        started = datetime.utcnow()
+        users = await self._changed_users(state["last_run"] - SINCE_OVERLAP)
+        written = 0
+        if users:
+            artisan_ids, item_factors = await self._load_model(state)
+            known = set(artisan_ids)
+            for start in range(0, len(users), FOLD_IN_BATCH):
+                batch = users[start:start + FOLD_IN_BATCH]
+                triples = await self._interactions(known, batch)
+                matrix = InteractionMatrix.from_triples(*triples, artisan_ids=artisan_ids)
+                refreshed = await self._write(matrix, item_factors, state["model_id"])
+                written += len(refreshed)
+                # No interaction left on a modelled artisan: the stored list is stale
+                emptied = sorted(set(batch) - refreshed)
+                if emptied:
+                    await self.db.recommendations.delete_many({"user_id": {"$in": emptied}})
+        await self.db.recommendation_models.update_one({"_id": MODEL_STATE_ID}, {"$set": {"last_run": started}})
+        return {"mode": "incremental", "changed_users": len(users), "users": written}
+
+    async def _artisan_ids(self) -> Set[str]:
+        return {doc["id"] async for doc in self.db.users.find({"user_type": "artisan"}, {"_id": 0, "id": 1})}
+
+    async def _interactions(self, artisans: Set[str], user_ids: Optional[List[str]] = None):
+        """(users, artisans, values) of particuliers' swipes on artisans and their matches"""
+        users: List[str] = []
+        targets: List[str] = []
+        values: List[float] = []
+        query = {"user_id": {"$in": user_ids}} if user_ids is not None else {}
+        swipes = self.db.swipes.find(query, {"_id": 0, "user_id": 1, "target_id": 1, "direction": 1})
+        async for swipe in swipes.batch_size(10000):
+            weight = INTERACTION_WEIGHTS.get(swipe.get("direction"))
+            # Artisans' swipes on particuliers are not artisan preferences
+            if weight is not None and swipe["target_id"] in artisans:
+                users.append(swipe["user_id"])
+                targets.append(swipe["target_id"])
+                values.append(weight)
+        query = {"particulier_id": {"$in": user_ids}} if user_ids is not None else {}
+        async for match in self.db.matches.find(query, {"_id": 0, "particulier_id": 1, "artisan_id": 1}):
+            if match["artisan_id"] in artisans:
+                users.append(match["particulier_id"])
+                targets.append(match["artisan_id"])
+                values.append(INTERACTION_WEIGHTS["match"])
+        return users, targets, values
+
+    async def _changed_users(self, since: datetime) -> List[str]:
+        changed: Set[str] = set()
+        for collection, field in ((self.db.swipes, "$user_id"), (self.db.matches, "$particulier_id")):
+            pipeline = [{"$match": {"created_at": {"$gte": since}}}, {"$group": {"_id": field}}]
+            async for doc in collection.aggregate(pipeline):
+                changed.add(doc["_id"])
+        return sorted(changed)
+
+    async def _write(self, matrix: InteractionMatrix, item_factors: np.ndarray, model_id: str) -> Set[str]:
+        """Upsert the lists of the matrix's particuliers, returns their ids"""
+        now = datetime.utcnow()
+        operations = []
+        written: Set[str] = set()
+        for row, artisans, scores in top_n(matrix, item_factors, self.top_n):
+            written.add(str(matrix.user_ids[row]))
+            operations.append(UpdateOne({"user_id": matrix.user_ids[row]}, {"$set": {
+                "artisan_ids": [str(artisan_id) for artisan_id in matrix.artisan_ids[artisans]],
+                "scores": [round(float(score), 6) for score in scores],
+                "model_id": model_id,
+                "updated_at": now,
+            }}, upsert=True))
+            if len(operations) == WRITE_BATCH:
+                await self.db.recommendations.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            await self.db.recommendations.bulk_write(operations, ordered=False)
+        return written
+
+    async def _save_model(self, model_id: str, artisan_ids: np.ndarray, item_factors: np.ndarray):
+        factors = item_factors.astype(np.float32)
+        for chunk, start in enumerate(range(0, len(artisan_ids), MODEL_CHUNK_ROWS)):
+            await self.db.recommendation_models.insert_one({
+                "_id": f"{model_id}:{chunk}",
+                "model_id": model_id,
+                "chunk": chunk,
+                "artisan_ids": [str(artisan_id) for artisan_id in artisan_ids[start:start + MODEL_CHUNK_ROWS]],
+                "factors": factors[start:start + MODEL_CHUNK_ROWS].tobytes(),
+            })
+
+    async def _load_model(self, state: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+        artisan_ids: List[str] = []
+        blocks = []
+        # The state document carries the model id too, but no chunk number
+        query = {"model_id": state["model_id"], "chunk": {"$gte": 0}}
+        chunks = self.db.recommendation_models.find(query).sort("chunk", 1)
+        async for chunk in chunks:
+            artisan_ids += chunk["artisan_ids"]
+            blocks.append(np.frombuffer(chunk["factors"], dtype=np.float32).reshape(-1, state["factors"]))
+        return np.asarray(artisan_ids, dtype=object), np.vstack(blocks).astype(np.float64)
+
+
+def bench(interactions: int, factors: int, top: int, seed: int = 0):
+    """Synthetic low-rank interactions: time of each step on one core"""
+    rng = np.random.default_rng(seed)
+    n_users, n_artisans = max(interactions // 20, 10), max(interactions // 100, 10)
+    taste = rng.standard_normal((n_users, 8))
+    profile = rng.standard_normal((n_artisans, 8))
+    users = rng.integers(0, n_users, interactions)
+    artisans = rng.integers(0, n_artisans, interactions)
+    liked = np.einsum("ij,ij->i", taste[users], profile[artisans]) > 0
+    values = np.where(liked, INTERACTION_WEIGHTS["right"], INTERACTION_WEIGHTS["left"])
+    user_ids = np.array([f"u{i}" for i in range(n_users)], dtype=object)[users]
+    artisan_ids = np.array([f"a{i}" for i in range(n_artisans)], dtype=object)[artisans]
+
+    print(f"{interactions:,} interactions, {n_users:,} particuliers, {n_artisans:,} artisans, {factors} facteurs")
+    start = time.perf_counter()
+    matrix = InteractionMatrix.from_triples(list(user_ids), list(artisan_ids), values)
+    print(f"  matrice creuse : {time.perf_counter() - start:6.1f} s ({matrix.values.size:,} paires)")
+    start = time.perf_counter()
+    _, _, item_factors = truncated_svd(matrix, factors)
+    print(f"  SVD tronquée   : {time.perf_counter() - start:6.1f} s")
+    start = time.perf_counter()
+    served = sum(1 for _ in top_n(matrix, item_factors, top))
+    print(f"  top {top}         : {time.perf_counter() - start:6.1f} s ({served:,} particuliers)")
+
+
+async def main(full: bool):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[os.getenv("DB_NAME", "test_database")]
+    try:
+        start = time.perf_counter()
+        result = await RecommendationJob(db).run(full=full)
+        print(f"Recommandations ({result['mode']}) : {result} en {time.perf_counter() - start:.1f} s")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--full", action="store_true", help="refactorize instead of refreshing changed users")
+    parser.add_argument("--bench", type=int, metavar="INTERACTIONS", help="synthetic run, no database")
+    parser.add_argument("--factors", type=int, default=RECOMMENDATIONS_FACTORS)
+    parser.add_argument("--top", type=int, default=RECOMMENDATIONS_TOP_N)
+    args = parser.parse_args()
+    if args.bench:
+        bench(args.bench, args.factors, args.top)
+    else:
+        asyncio.run(main(args.full))
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Per-user seen-sets backed by Bloom filters
+
+Deck generation must skip every artisan a particulier already swiped. A
+`$nin` over the swiped ids grows with every swipe; a Bloom filter answers
+"already seen?" in constant memory per item with no false negatives, at
+the cost of hiding a fraction `error_rate` of unseen artisans.
+
+The filter is scalable: when a layer reaches its capacity a new layer,
+twice as large and with half the error rate, is added, so the overall
+false-positive rate stays under `error_rate` however many swipes a user
+makes. Filters live in the `seen_filters` collection (bits stored as
+binary) and are cached per worker; writes use a version number so two
+workers never overwrite each other's additions. Swipe ingestion marks
+filters in memory and a background flush writes each changed filter once
+per SEEN_FILTER_FLUSH_SECONDS.
+
+Memory per user:
+
+    python -m backend.seen_filter --report [--swipes 10000]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import logging
+import math
+import os
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from backend.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+SEEN_FILTER_ERROR_RATE = float(os.getenv("SEEN_FILTER_ERROR_RATE", "0.01"))
+SEEN_FILTER_INITIAL_CAPACITY = int(os.getenv("SEEN_FILTER_INITIAL_CAPACITY", "1000"))
+SEEN_FILTER_CACHE_SIZE = int(os.getenv("SEEN_FILTER_CACHE_SIZE", "10000"))
+SEEN_FILTER_CACHE_TTL_SECONDS = float(os.getenv("SEEN_FILTER_CACHE_TTL_SECONDS", "300"))
+SEEN_FILTER_FLUSH_SECONDS = float(os.getenv("SEEN_FILTER_FLUSH_SECONDS", "2"))
+
+MAX_WRITE_ATTEMPTS = 5
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float, bits: Optional[bytes] = None, count: int = 0):
+        if capacity <= 0 or not 0 < error_rate < 1:
+            raise ValueError("capacity must be positive and error_rate in (0, 1)")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(bits) if bits is not None else bytearray((self.size + 7) // 8)
+        self.count = count
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str) -> bool:
+        """Set the item's bits; return False if it was (probably) present already"""
+        added = False
+        for position in self._positions(item):
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not self.bits[byte] & mask:
+                self.bits[byte] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def __contains__(self, item: str) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    def to_document(self) -> Dict[str, Any]:
+        return {"capacity": self.capacity, "error_rate": self.error_rate, "count": self.count, "bits": bytes(self.bits)}
+
+    @classmethod
+    def from_document(cls, doc: Dict[str, Any]) -> "BloomFilter":
+        return cls(doc["capacity"], doc["error_rate"], doc["bits"], doc["count"])
+
+
+class SeenFilter:
+    """Scalable Bloom filter: a list of BloomFilter layers"""
+
+    def __init__(self, error_rate: float = SEEN_FILTER_ERROR_RATE,
+                 initial_capacity: int = SEEN_FILTER_INITIAL_CAPACITY,
+                 layers: Optional[List[BloomFilter]] = None, version: int = 0):
+        self.error_rate = error_rate
+        self.initial_capacity = initial_capacity
+        self.layers = layers or []
+        self.version = version
+
+    def __contains__(self, item: str) -> bool:
+        return any(item in layer for layer in self.layers)
+
+    def add(self, item: str) -> bool:
+        if item in self:
+            return False
+        if not self.layers or self.layers[-1].full:
+            # Layer i gets error_rate / 2^(i+1): the sum over all layers stays below error_rate
+            n = len(self.layers)
+            self.layers.append(BloomFilter(self.initial_capacity * 2 ** n, self.error_rate / 2 ** (n + 1)))
+        return self.layers[-1].add(item)
+
+    def update(self, items: Iterable[str]) -> int:
+        return sum(self.add(item) for item in items)
+
+    def __len__(self) -> int:
+        return sum(layer.count for layer in self.layers)
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(len(layer.bits) for layer in self.layers)
+
+    def to_document(self) -> Dict[str, Any]:
+        return {
+            "error_rate": self.error_rate,
+            "initial_capacity": self.initial_capacity,
+            "layers": [layer.to_document() for layer in self.layers],
+        }
+
+    @classmethod
+    def from_document(cls, doc: Dict[str, Any]) -> "SeenFilter":
+        return cls(doc["error_rate"], doc["initial_capacity"],
+                   [BloomFilter.from_document(layer) for layer in doc["layers"]], doc.get("version", 0))
+
+
+class SeenSetStore:
+    def __init__(self, db, error_rate: float = SEEN_FILTER_ERROR_RATE,
+                 initial_capacity: int = SEEN_FILTER_INITIAL_CAPACITY,
+                 cache_size: int = SEEN_FILTER_CACHE_SIZE, cache_ttl: float = SEEN_FILTER_CACHE_TTL_SECONDS):
+        self.db = db
+        self.error_rate = error_rate
+        self.initial_capacity = initial_capacity
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._dirty: Dict[str, List[str]] = defaultdict(list)
+
+    async def get(self, user_id: str) -> SeenFilter:
+        seen = self.cache.get(user_id)
+        if seen is None:
+            seen = await self._load(user_id)
+            self.cache.set(user_id, seen)
+        return seen
+
+    async def _load(self, user_id: str) -> SeenFilter:
+        doc = await self.db.seen_filters.find_one({"user_id": user_id}, {"_id": 0})
+        if doc:
+            return SeenFilter.from_document(doc)
+        # First use: seed from the swipes already recorded
+        seen = SeenFilter(self.error_rate, self.initial_capacity)
+        seen.update(await self.db.swipes.distinct("target_id", {"user_id": user_id}))
+        if len(seen):
+            await self._save(user_id, seen)
+        return seen
+
+    async def add(self, user_id: str, target_ids: Iterable[str]) -> SeenFilter:
+        """Add and persist immediately"""
+        target_ids = list(target_ids)
+        seen = await self.get(user_id)
+        if not seen.update(target_ids):
+            return seen
+        return await self._persist(user_id, target_ids)
+
+    def mark(self, user_id: str, target_ids: Iterable[str]):
+        """Add in memory now; persisted by the next flush()"""
+        target_ids = list(target_ids)
+        seen = self.cache.get(user_id)
+        if seen is not None:
+            seen.update(target_ids)
+        self._dirty[user_id].extend(target_ids)
+
+    async def flush(self):
+        """Persist every filter marked since the last flush: one write per user
+
+        A user whose write fails stays dirty and is retried by the next flush.
+        """
+        dirty, self._dirty = self._dirty, defaultdict(list)
+        results = await asyncio.gather(
+            *(self._persist(user_id, target_ids) for user_id, target_ids in dirty.items()),
+            return_exceptions=True,
+        )
+        for (user_id, target_ids), result in zip(dirty.items(), results):
+            if isinstance(result, Exception):
+                logger.error("Seen filter flush failed for user %s: %r", user_id, result)
+                self._dirty[user_id].extend(target_ids)
+
+    async def run_flush(self, interval_seconds: float):
+        """Background job: flush marked filters every `interval_seconds`"""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            await self.flush()
+
+    async def _persist(self, user_id: str, target_ids: List[str]) -> SeenFilter:
+        seen = await self.get(user_id)
+        seen.update(target_ids)
+        for _ in range(MAX_WRITE_ATTEMPTS):
+            if await self._save(user_id, seen):
+                return seen
+            # Another worker wrote first: start again from its version
+            seen = await self._reload(user_id)
+            seen.update(target_ids)
+        raise RuntimeError(f"Could not persist the seen filter of user {user_id}")
+
+    async def _reload(self, user_id: str) -> SeenFilter:
+        self.cache.invalidate(user_id)
+        return await self.get(user_id)
+
+    async def _save(self, user_id: str, seen: SeenFilter) -> bool:
+        version = seen.version
+        try:
+            result = await self.db.seen_filters.update_one(
+                {"user_id": user_id, "version": version},
+                {"$set": {**seen.to_document(), "version": version + 1}},
+                upsert=version == 0,
+            )
+        except DuplicateKeyError:
+            return False
+        if result.matched_count == 0 and result.upserted_id is None:
+            return False
+        seen.version = version + 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), "dirty_users": len(self._dirty)}
+
+
+def report(swipes: int, error_rate: float, initial_capacity: int):
+    import uuid
+
+    seen = SeenFilter(error_rate, initial_capacity)
+    seen.update(str(uuid.uuid4()) for _ in range(swipes))
+    probes = 100000
+    false_positives = sum(str(uuid.uuid4()) in seen for _ in range(probes))
+    nin_bytes = swipes * (36 + 1 + 4)  # BSON string element per id in the $nin array
+    print(f"{swipes} swipes, taux de faux positifs cible {error_rate:.2%}")
+    print(f"  couches : {len(seen.layers)} ({', '.join(str(layer.capacity) for layer in seen.layers)})")
+    print(f"  mémoire du filtre : {seen.memory_bytes / 1024:.1f} Kio")
+    print(f"  faux positifs mesurés : {false_positives / probes:.3%}")
+    print(f"  $nin équivalent : {nin_bytes / 1024:.1f} Kio par requête de deck")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--report", action="store_true", help="memory and false positives at --swipes")
+    parser.add_argument("--swipes", type=int, default=10000)
+    parser.add_argument("--error-rate", type=float, default=SEEN_FILTER_ERROR_RATE)
+    parser.add_argument("--initial-capacity", type=int, default=SEEN_FILTER_INITIAL_CAPACITY)
+    args = parser.parse_args()
+    if args.report:
+        report(args.swipes, args.error_rate, args.initial_capacity)
+    else:
+        parser.print_help()
@@ -1,9 +1,11 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, WebSocket, WebSocketDisconnect, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
@@ -19,6 +21,28 @@ from email.mime.multipart import MIMEMultipart
 import random
 import string
 
+from backend.cache import TTLCache
+from backend.passwords import AsyncPasswordHasher, PasswordServiceBusy
+from backend.platform_counters import PlatformCounters, counter_value
+from backend.pagination import InvalidCursor, paginate
+from backend.indexes import apply_indexes
+from backend.swipe_deck import DeckService
+from backend.deck_cache import DeckCache
+from backend.boost_scheduler import BoostScheduler
+from backend.seen_filter import SEEN_FILTER_FLUSH_SECONDS, SeenSetStore
+from backend.swipe_ingest import SwipeIngestor, SwipeQueueFull, SwipeQuotaExceeded
+from backend.matching import MatchMaker
+from backend.notification_bus import build_notification_bus
+from backend.realtime import ConnectionManager
+from backend.credits import CreditLedger, InsufficientCredits
+from backend.idempotency import IdempotencyKeyInProgress, IdempotencyKeyReused, IdempotencyStore
+from backend.match_unlock import MatchNotFound, MatchUnlocker, UnlockForbidden, UnlockInProgress
+from backend.geo import geocode, load_postal_codes, location_geo, point_coordinates
+from backend.lead_fanout import PENDING as FANOUT_PENDING, LeadFanout
+from backend.proposals import MAX_PROPOSALS_PAGE, DuplicateProposal, ProposalStore
+from backend.ticket_messages import MAX_MESSAGES_PAGE, TicketMessageStore
+from backend.ticket_assignment import OPEN_STATUSES as OPEN_TICKET_STATUSES, TicketAssigner
+
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -27,18 +51,64 @@ load_dotenv(ROOT_DIR / '.env')
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+USER_TOKEN_SCOPE = "user"
 INVITATION_TOKEN_EXPIRE_HOURS = 24
+ADMIN_CACHE_TTL_SECONDS = float(os.getenv("ADMIN_CACHE_TTL_SECONDS", "30"))
+ADMIN_CACHE_MAX_SIZE = int(os.getenv("ADMIN_CACHE_MAX_SIZE", "1024"))
+PLATFORM_COUNTERS_RECONCILE_SECONDS = float(os.getenv("PLATFORM_COUNTERS_RECONCILE_SECONDS", "600"))
+BOOST_SYNC_SECONDS = float(os.getenv("BOOST_SYNC_SECONDS", "5"))
+TICKET_ASSIGNMENT_SYNC_SECONDS = float(os.getenv("TICKET_ASSIGNMENT_SYNC_SECONDS", "30"))
+SWIPE_DURABILITY = os.getenv("SWIPE_DURABILITY", "ack")
+SWIPE_DAILY_LIMIT = int(os.getenv("SWIPE_DAILY_LIMIT", "1000"))
+SWIPE_MAX_QUEUE = int(os.getenv("SWIPE_MAX_QUEUE", "50000"))
+SWIPE_BATCH_SIZE = int(os.getenv("SWIPE_BATCH_SIZE", "1000"))
+SWIPE_FLUSH_INTERVAL = float(os.getenv("SWIPE_FLUSH_INTERVAL", "0.05"))
+MAX_SWIPE_BATCH = 100
+MATCH_UNLOCK_COST = int(os.getenv("MATCH_UNLOCK_COST", "3"))
+IDEMPOTENCY_WINDOW_SECONDS = float(os.getenv("IDEMPOTENCY_WINDOW_SECONDS", "86400"))
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "100"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hasher = AsyncPasswordHasher(pwd_context)
 
 # Security
 security = HTTPBearer()
 
+# Authenticated admin principals, keyed by admin id
+admin_principal_cache = TTLCache(maxsize=ADMIN_CACHE_MAX_SIZE, ttl=ADMIN_CACHE_TTL_SECONDS)
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
+platform_counters = PlatformCounters(db)
+seen_store = SeenSetStore(db)
+deck_cache = DeckCache()
+deck_service = DeckService(db, seen_store, cache=deck_cache)
+boost_scheduler = BoostScheduler(db.boosts, sync_interval=BOOST_SYNC_SECONDS)
+# Realtime notifications are delivered by the worker holding the user's WebSocket:
+# every worker subscribes connection_manager to the bus on startup
+notification_bus = build_notification_bus(os.getenv("NOTIFICATION_BUS", "memory"), db)
+connection_manager = ConnectionManager(max_queue=WS_SEND_QUEUE_SIZE, send_timeout=WS_SEND_TIMEOUT)
+
+async def push_realtime_notification(user_id: str, payload: dict):
+    await notification_bus.publish(user_id, payload)
+
+match_maker = MatchMaker(db, notify=push_realtime_notification)
+swipe_ingestor = SwipeIngestor(
+    db, seen_store, daily_limit=SWIPE_DAILY_LIMIT, durability=SWIPE_DURABILITY,
+    max_queue=SWIPE_MAX_QUEUE, batch_size=SWIPE_BATCH_SIZE, flush_interval=SWIPE_FLUSH_INTERVAL,
+    match_maker=match_maker
+)
+credit_ledger = CreditLedger(db)
+idempotency_store = IdempotencyStore(db.idempotency_keys, window_seconds=IDEMPOTENCY_WINDOW_SECONDS)
+match_unlocker = MatchUnlocker(db, credit_ledger, idempotency_store, cost=MATCH_UNLOCK_COST)
+lead_fanout = LeadFanout(db, notification_bus.publish_many, boosted_ids=boost_scheduler.active)
+proposal_store = ProposalStore(db)
+ticket_message_store = TicketMessageStore(db)
+ticket_assigner = TicketAssigner(db.support_tickets, db.admins, sync_interval=TICKET_ASSIGNMENT_SYNC_SECONDS)
 
 # Create the main app without a prefix
 app = FastAPI(
@@ -101,6 +171,10 @@ class InvitationStatus(str, Enum):
     ACCEPTED = "accepted"
     EXPIRED = "expired"
 
+class SwipeDirection(str, Enum):
+    LEFT = "left"
+    RIGHT = "right"
+
 # Define Models
 class User(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -112,12 +186,15 @@ class User(BaseModel):
     subscription_plan: SubscriptionPlan = SubscriptionPlan.PARTICULIER_FREE
     profile_data: Optional[Dict[str, Any]] = None
     location: Optional[Dict[str, str]] = None
+    geo: Optional[Dict[str, Any]] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     last_login: Optional[datetime] = None
     total_matches: int = 0
     total_projects: int = 0
     rating: Optional[float] = None
     verified: bool = False
+    categories: List[str] = []
+    blocked_users: List[str] = []
 
 class Admin(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -144,7 +221,8 @@ class SupportTicket(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     resolved_at: Optional[datetime] = None
-    messages: List[Dict[str, Any]] = []
+    message_count: int = 0
+    last_message: Optional[Dict[str, Any]] = None
 
 class Payment(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -162,11 +240,12 @@ class Match(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     particulier_id: str
     artisan_id: str
-    project_details: Dict[str, Any]
+    project_details: Dict[str, Any] = {}
     status: str = "active"
     created_at: datetime = Field(default_factory=datetime.utcnow)
     unlocked: bool = False
     unlock_payment_id: Optional[str] = None
+    pair_key: Optional[str] = None
 
 class Project(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -176,9 +255,11 @@ class Project(BaseModel):
     category: str
     budget_range: Optional[Dict[str, float]] = None
     location: Optional[Dict[str, str]] = None
+    geo: Optional[Dict[str, Any]] = None
     status: str = "open"
     created_at: datetime = Field(default_factory=datetime.utcnow)
-    proposals: List[Dict[str, Any]] = []
+    proposal_count: int = 0
+    best_price: Optional[float] = None
 
 class Invitation(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -219,6 +300,10 @@ class AdminLogin(BaseModel):
     email: EmailStr
     password: str
 
+class UserLogin(BaseModel):
+    email: EmailStr
+    password: str
+
 class AdminCreate(BaseModel):
     email: EmailStr
     name: str
@@ -242,6 +327,8 @@ class UserCreate(BaseModel):
     phone: Optional[str] = None
     user_type: UserType = UserType.PARTICULIER
     password: str
+    location: Optional[Dict[str, str]] = None
+    categories: List[str] = []
 
 class UserUpdate(BaseModel):
     name: Optional[str] = None
@@ -249,6 +336,7 @@ class UserUpdate(BaseModel):
     status: Optional[UserStatus] = None
     subscription_plan: Optional[SubscriptionPlan] = None
     verified: Optional[bool] = None
+    location: Optional[Dict[str, str]] = None
 
 class TicketCreate(BaseModel):
     title: str
@@ -269,6 +357,29 @@ class TicketMessage(BaseModel):
 class PasswordReset(BaseModel):
     email: EmailStr
 
+class SwipeTarget(BaseModel):
+    target_id: str
+    direction: SwipeDirection
+
+class SwipeBatch(BaseModel):
+    swipes: List[SwipeTarget] = Field(..., min_length=1, max_length=MAX_SWIPE_BATCH)
+
+class MatchUnlock(BaseModel):
+    # Rejected: a client-reported payment cannot be verified, unlocks are paid with credits
+    payment: Optional[Dict[str, Any]] = None
+
+class ProjectCreate(BaseModel):
+    title: str
+    description: str
+    category: str
+    budget_range: Optional[Dict[str, float]] = None
+    location: Optional[Dict[str, str]] = None
+
+class ProposalCreate(BaseModel):
+    price: float = Field(..., gt=0)
+    message: str
+    estimated_duration: Optional[str] = None
+
 class StatusCheck(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     client_name: str
@@ -279,11 +390,11 @@ class StatusCheckCreate(BaseModel):
     status: Optional[UserStatus] = None
 
 # Utility functions
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    return await password_hasher.verify(plain_password, hashed_password)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    return await password_hasher.hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -311,16 +422,57 @@ async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(
     try:
         payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
         admin_id: str = payload.get("sub")
-        if admin_id is None:
+        if admin_id is None or payload.get("scope") == USER_TOKEN_SCOPE:
             raise credentials_exception
     except jwt.PyJWTError:
         raise credentials_exception
     
-    admin = await db.admins.find_one({"id": admin_id})
+    admin = admin_principal_cache.get(admin_id)
     if admin is None:
+        admin_doc = await db.admins.find_one({"id": admin_id})
+        if admin_doc is None:
+            raise credentials_exception
+        admin = Admin(**admin_doc)
+        admin_principal_cache.set(admin_id, admin)
+    
+    return admin
+
+def invalidate_admin_principal(admin_id: str):
+    """Drop a cached admin principal after its document changed"""
+    admin_principal_cache.invalidate(admin_id)
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """The particulier or artisan the bearer token was issued to by /api/auth/login"""
+    return await user_from_token(credentials.credentials)
+
+async def user_from_token(token: str) -> User:
+    """Resolve a user access token to an active user, raising 401/403 otherwise"""
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        user_id: str = payload.get("sub")
+        if user_id is None or payload.get("scope") != USER_TOKEN_SCOPE:
+            raise credentials_exception
+    except jwt.PyJWTError:
         raise credentials_exception
     
-    return Admin(**admin)
+    # Read on every request: a suspension or a new block applies immediately
+    user_doc = await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
+    if user_doc is None:
+        raise credentials_exception
+    user = User(**user_doc)
+    if user.status != UserStatus.ACTIVE:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Account is not active"
+        )
+    
+    return user
 
 def check_permission(admin: Admin, required_permission: str):
     if admin.role == AdminRole.SUPER_ADMIN:
@@ -376,6 +528,58 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(PasswordServiceBusy)
+async def password_service_busy_handler(request, exc):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Too many login attempts in progress, please retry"},
+        headers={"Retry-After": "1"}
+    )
+
+@app.exception_handler(SwipeQueueFull)
+async def swipe_queue_full_handler(request, exc):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Too many swipes in progress, please retry"},
+        headers={"Retry-After": "1"}
+    )
+
+@app.exception_handler(SwipeQuotaExceeded)
+async def swipe_quota_exceeded_handler(request, exc):
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": "Daily swipe quota exceeded"}
+    )
+
+@app.exception_handler(InsufficientCredits)
+async def insufficient_credits_handler(request, exc):
+    return JSONResponse(
+        status_code=status.HTTP_402_PAYMENT_REQUIRED,
+        content={"detail": "Insufficient credits", "balance": exc.balance, "cost": exc.cost}
+    )
+
+@app.exception_handler(IdempotencyKeyInProgress)
+async def idempotency_key_in_progress_handler(request, exc):
+    return JSONResponse(
+        status_code=status.HTTP_409_CONFLICT,
+        content={"detail": "A request with this idempotency key is in progress"},
+        headers={"Retry-After": "1"}
+    )
+
+@app.exception_handler(IdempotencyKeyReused)
+async def idempotency_key_reused_handler(request, exc):
+    return JSONResponse(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        content={"detail": "Idempotency key already used for a different request"}
+    )
+
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(request, exc):
+    return JSONResponse(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        content={"detail": str(exc)}
+    )
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -387,7 +591,7 @@ logger = logging.getLogger(__name__)
 @api_router.post("/admin/login")
 async def admin_login(login_data: AdminLogin):
     admin = await db.admins.find_one({"email": login_data.email})
-    if not admin or not verify_password(login_data.password, admin["password_hash"]):
+    if not admin or not await verify_password(login_data.password, admin["password_hash"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
@@ -409,6 +613,7 @@ async def admin_login(login_data: AdminLogin):
         {"id": admin["id"]},
         {"$set": {"last_login": datetime.utcnow()}}
     )
+    invalidate_admin_principal(admin["id"])
     
     return {
         "access_token": access_token,
@@ -422,6 +627,31 @@ async def admin_login(login_data: AdminLogin):
         }
     }
 
+# User Authentication Routes
+@api_router.post("/auth/login")
+async def user_login(login_data: UserLogin):
+    """Issue a bearer token to a particulier or artisan"""
+    user = await db.users.find_one({"email": login_data.email}, {"_id": 0, "id": 1, "password_hash": 1, "status": 1})
+    if not user or not user.get("password_hash") or not await verify_password(login_data.password, user["password_hash"]):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password"
+        )
+    
+    if user.get("status", UserStatus.ACTIVE) != UserStatus.ACTIVE:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Account is not active"
+        )
+    
+    access_token = create_access_token(
+        data={"sub": user["id"], "scope": USER_TOKEN_SCOPE},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    await db.users.update_one({"id": user["id"]}, {"$set": {"last_login": datetime.utcnow()}})
+    
+    return {"access_token": access_token, "token_type": "bearer", "user_id": user["id"]}
+
 @api_router.get("/admin/me")
 async def get_current_admin_profile(current_admin: Admin = Depends(get_current_admin)):
     return {
@@ -533,13 +763,14 @@ async def accept_invitation(accept_data: AdminAcceptInvitation):
     admin = Admin(
         email=email,
         name=accept_data.name,
-        password_hash=get_password_hash(accept_data.password),
+        password_hash=await get_password_hash(accept_data.password),
         role=AdminRole(role),
         permissions=invitation.get("permissions", []),
         created_by=invitation["invited_by"]
     )
     
     await db.admins.insert_one(admin.dict())
+    await platform_counters.record_insert("admins", admin.dict())
     
     # Update invitation status
     await db.invitations.update_one(
@@ -600,6 +831,8 @@ async def list_invitations(current_admin: Admin = Depends(get_current_admin)):
 async def list_users(
     page: int = 1,
     limit: int = 20,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
     current_admin: Admin = Depends(get_current_admin)
 ):
     if not check_permission(current_admin, "view_users"):
@@ -608,9 +841,8 @@ async def list_users(
             detail="Not enough permissions"
         )
     
-    skip = (page - 1) * limit
-    users = await db.users.find().skip(skip).limit(limit).to_list(limit)
-    total = await db.users.count_documents({})
+    result = await paginate(db.users, {}, limit, cursor=cursor, page=page, include_total=include_total)
+    users = result["items"]
     
     return {
         "users": [
@@ -626,9 +858,11 @@ async def list_users(
             }
             for user in users
         ],
-        "total": total,
+        "total": result.get("total"),
         "page": page,
-        "limit": limit
+        "limit": limit,
+        "next_cursor": result["next_cursor"],
+        "has_more": result["has_more"]
     }
 
 @api_router.put("/admin/users/{user_id}")
@@ -657,12 +891,21 @@ async def update_user(
         update_data["phone"] = user_update.phone
     if user_update.status is not None:
         update_data["status"] = user_update.status.value
+    if user_update.location is not None:
+        update_data["location"] = user_update.location
+        update_data["geo"] = location_geo(user_update.location)
     
     if update_data:
-        await db.users.update_one(
+        before = await db.users.find_one_and_update(
             {"id": user_id},
             {"$set": update_data}
         )
+        if before:
+            await platform_counters.record_update("users", before, update_data)
+        if "location" in update_data:
+            deck_cache.invalidate_user(user_id)
+        if update_data.get("status") in (UserStatus.SUSPENDED.value, UserStatus.BANNED.value):
+            deck_cache.invalidate_artisan(user_id)
     
     return {"message": "User updated successfully"}
 
@@ -684,7 +927,11 @@ async def delete_user(
             detail="User not found"
         )
     
-    await db.users.delete_one({"id": user_id})
+    deleted = await db.users.find_one_and_delete({"id": user_id})
+    if deleted:
+        await platform_counters.record_delete("users", deleted)
+        deck_cache.invalidate_user(user_id)
+        deck_cache.invalidate_artisan(user_id)
     return {"message": "User deleted successfully"}
 
 # Statistics Routes
@@ -696,18 +943,17 @@ async def get_platform_stats(current_admin: Admin = Depends(get_current_admin)):
             detail="Not enough permissions"
         )
     
-    total_users = await db.users.count_documents({})
-    total_professionals = await db.users.count_documents({"is_professional": True})
-    total_admins = await db.admins.count_documents({})
-    total_reports = await db.reports.count_documents({})
-    pending_reports = await db.reports.count_documents({"status": "pending"})
+    counters = await platform_counters.read()
     
     return {
-        "total_users": total_users,
-        "total_professionals": total_professionals,
-        "total_admins": total_admins,
-        "total_reports": total_reports,
-        "pending_reports": pending_reports,
+        "total_users": counter_value(counters, "users"),
+        "total_professionals": counter_value(counters, "users", "is_professional", True),
+        "total_admins": counter_value(counters, "admins"),
+        "total_reports": counter_value(counters, "reports"),
+        "pending_reports": counter_value(counters, "reports", "status", "pending"),
+        "total_tickets": counter_value(counters, "support_tickets"),
+        "open_tickets": counter_value(counters, "support_tickets", "status", "open"),
+        "urgent_tickets": counter_value(counters, "support_tickets", "priority", "urgent"),
         "stats_generated_at": datetime.utcnow()
     }
 
@@ -717,6 +963,8 @@ async def list_reports(
     page: int = 1,
     limit: int = 20,
     status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
     current_admin: Admin = Depends(get_current_admin)
 ):
     if not check_permission(current_admin, "view_reports"):
@@ -729,9 +977,8 @@ async def list_reports(
     if status:
         query["status"] = status
     
-    skip = (page - 1) * limit
-    reports = await db.reports.find(query).skip(skip).limit(limit).to_list(limit)
-    total = await db.reports.count_documents(query)
+    result = await paginate(db.reports, query, limit, cursor=cursor, page=page, include_total=include_total)
+    reports = result["items"]
     
     return {
         "reports": [
@@ -748,9 +995,11 @@ async def list_reports(
             }
             for report in reports
         ],
-        "total": total,
+        "total": result.get("total"),
         "page": page,
-        "limit": limit
+        "limit": limit,
+        "next_cursor": result["next_cursor"],
+        "has_more": result["has_more"]
     }
 
 @api_router.put("/admin/reports/{report_id}/resolve")
@@ -771,20 +1020,45 @@ async def resolve_report(
             detail="Report not found"
         )
     
-    await db.reports.update_one(
+    changes = {
+        "status": "resolved",
+        "resolved_by": current_admin.id,
+        "resolved_at": datetime.utcnow()
+    }
+    before = await db.reports.find_one_and_update(
         {"id": report_id},
-        {"$set": {
-            "status": "resolved",
-            "resolved_by": current_admin.id,
-            "resolved_at": datetime.utcnow()
-        }}
+        {"$set": changes}
     )
+    if before:
+        await platform_counters.record_update("reports", before, changes)
     
     return {"message": "Report resolved successfully"}
 
 # Dashboard & Analytics Routes
+async def run_facet(collection, facets: Dict[str, list], match: Optional[dict] = None) -> Dict[str, list]:
+    """Run several sub-pipelines over one collection in a single round trip"""
+    pipeline = [{"$match": match}] if match else []
+    pipeline.append({"$facet": facets})
+    result = await collection.aggregate(pipeline).to_list(1)
+    return result[0] if result else {key: [] for key in facets}
+
+def facet_value(facet_result: Dict[str, list], key: str, default=0):
+    rows = facet_result.get(key) or []
+    return rows[0]["n"] if rows else default
+
+def facet_groups(facet_result: Dict[str, list], key: str) -> Dict[Any, int]:
+    return {row["_id"]: row["n"] for row in facet_result.get(key) or []}
+
+async def count_total(collection, estimated: bool = False) -> int:
+    if estimated:
+        return await collection.estimated_document_count()
+    return await collection.count_documents({})
+
 @api_router.get("/admin/dashboard")
-async def get_admin_dashboard(current_admin: Admin = Depends(get_current_admin)):
+async def get_admin_dashboard(
+    estimated_totals: bool = False,
+    current_admin: Admin = Depends(get_current_admin)
+):
     """Get complete admin dashboard data"""
     if not check_permission(current_admin, "view_dashboard"):
         raise HTTPException(
@@ -792,61 +1066,73 @@ async def get_admin_dashboard(current_admin: Admin = Depends(get_current_admin))
             detail="Not enough permissions"
         )
     
-    # Get current statistics
-    total_users = await db.users.count_documents({})
-    total_artisans = await db.users.count_documents({"user_type": "artisan"})
-    total_particuliers = await db.users.count_documents({"user_type": "particulier"})
-    active_users = await db.users.count_documents({"status": "active"})
-    new_users_today = await db.users.count_documents({
-        "created_at": {"$gte": datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)}
-    })
-    
-    total_matches = await db.matches.count_documents({})
-    total_projects = await db.projects.count_documents({})
-    total_tickets = await db.support_tickets.count_documents({})
-    open_tickets = await db.support_tickets.count_documents({"status": "open"})
-    
-    total_payments = await db.payments.aggregate([
-        {"$match": {"status": "completed"}},
-        {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-    ]).to_list(1)
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    # One aggregation per collection, all in flight at once
+    users, tickets, payments, total_matches, total_projects = await asyncio.gather(
+        run_facet(db.users, {
+            "by_type": [{"$group": {"_id": "$user_type", "n": {"$sum": 1}}}],
+            "active": [{"$match": {"status": "active"}}, {"$count": "n"}],
+            "new_today": [{"$match": {"created_at": {"$gte": today}}}, {"$count": "n"}]
+        }),
+        run_facet(db.support_tickets, {
+            "by_status": [{"$group": {"_id": "$status", "n": {"$sum": 1}}}]
+        }),
+        run_facet(db.payments, {
+            "total": [{"$group": {"_id": None, "n": {"$sum": "$amount"}}}],
+            "today": [
+                {"$match": {"paid_at": {"$gte": today}}},
+                {"$group": {"_id": None, "n": {"$sum": "$amount"}}}
+            ]
+        }, match={"status": "completed"}),
+        count_total(db.matches, estimated_totals),
+        count_total(db.projects, estimated_totals)
+    )
     
-    revenue_today = await db.payments.aggregate([
-        {"$match": {
-            "status": "completed",
-            "paid_at": {"$gte": datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)}
-        }},
-        {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-    ]).to_list(1)
+    users_by_type = facet_groups(users, "by_type")
+    tickets_by_status = facet_groups(tickets, "by_status")
     
     return {
         "users": {
-            "total": total_users,
-            "artisans": total_artisans,
-            "particuliers": total_particuliers,
-            "active": active_users,
-            "new_today": new_users_today
+            "total": sum(users_by_type.values()),
+            "artisans": users_by_type.get("artisan", 0),
+            "particuliers": users_by_type.get("particulier", 0),
+            "active": facet_value(users, "active"),
+            "new_today": facet_value(users, "new_today")
         },
         "business": {
             "total_matches": total_matches,
             "total_projects": total_projects,
-            "total_revenue": total_payments[0]["total"] if total_payments else 0,
-            "revenue_today": revenue_today[0]["total"] if revenue_today else 0
+            "total_revenue": facet_value(payments, "total"),
+            "revenue_today": facet_value(payments, "today")
         },
         "support": {
-            "total_tickets": total_tickets,
-            "open_tickets": open_tickets
+            "total_tickets": sum(tickets_by_status.values()),
+            "open_tickets": tickets_by_status.get("open", 0)
         },
         "updated_at": datetime.utcnow()
     }
 
 # Support Ticket Management
+@api_router.post("/support/tickets")
+async def create_support_ticket(ticket_data: TicketCreate, current_user: User = Depends(get_current_user)):
+    """Open a support ticket for the authenticated user"""
+    ticket = SupportTicket(**ticket_data.dict(), user_id=current_user.id)
+    await db.support_tickets.insert_one(ticket.dict())
+    await platform_counters.record_insert("support_tickets", ticket.dict())
+    # Auto-assigned right away rather than at the next sync
+    ticket_assigner.queue(ticket.dict())
+    
+    return {"message": "Ticket created successfully", "ticket_id": ticket.id}
+
 @api_router.get("/admin/tickets")
 async def get_support_tickets(
     page: int = 1,
     limit: int = 20,
     status: Optional[str] = None,
     priority: Optional[str] = None,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
     current_admin: Admin = Depends(get_current_admin)
 ):
     """Get support tickets with filtering"""
@@ -862,15 +1148,18 @@ async def get_support_tickets(
     if priority:
         query["priority"] = priority
     
-    skip = (page - 1) * limit
-    tickets = await db.support_tickets.find(query).skip(skip).limit(limit).to_list(limit)
-    total = await db.support_tickets.count_documents(query)
+    result = await paginate(
+        db.support_tickets, query, limit, cursor=cursor, page=page,
+        include_total=include_total, projection={"_id": False, "messages": False}
+    )
     
     return {
-        "tickets": tickets,
-        "total": total,
+        "tickets": result["items"],
+        "total": result.get("total"),
         "page": page,
-        "limit": limit
+        "limit": limit,
+        "next_cursor": result["next_cursor"],
+        "has_more": result["has_more"]
     }
 
 @api_router.post("/admin/tickets/{ticket_id}/assign")
@@ -886,13 +1175,62 @@ async def assign_ticket(
             detail="Not enough permissions"
         )
     
-    await db.support_tickets.update_one(
+    previous = await db.support_tickets.find_one_and_update(
         {"id": ticket_id},
-        {"$set": {"assigned_to": assigned_to, "updated_at": datetime.utcnow()}}
+        {"$set": {"assigned_to": assigned_to, "updated_at": datetime.utcnow()}},
+        projection={"_id": 0, "assigned_to": 1, "status": 1}
     )
+    if previous and previous.get("status") in OPEN_TICKET_STATUSES and previous.get("assigned_to") != assigned_to:
+        ticket_assigner.ticket_released(previous.get("assigned_to"))
+        ticket_assigner.ticket_assigned(assigned_to)
     
     return {"message": "Ticket assigned successfully"}
 
+@api_router.put("/admin/tickets/{ticket_id}")
+async def update_ticket(
+    ticket_id: str,
+    ticket_update: TicketUpdate,
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """Update ticket status, priority or assignee"""
+    if not check_permission(current_admin, "respond_tickets"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    if ticket_update.assigned_to is not None and not check_permission(current_admin, "assign_tickets"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    update_data = {k: v for k, v in ticket_update.dict().items() if v is not None}
+    update_data["updated_at"] = datetime.utcnow()
+    if ticket_update.status in (TicketStatus.RESOLVED, TicketStatus.CLOSED):
+        update_data["resolved_at"] = update_data["updated_at"]
+    
+    previous = await db.support_tickets.find_one_and_update(
+        {"id": ticket_id}, {"$set": update_data},
+        projection={"_id": 0, "assigned_to": 1, "status": 1, "priority": 1}
+    )
+    if not previous:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ticket not found"
+        )
+    await platform_counters.record_update("support_tickets", previous, update_data)
+    
+    # Keep the auto-assigner's per-admin open ticket counts in step
+    was_open = previous.get("status") in OPEN_TICKET_STATUSES
+    is_open = update_data.get("status", previous.get("status")) in OPEN_TICKET_STATUSES
+    assignee = update_data.get("assigned_to", previous.get("assigned_to"))
+    if was_open and (not is_open or assignee != previous.get("assigned_to")):
+        ticket_assigner.ticket_released(previous.get("assigned_to"))
+    if is_open and (not was_open or assignee != previous.get("assigned_to")):
+        ticket_assigner.ticket_assigned(assignee)
+    
+    return {"message": "Ticket updated successfully"}
+
 @api_router.post("/admin/tickets/{ticket_id}/messages")
 async def add_ticket_message(
     ticket_id: str,
@@ -906,24 +1244,46 @@ async def add_ticket_message(
             detail="Not enough permissions"
         )
     
-    message = {
-        "id": str(uuid.uuid4()),
-        "message": message_data.message,
-        "sender_id": current_admin.id,
-        "sender_type": "admin",
-        "sender_name": current_admin.name,
-        "created_at": datetime.utcnow()
-    }
+    if not await db.support_tickets.find_one({"id": ticket_id}, {"_id": 1}):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ticket not found"
+        )
     
-    await db.support_tickets.update_one(
-        {"id": ticket_id},
-        {
-            "$push": {"messages": message},
-            "$set": {"updated_at": datetime.utcnow()}
-        }
+    message = await ticket_message_store.add(
+        ticket_id, message_data.message, current_admin.id, "admin", sender_name=current_admin.name
     )
     
-    return {"message": "Message added successfully"}
+    return {"message": "Message added successfully", "id": message["id"]}
+
+@api_router.get("/admin/tickets/{ticket_id}/messages")
+async def get_ticket_messages(
+    ticket_id: str,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """Get a ticket's message history, newest first (cursor-paginated)"""
+    if not check_permission(current_admin, "view_tickets"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    ticket = await db.support_tickets.find_one({"id": ticket_id}, {"_id": 0, "message_count": 1})
+    if not ticket:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ticket not found"
+        )
+    
+    result = await ticket_message_store.page(ticket_id, min(limit, MAX_MESSAGES_PAGE), cursor=cursor)
+    return {
+        "messages": result["items"],
+        "message_count": ticket.get("message_count", 0),
+        "next_cursor": result["next_cursor"],
+        "has_more": result["has_more"]
+    }
 
 # User Management Extended
 @api_router.post("/admin/users")
@@ -951,10 +1311,14 @@ async def create_user(
         name=user_data.name,
         phone=user_data.phone,
         user_type=user_data.user_type,
+        location=user_data.location,
+        geo=location_geo(user_data.location),
+        categories=user_data.categories,
         verified=True  # Admin-created users are auto-verified
     )
     
-    await db.users.insert_one(user.dict())
+    await db.users.insert_one({**user.dict(), "password_hash": await get_password_hash(user_data.password)})
+    await platform_counters.record_insert("users", user.dict())
     
     return {"message": "User created successfully", "user_id": user.id}
 
@@ -979,12 +1343,13 @@ async def reset_user_password(
     
     # Generate temporary password
     temp_password = ''.join(random.choices(string.ascii_letters + string.digits, k=12))
+    await db.users.update_one(
+        {"id": user_id}, {"$set": {"password_hash": await get_password_hash(temp_password)}}
+    )
     
-    # In real implementation, you would:
-    # 1. Hash the temporary password
-    # 2. Update user's password
-    # 3. Send email with temporary password
-    # 4. Force password change on next login
+    # In real implementation, you would also:
+    # 1. Send email with temporary password
+    # 2. Force password change on next login
     
     # Mock implementation
     print(f"Temporary password for {user['email']}: {temp_password}")
@@ -1105,6 +1470,250 @@ async def system_health_check(current_admin: Admin = Depends(get_current_admin))
         "version": "1.0.0"
     }
 
+@api_router.get("/admin/system/metrics")
+async def system_metrics(current_admin: Admin = Depends(get_current_admin)):
+    """Get in-process cache and pipeline metrics"""
+    if not check_permission(current_admin, "view_system"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    return {
+        "admin_principal_cache": admin_principal_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "boost_scheduler": boost_scheduler.stats(),
+        "deck_cache": deck_cache.stats(),
+        "seen_filter_cache": seen_store.stats(),
+        "swipe_ingestor": swipe_ingestor.stats(),
+        "idempotency_keys": idempotency_store.stats(),
+        "lead_fanout": lead_fanout.stats(),
+        "ticket_assigner": ticket_assigner.stats(),
+        "timestamp": datetime.utcnow()
+    }
+
+# Swipe Routes
+@api_router.get("/swipe/deck")
+async def get_swipe_deck(
+    category: Optional[str] = None,
+    city: Optional[str] = None,
+    radius_km: Optional[float] = Query(None, ge=0),
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Get the next ranked batch of artisan profiles for the authenticated particulier"""
+    if current_user.user_type != UserType.PARTICULIER:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only particuliers have a swipe deck"
+        )
+    
+    return await deck_service.build_deck(
+        current_user.dict(), category, city, limit, cursor, radius_km=radius_km,
+        boosted_ids=boost_scheduler.active, boost_version=boost_scheduler.version
+    )
+
+@api_router.post("/swipe")
+async def create_swipe(swipe: SwipeTarget, current_user: User = Depends(get_current_user)):
+    """Record a swipe of the authenticated user (acknowledged once queued, or once stored in durable mode)"""
+    return await ingest_swipes(current_user.id, [swipe])
+
+@api_router.post("/swipe/batch")
+async def create_swipes(batch: SwipeBatch, current_user: User = Depends(get_current_user)):
+    """Record up to MAX_SWIPE_BATCH swipes of the authenticated user"""
+    return await ingest_swipes(current_user.id, batch.swipes)
+
+async def ingest_swipes(user_id: str, swipes: List[SwipeTarget]):
+    """Queue swipes of `user_id`, an active user resolved by get_current_user"""
+    if any(swipe.target_id == user_id for swipe in swipes):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cannot swipe on yourself"
+        )
+    return await swipe_ingestor.submit(
+        user_id, [{"target_id": swipe.target_id, "direction": swipe.direction.value} for swipe in swipes]
+    )
+
+# Match Routes
+@api_router.post("/matches/{match_id}/unlock")
+async def unlock_match(
+    match_id: str,
+    unlock: MatchUnlock,
+    idempotency_key: str = Header(..., alias="Idempotency-Key", min_length=8, max_length=128),
+    current_user: User = Depends(get_current_user)
+):
+    """Unlock a match for the authenticated artisan with credits; retries with the same key are replayed"""
+    if unlock.payment is not None:
+        raise HTTPException(
+            status_code=status.HTTP_402_PAYMENT_REQUIRED,
+            detail="Card payments are not accepted for unlocks: buy credits, then unlock with credits"
+        )
+    try:
+        return await match_unlocker.unlock(match_id, current_user.id, idempotency_key)
+    except MatchNotFound:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Match not found"
+        )
+    except UnlockForbidden:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only the artisan of the match can unlock it"
+        )
+    except UnlockInProgress:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="This match is being unlocked by another request"
+        )
+
+@api_router.get("/artisans/search")
+async def search_artisans(
+    category: Optional[str] = None,
+    lat: Optional[float] = None,
+    lon: Optional[float] = None,
+    postal_code: Optional[str] = None,
+    radius_km: float = Query(20, gt=0),
+    min_lon: Optional[float] = None,
+    min_lat: Optional[float] = None,
+    max_lon: Optional[float] = None,
+    max_lat: Optional[float] = None,
+    limit: int = 20
+):
+    """Search artisans around a point / postal code, or inside a bounding box"""
+    bbox = (min_lon, min_lat, max_lon, max_lat)
+    if all(v is not None for v in bbox):
+        artisans = await deck_service.search_artisans(category, bbox=bbox, limit=limit)
+        return {"artisans": artisans}
+    
+    center = geocode({"lat": lat, "lon": lon, "postal_code": postal_code})
+    if center is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide lat/lon, a known postal_code or a bounding box"
+        )
+    
+    artisans = await deck_service.search_artisans(category, center=center, radius_km=radius_km, limit=limit)
+    return {"artisans": artisans}
+
+@api_router.post("/projects")
+async def create_project(project_data: ProjectCreate, current_user: User = Depends(get_current_user)):
+    """Publish a project for the authenticated particulier; matching artisans receive it as a lead in the background"""
+    if current_user.user_type != UserType.PARTICULIER:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only particuliers can publish projects"
+        )
+    
+    project = Project(**project_data.dict(), user_id=current_user.id, geo=location_geo(project_data.location))
+    document = {**project.dict(), "fanout_status": FANOUT_PENDING}
+    await db.projects.insert_one(document)
+    await db.users.update_one({"id": project.user_id}, {"$inc": {"total_projects": 1}})
+    lead_fanout.submit(project.id)
+    
+    document.pop("_id", None)
+    return document
+
+@api_router.get("/projects/{project_id}/artisans")
+async def match_project_artisans(project_id: str, radius_km: float = Query(20, gt=0), limit: int = 20):
+    """Artisans of the project's category within radius_km of the project"""
+    project = await db.projects.find_one({"id": project_id}, {"_id": 0, "category": 1, "location": 1, "geo": 1})
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+    
+    center = point_coordinates(project) or geocode(project.get("location"))
+    if center is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Project has no usable location"
+        )
+    
+    artisans = await deck_service.search_artisans(
+        project["category"], center=center, radius_km=radius_km, limit=limit
+    )
+    return {"project_id": project_id, "artisans": artisans}
+
+@api_router.post("/projects/{project_id}/proposals")
+async def submit_proposal(
+    project_id: str,
+    proposal_data: ProposalCreate,
+    current_user: User = Depends(get_current_user)
+):
+    """Send the authenticated artisan's quote for a project"""
+    if current_user.user_type != UserType.ARTISAN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only artisans can send proposals"
+        )
+    
+    project = await db.projects.find_one({"id": project_id}, {"_id": 0, "user_id": 1, "title": 1, "status": 1})
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+    if project.get("status") != "open":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Project is not open for proposals"
+        )
+    
+    try:
+        proposal = await proposal_store.submit(project_id, current_user.id, **proposal_data.dict())
+    except DuplicateProposal:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Proposal already sent for this project"
+        )
+    
+    await push_realtime_notification(project["user_id"], {
+        "type": "new_proposal",
+        "project_id": project_id,
+        "proposal_id": proposal["id"],
+        "title": project.get("title"),
+        "price": proposal["price"],
+    })
+    return proposal
+
+@api_router.get("/projects/{project_id}/proposals")
+async def get_project_proposals(
+    project_id: str,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Proposals of a project, newest first (cursor-paginated); an artisan only sees their own"""
+    project = await db.projects.find_one(
+        {"id": project_id}, {"_id": 0, "user_id": 1, "proposal_count": 1, "best_price": 1}
+    )
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+    
+    if project["user_id"] != current_user.id:
+        if current_user.user_type != UserType.ARTISAN:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Only the project owner can read its proposals"
+            )
+        # Competing quotes and the best price stay with the owner
+        own = await proposal_store.find(project_id, current_user.id)
+        return {"proposals": [own] if own else [], "next_cursor": None, "has_more": False}
+    
+    result = await proposal_store.page(project_id, min(limit, MAX_PROPOSALS_PAGE), cursor=cursor)
+    return {
+        "proposals": result["items"],
+        "proposal_count": project.get("proposal_count", 0),
+        "best_price": project.get("best_price"),
+        "next_cursor": result["next_cursor"],
+        "has_more": result["has_more"],
+    }
+
 # Permission management helper
 def get_default_permissions(role: AdminRole) -> List[str]:
     """Get default permissions for each role"""
@@ -1130,6 +1739,19 @@ def get_default_permissions(role: AdminRole) -> List[str]:
     }
     return permissions.get(role, [])
 
+# Load the postal code table up front; warns when POSTAL_CODES_FILE is not set
+@app.on_event("startup")
+async def load_postal_code_table():
+    """Load the postal code table used by geocoding"""
+    table = load_postal_codes()
+    logger.info("Loaded %d postal codes", len(table.by_postal_code))
+
+# Ensure indexes for every hot query path
+@app.on_event("startup")
+async def ensure_indexes():
+    """Create registered MongoDB indexes (idempotent)"""
+    await apply_indexes(db)
+
 # Initialize default super admin if none exists
 @app.on_event("startup")
 async def create_default_admin():
@@ -1140,12 +1762,13 @@ async def create_default_admin():
         default_admin = Admin(
             email="admin@swipetonpro.fr",
             name="Super Admin",
-            password_hash=get_password_hash("admin123"),
+            password_hash=await get_password_hash("admin123"),
             role=AdminRole.SUPER_ADMIN,
             permissions=get_default_permissions(AdminRole.SUPER_ADMIN)
         )
         
         await db.admins.insert_one(default_admin.dict())
+        await platform_counters.record_insert("admins", default_admin.dict())
         print("✅ Default super admin created: admin@swipetonpro.fr / admin123")
 
 app.add_middleware(
@@ -1156,9 +1779,80 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def repair_credit_ledger():
+    """Finish ledger appends interrupted by a crash"""
+    repaired = await credit_ledger.repair()
+    if repaired:
+        logger.warning("Repaired %d credit ledger entries", repaired)
+
+@app.on_event("startup")
+async def start_platform_counters_reconciliation():
+    """Periodically recount the materialized platform counters"""
+    app.state.platform_counters_task = asyncio.create_task(
+        platform_counters.run_reconciliation(PLATFORM_COUNTERS_RECONCILE_SECONDS)
+    )
+
+@app.on_event("startup")
+async def start_swipe_ingestor():
+    """Batch swipe writes and seen-set writes in the background"""
+    await notification_bus.prepare()
+    swipe_ingestor.start()
+    app.state.seen_filter_flush_task = asyncio.create_task(seen_store.run_flush(SEEN_FILTER_FLUSH_SECONDS))
+
+@app.on_event("startup")
+async def start_boost_scheduler():
+    """Activate and expire boosts on time"""
+    app.state.boost_scheduler_task = asyncio.create_task(boost_scheduler.run())
+
+@app.on_event("startup")
+async def start_ticket_assigner():
+    """Assign new support tickets to the least loaded support admin"""
+    app.state.ticket_assigner_task = asyncio.create_task(ticket_assigner.run())
+
+@app.on_event("startup")
+async def start_lead_fanout():
+    """Route new projects to artisans in the background"""
+    lead_fanout.start()
+
+@app.on_event("startup")
+async def start_notification_bus():
+    """Hand bus messages to the WebSockets this worker holds"""
+    app.state.notification_bus_task = asyncio.create_task(
+        notification_bus.run(connection_manager.send_personal_message)
+    )
+
+@app.websocket("/ws/notifications/{user_id}")
+async def websocket_notifications(websocket: WebSocket, user_id: str, token: str = Query(...)):
+    """Realtime notifications of the user the access token was issued to"""
+    try:
+        user = await user_from_token(token)
+    except HTTPException:
+        user = None
+    if user is None or user.id != user_id:
+        # 1008 = policy violation
+        await websocket.close(code=1008)
+        return
+    
+    await connection_manager.connect(user_id, websocket)
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        connection_manager.disconnect(user_id, websocket)
+
 # Include the routers in the main app AFTER all routes are defined
 app.include_router(api_router)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    app.state.platform_counters_task.cancel()
+    app.state.boost_scheduler_task.cancel()
+    app.state.ticket_assigner_task.cancel()
+    app.state.notification_bus_task.cancel()
+    await swipe_ingestor.stop()
+    await lead_fanout.stop()
+    app.state.seen_filter_flush_task.cancel()
+    await seen_store.flush()
     client.close()
+    password_hasher.shutdown()
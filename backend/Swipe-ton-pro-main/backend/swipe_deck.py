@@ -0,0 +1,262 @@
+"""
+Swipe deck generation for particuliers
+
+A deck is a page of active artisans matching an optional category, city and
+radius around the particulier, excluding artisans the particulier blocked
+(and artisans who blocked them). The filter and sort map onto the
+DECK_INDEXES / GEO_INDEXES so candidates are read as a bounded index scan.
+
+Candidates are read in pools of DECK_POOL_SIZE, best rated first. Artisans
+the particulier already swiped are dropped with their seen-set (a Bloom
+filter, see backend.seen_filter) and the rest of the pool is ordered by
+backend.ranking. The cursor holds the bounds of the current pool and the
+(score, id) of the last card served from it. Ranked pools are kept per
+particulier in a DeckCache (backend.deck_cache) when one is configured.
+The particulier's collaborative-filtering recommendations
+(backend.recommendations) feed the ranker's affinity feature.
+"""
+
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+
+from backend.deck_cache import CachedPool, DeckCache
+from backend.geo import Coordinates, haversine_km, point_coordinates, within_bbox, within_radius
+from backend.pagination import InvalidCursor, decode_token, encode_token
+from backend.ranking import load_weights, rank
+from backend.recommendations import affinity_scores
+from backend.seen_filter import SeenSetStore
+
+DECK_SORT = [("rating", DESCENDING), ("id", ASCENDING)]
+
+DECK_INDEXES = [
+    [("user_type", ASCENDING), ("status", ASCENDING)] + DECK_SORT,
+    [("user_type", ASCENDING), ("status", ASCENDING), ("categories", ASCENDING)] + DECK_SORT,
+    [("user_type", ASCENDING), ("status", ASCENDING), ("categories", ASCENDING), ("location.city", ASCENDING)] + DECK_SORT,
+]
+
+GEO_INDEXES = [
+    [("user_type", ASCENDING), ("status", ASCENDING), ("geo", "2dsphere")],
+    [("user_type", ASCENDING), ("status", ASCENDING), ("categories", ASCENDING), ("geo", "2dsphere")],
+]
+
+CARD_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "name": 1,
+    "rating": 1,
+    "verified": 1,
+    "location": 1,
+    "geo": 1,
+    "categories": 1,
+    "profile_data": 1,
+    "total_matches": 1,
+    "created_at": 1,
+    "last_login": 1,
+}
+
+MAX_DECK_PAGE = 50
+DECK_POOL_SIZE = 200
+MAX_POOLS_PER_PAGE = 5
+
+
+def candidate_query(category: Optional[str] = None, city: Optional[str] = None,
+                    excluded_ids: Optional[Set[str]] = None, viewer_id: Optional[str] = None,
+                    center: Optional[Coordinates] = None, radius_km: Optional[float] = None) -> Dict[str, Any]:
+    query: Dict[str, Any] = {"user_type": "artisan", "status": "active"}
+    if category:
+        query["categories"] = category
+    if city:
+        query["location.city"] = city
+    if center and radius_km:
+        query.update(within_radius(center, radius_km))
+    if excluded_ids:
+        query["id"] = {"$nin": sorted(excluded_ids)}
+    if viewer_id:
+        query["blocked_users"] = {"$ne": viewer_id}
+    return query
+
+
+def _check_position(position: Any) -> Tuple[Optional[float], str]:
+    if not isinstance(position, dict) or "i" not in position:
+        raise InvalidCursor("Invalid deck cursor")
+    return position.get("r"), str(position["i"])
+
+
+def after_deck_cursor(query: Dict[str, Any], position: Dict[str, Any]) -> Dict[str, Any]:
+    """Keyset on (rating desc, id asc); artisans without rating sort last"""
+    rating, doc_id = _check_position(position)
+    if rating is None:
+        keyset = {"rating": None, "id": {"$gt": doc_id}}
+    else:
+        keyset = {"$or": [
+            {"rating": {"$lt": rating}},
+            {"rating": rating, "id": {"$gt": doc_id}},
+            {"rating": None},
+        ]}
+    return {"$and": [query, keyset]}
+
+
+def up_to_deck_position(query: Dict[str, Any], position: Dict[str, Any]) -> Dict[str, Any]:
+    """Counterpart of after_deck_cursor: documents sorting at or before `position`"""
+    rating, doc_id = _check_position(position)
+    if rating is None:
+        keyset = {"$or": [{"rating": {"$ne": None}}, {"rating": None, "id": {"$lte": doc_id}}]}
+    else:
+        keyset = {"$or": [{"rating": {"$gt": rating}}, {"rating": rating, "id": {"$lte": doc_id}}]}
+    return {"$and": [query, keyset]}
+
+
+def deck_position(card: Dict[str, Any]) -> Dict[str, Any]:
+    return {"r": card.get("rating"), "i": card["id"]}
+
+
+def encode_deck_cursor(payload: Dict[str, Any]) -> str:
+    return encode_token(payload)
+
+
+def decode_deck_cursor(cursor: str) -> Dict[str, Any]:
+    payload = decode_token(cursor)
+    try:
+        if "s" in payload:
+            payload["s"], payload["k"] = float(payload["s"]), str(payload["k"])
+    except (KeyError, TypeError, ValueError) as exc:
+        raise InvalidCursor("Invalid deck cursor") from exc
+    return payload
+
+
+def after_ranked(cards: List[Dict[str, Any]], score: float, doc_id: str) -> List[Dict[str, Any]]:
+    """Cards sorting strictly after (score, id) in ranking order"""
+    return [card for card in cards if card["score"] < score or (card["score"] == score and card["id"] > doc_id)]
+
+
+def _position_key(position: Optional[Dict[str, Any]]) -> Optional[Tuple[Optional[float], str]]:
+    return (position.get("r"), str(position.get("i"))) if position else None
+
+
+def with_distance(cards: List[Dict[str, Any]], center: Optional[Coordinates]) -> List[Dict[str, Any]]:
+    if center:
+        for card in cards:
+            coordinates = point_coordinates(card)
+            card["distance_km"] = round(haversine_km(center, coordinates), 1) if coordinates else None
+    return cards
+
+
+class DeckService:
+    def __init__(self, db, seen_store: Optional[SeenSetStore] = None,
+                 weights: Optional[Dict[str, float]] = None, pool_size: int = DECK_POOL_SIZE,
+                 cache: Optional[DeckCache] = None):
+        self.db = db
+        self.seen_store = seen_store or SeenSetStore(db)
+        self.weights = load_weights(weights)
+        self.pool_size = pool_size
+        self.cache = cache
+
+    async def _load_pool(self, query: Dict[str, Any], position: Dict[str, Any]):
+        """Candidates of one pool, in index order, with the pool's end and whether more pools follow"""
+        if position.get("p"):
+            query = after_deck_cursor(query, position["p"])
+        # A pool is bounded on both ends once loaded: swiping only removes
+        # cards from it, so the (score, id) keyset stays valid across pages
+        if position.get("e"):
+            query = up_to_deck_position(query, position["e"])
+            pool: List[Dict[str, Any]] = await (
+                self.db.users.find(query, CARD_PROJECTION).sort(DECK_SORT)
+                .limit(self.pool_size).to_list(self.pool_size)
+            )
+            return pool, position["e"], bool(position.get("m"))
+        pool = await (
+            self.db.users.find(query, CARD_PROJECTION).sort(DECK_SORT)
+            .limit(self.pool_size + 1).to_list(self.pool_size + 1)
+        )
+        more_pools = len(pool) > self.pool_size
+        pool = pool[:self.pool_size]
+        return pool, deck_position(pool[-1]) if pool else None, more_pools
+
+    async def load_affinity(self, user_id: str) -> Dict[str, float]:
+        doc = await self.db.recommendations.find_one({"user_id": user_id}, {"_id": 0, "artisan_ids": 1})
+        return affinity_scores(doc["artisan_ids"]) if doc else {}
+
+    async def _ranked_pool(self, user_id: str, deck_key: Tuple, query: Dict[str, Any],
+                           position: Dict[str, Any], center: Optional[Coordinates],
+                           boosted_ids: Optional[Set[str]], boost_version: int,
+                           affinity: Dict[str, Any]):
+        """Ranked cards of one pool (seen cards included), from the cache when possible"""
+        pool_key = deck_key + (_position_key(position.get("p")),)
+        if self.cache:
+            cached = self.cache.get(user_id, pool_key)
+            if cached and (not position.get("e") or cached.pool_end == position["e"]):
+                if cached.boost_version != boost_version:
+                    cached.rerank(self.weights, center, boosted_ids, boost_version)
+                return self.cache.visible(cached), cached.pool_end, cached.more_pools
+            loaded_at = self.cache.now()
+        pool, pool_end, more_pools = await self._load_pool(query, position)
+        if "scores" not in affinity:
+            # Read once per page, and only when a pool has to be ranked
+            affinity["scores"] = await self.load_affinity(user_id)
+        # Scores do not depend on the rest of the pool: ranking it whole keeps the order of any subset
+        ranked = rank(pool, self.weights, center, boosted_ids, affinity=affinity["scores"])
+        if self.cache:
+            self.cache.put(user_id, pool_key, CachedPool(ranked, pool_end, more_pools, boost_version, loaded_at,
+                                                         affinity["scores"]))
+        return ranked, pool_end, more_pools
+
+    async def build_deck(self, particulier: Dict[str, Any], category: Optional[str] = None,
+                         city: Optional[str] = None, limit: int = 20,
+                         cursor: Optional[str] = None, center: Optional[Coordinates] = None,
+                         radius_km: Optional[float] = None,
+                         boosted_ids: Optional[Set[str]] = None, boost_version: int = 0) -> Dict[str, Any]:
+        limit = max(1, min(limit, MAX_DECK_PAGE))
+        center = center or point_coordinates(particulier)
+        position = decode_deck_cursor(cursor) if cursor else {}
+        seen = await self.seen_store.get(particulier["id"])
+        blocked = set(particulier.get("blocked_users") or [])
+        query = candidate_query(category, city, blocked,
+                                viewer_id=particulier["id"], center=center, radius_km=radius_km)
+        deck_key = (category, city, radius_km, tuple(center) if center else None, tuple(sorted(blocked)))
+
+        cards: List[Dict[str, Any]] = []
+        next_cursor = None
+        affinity: Dict[str, Any] = {}
+        for _ in range(MAX_POOLS_PER_PAGE):
+            pool, pool_end, more_pools = await self._ranked_pool(
+                particulier["id"], deck_key, query, position, center, boosted_ids, boost_version, affinity
+            )
+            ranked = [card for card in pool if card["id"] not in seen]
+            if "s" in position:
+                ranked = after_ranked(ranked, position["s"], position["k"])
+
+            taken = ranked[:limit - len(cards)]
+            # Copies: the ranked cards may be cached
+            cards += [dict(card) for card in taken]
+            if len(ranked) > len(taken):
+                next_cursor = encode_deck_cursor({
+                    "p": position.get("p"), "e": pool_end, "m": more_pools,
+                    "s": taken[-1]["score"], "k": taken[-1]["id"],
+                })
+                break
+            if not more_pools:
+                break
+            # Pool exhausted (mostly seen artisans): continue with the next one
+            position = {"p": pool_end}
+            next_cursor = encode_deck_cursor(position)
+            if len(cards) == limit:
+                break
+
+        return {
+            "cards": with_distance(cards, center),
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None,
+        }
+
+    async def search_artisans(self, category: Optional[str] = None, center: Optional[Coordinates] = None,
+                              radius_km: Optional[float] = None,
+                              bbox: Optional[Tuple[float, float, float, float]] = None,
+                              limit: int = 20) -> List[Dict[str, Any]]:
+        """Best rated artisans within a radius or a bounding box, with their distance"""
+        limit = max(1, min(limit, MAX_DECK_PAGE))
+        query = candidate_query(category, center=center, radius_km=radius_km)
+        if bbox:
+            query.update(within_bbox(*bbox))
+        cards = await self.db.users.find(query, CARD_PROJECTION).sort(DECK_SORT).limit(limit).to_list(limit)
+        return with_distance(cards, center)
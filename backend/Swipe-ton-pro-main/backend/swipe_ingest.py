@@ -0,0 +1,270 @@
+"""
+Swipe ingestion pipeline
+
+POST /api/swipe only checks the daily quota and enqueues the swipes; a
+background task drains the queue and, per batch:
+- writes the swipes with one insert_many,
+- marks the swiped artisans in each user's seen-set (written behind, see
+  backend.seen_filter),
+- adds the batch's counts to the daily quota documents (one bulk_write),
+- folds the swipes into their pair documents to detect mutual matches
+  (backend.matching).
+
+Durability modes (SWIPE_DURABILITY):
+- "ack": the request returns once the swipes are queued; a crash can lose
+  up to one queue of swipes.
+- "durable": the request returns once the batch holding its swipes is
+  written.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from backend.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_MODES = ("ack", "durable")
+_STOP = object()
+
+
+class SwipeQueueFull(Exception):
+    pass
+
+
+class SwipeQuotaExceeded(Exception):
+    pass
+
+
+def quota_day(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%d")
+
+
+class DailyQuota:
+    """
+    Swipes per user and UTC day. Counts are read from `swipe_quotas` once per
+    `ttl` and kept in memory in between; swipes queued but not yet written
+    are added on top, so a user cannot exceed the limit by racing the writer.
+    """
+
+    def __init__(self, collection, limit: int, ttl: float = 30.0, maxsize: int = 100000):
+        self.collection = collection
+        self.limit = limit
+        self.counts = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.pending: Dict[Tuple[str, str], int] = defaultdict(int)
+
+    async def reserve(self, user_id: str, n: int, now: datetime):
+        if self.limit <= 0:
+            return
+        key = (user_id, quota_day(now))
+        count = self.counts.get(key)
+        if count is None:
+            doc = await self.collection.find_one({"user_id": key[0], "day": key[1]}, {"_id": 0, "count": 1})
+            # Another request may have loaded it meanwhile
+            count = self.counts.get(key)
+            if count is None:
+                count = (doc or {}).get("count", 0) + self.pending[key]
+        if count + n > self.limit:
+            self.counts.set(key, count)
+            raise SwipeQuotaExceeded()
+        self.counts.set(key, count + n)
+        self.pending[key] += n
+
+    def release(self, user_id: str, n: int, now: datetime):
+        """Give back a reservation whose swipes were not queued"""
+        if self.limit <= 0:
+            return
+        key = (user_id, quota_day(now))
+        count = self.counts.get(key)
+        if count is not None:
+            self.counts.set(key, max(count - n, 0))
+        self.settle({key: n})
+
+    def updates(self, swipes: List[Dict[str, Any]]) -> Dict[Tuple[str, str], int]:
+        counts: Dict[Tuple[str, str], int] = defaultdict(int)
+        for swipe in swipes:
+            counts[(swipe["user_id"], quota_day(swipe["created_at"]))] += 1
+        return counts
+
+    async def write(self, counts: Dict[Tuple[str, str], int]):
+        if not counts:
+            return
+        await self.collection.bulk_write([
+            UpdateOne({"user_id": user_id, "day": day}, {"$inc": {"count": n}}, upsert=True)
+            for (user_id, day), n in counts.items()
+        ], ordered=False)
+
+    def settle(self, counts: Dict[Tuple[str, str], int]):
+        for key, n in counts.items():
+            remaining = self.pending.get(key, 0) - n
+            if remaining > 0:
+                self.pending[key] = remaining
+            else:
+                self.pending.pop(key, None)
+
+
+class SwipeIngestor:
+    def __init__(self, db, seen_store, daily_limit: int = 0, durability: str = "ack",
+                 max_queue: int = 50000, batch_size: int = 1000, flush_interval: float = 0.05,
+                 match_maker=None):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"durability must be one of {DURABILITY_MODES}")
+        self.db = db
+        self.seen_store = seen_store
+        self.match_maker = match_maker
+        self.quota = DailyQuota(db.swipe_quotas, daily_limit)
+        self.durability = durability
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.accepted = 0
+        self.written = 0
+        self.rejected = 0
+        self.failed = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Write everything still queued, then stop the drain task"""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        remaining = []
+        while not self._queue.empty():
+            remaining.append(self._queue.get_nowait())
+        for start in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[start:start + self.batch_size])
+        self._task = None
+
+    async def submit(self, user_id: str, swipes: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Queue the swipes of one user; raises SwipeQuotaExceeded or SwipeQueueFull"""
+        now = datetime.utcnow()
+        await self.quota.reserve(user_id, len(swipes), now)
+        if self.running and self._queue.maxsize - self._queue.qsize() < len(swipes):
+            self.quota.release(user_id, len(swipes), now)
+            self.rejected += len(swipes)
+            raise SwipeQueueFull()
+
+        docs = [{
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "target_id": swipe["target_id"],
+            "direction": swipe["direction"],
+            "created_at": now,
+        } for swipe in swipes]
+        durable = self.durability == "durable" or not self.running
+        waiter = asyncio.get_running_loop().create_future() if durable else None
+        if self.running:
+            for doc in docs[:-1]:
+                self._queue.put_nowait((doc, None))
+            self._queue.put_nowait((docs[-1], waiter))
+        else:
+            # Scripts and tests without the background task write directly
+            await self._flush([(doc, None) for doc in docs[:-1]] + [(docs[-1], waiter)])
+        self.accepted += len(docs)
+        if waiter is not None:
+            await waiter
+        return {"accepted": len(docs), "durable": durable, "ids": [doc["id"] for doc in docs]}
+
+    async def _run(self):
+        while True:
+            entry = await self._queue.get()
+            if entry is _STOP:
+                return
+            batch = [entry]
+            stopping = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    entry = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        entry = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if entry is _STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch: List[Tuple[Dict[str, Any], Optional[asyncio.Future]]]):
+        if not batch:
+            return
+        start = time.perf_counter()
+        swipes = [doc for doc, _ in batch]
+        counts = self.quota.updates(swipes)
+        error = None
+        try:
+            await self.db.swipes.insert_many(swipes, ordered=False)
+            self.written += len(swipes)
+        except Exception as exc:
+            self.failed += len(swipes)
+            logger.exception("Swipe batch write failed (%d swipes)", len(swipes))
+            error = exc
+        else:
+            seen: Dict[str, List[str]] = defaultdict(list)
+            for swipe in swipes:
+                seen[swipe["user_id"]].append(swipe["target_id"])
+            for user_id, targets in seen.items():
+                self.seen_store.mark(user_id, targets)
+            # The swipes are stored: a lost quota increment is corrected on the next reload
+            try:
+                await self.quota.write(counts)
+            except Exception:
+                logger.exception("Swipe quota update failed")
+            if self.match_maker:
+                try:
+                    await self.match_maker.record_many(swipes)
+                except Exception:
+                    logger.exception("Match detection failed for a swipe batch")
+        self.quota.settle(counts)
+        for _, waiter in batch:
+            if waiter is not None and not waiter.done():
+                if error is None:
+                    waiter.set_result(None)
+                else:
+                    waiter.set_exception(error)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.flushes += 1
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "durability": self.durability,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "max_queue": self.max_queue,
+            "accepted": self.accepted,
+            "written": self.written,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "max_flush_ms": round(self.max_flush_ms, 2),
+        }
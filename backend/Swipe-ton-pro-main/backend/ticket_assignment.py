@@ -0,0 +1,162 @@
+"""
+Support ticket auto-assignment
+
+Unassigned open tickets wait in a min-heap ordered by priority (urgent
+first) then age; support admins (active, with the respond_tickets
+permission or super admins) sit in a min-heap ordered by their number of
+open tickets. Assigning a ticket pops both heaps and pushes the admin back
+with one more ticket, O(log n) each. Admin heap entries are invalidated
+lazily: an entry whose load no longer matches the admin's current load is
+dropped when it reaches the top.
+
+The `support_tickets` documents are the state: the heaps are rebuilt from
+them on start and every `sync_interval` seconds, which also picks up
+tickets created, closed or reassigned by another process. A ticket is
+claimed with a conditional update on `assigned_to: None`, so two workers,
+or a worker and a manual assignment, never both assign the same ticket.
+"""
+
+import asyncio
+import heapq
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_ORDER = {"urgent": 0, "high": 1, "medium": 2, "low": 3}
+OPEN_STATUSES = ["open", "in_progress"]
+ELIGIBLE_ADMINS = {"is_active": True, "$or": [{"role": "super_admin"}, {"permissions": "respond_tickets"}]}
+
+_QueuedTicket = Tuple[int, datetime, str]  # (priority order, created_at, ticket id)
+
+
+class TicketAssigner:
+    def __init__(self, collection, admins, sync_interval: float = 30.0,
+                 clock: Callable[[], datetime] = datetime.utcnow):
+        self.collection = collection
+        self.admins = admins
+        self.sync_interval = sync_interval
+        self._clock = clock
+        self._tickets: List[_QueuedTicket] = []
+        self._queued: Set[str] = set()
+        self._admin_heap: List[Tuple[int, str]] = []
+        # Open tickets per eligible admin: heap entries not matching it are stale
+        self.loads: Dict[str, int] = {}
+        self._wakeup = asyncio.Event()
+        self.assigned = 0
+        self.lost_claims = 0
+        self.syncs = 0
+
+    def queue(self, ticket: Dict[str, Any]) -> bool:
+        """Add an unassigned ticket to the queue; already queued tickets are ignored"""
+        if ticket["id"] in self._queued:
+            return False
+        self._queued.add(ticket["id"])
+        # Tickets without a creation date are the oldest: they cannot be compared with None
+        heapq.heappush(self._tickets, (
+            PRIORITY_ORDER.get(ticket.get("priority"), len(PRIORITY_ORDER)),
+            ticket.get("created_at") or datetime.min,
+            ticket["id"],
+        ))
+        self._wakeup.set()
+        return True
+
+    def _set_load(self, admin_id: str, load: int):
+        self.loads[admin_id] = load
+        heapq.heappush(self._admin_heap, (load, admin_id))
+        if len(self._admin_heap) > 2 * len(self.loads) + 16:
+            self._admin_heap = [(load, admin_id) for admin_id, load in self.loads.items()]
+            heapq.heapify(self._admin_heap)
+
+    def least_loaded(self) -> Optional[str]:
+        while self._admin_heap:
+            load, admin_id = self._admin_heap[0]
+            if self.loads.get(admin_id) == load:
+                return admin_id
+            heapq.heappop(self._admin_heap)
+        return None
+
+    def ticket_assigned(self, admin_id: Optional[str]):
+        if admin_id in self.loads:
+            self._set_load(admin_id, self.loads[admin_id] + 1)
+
+    def ticket_released(self, admin_id: Optional[str]):
+        """The admin's ticket was resolved, closed or reassigned"""
+        if admin_id in self.loads:
+            self._set_load(admin_id, max(self.loads[admin_id] - 1, 0))
+
+    async def sync(self):
+        """Rebuild loads and the queue from the tickets collection"""
+        eligible = [admin["id"] async for admin in self.admins.find(ELIGIBLE_ADMINS, {"_id": 0, "id": 1})]
+        loads = dict.fromkeys(eligible, 0)
+        async for row in self.collection.aggregate([
+            {"$match": {"status": {"$in": OPEN_STATUSES}, "assigned_to": {"$in": eligible}}},
+            {"$group": {"_id": "$assigned_to", "count": {"$sum": 1}}},
+        ]):
+            loads[row["_id"]] = row["count"]
+        self.loads = loads
+        self._admin_heap = [(load, admin_id) for admin_id, load in loads.items()]
+        heapq.heapify(self._admin_heap)
+
+        self._tickets, self._queued = [], set()
+        async for ticket in self.collection.find(
+            {"status": "open", "assigned_to": None}, {"_id": 0, "id": 1, "priority": 1, "created_at": 1}
+        ):
+            self.queue(ticket)
+        self.syncs += 1
+
+    async def assign_next(self) -> Optional[Tuple[str, str]]:
+        """Claim the most urgent ticket for the least loaded admin; (ticket id, admin id) or None"""
+        while self._tickets:
+            admin_id = self.least_loaded()
+            if admin_id is None:
+                return None
+            _, _, ticket_id = heapq.heappop(self._tickets)
+            self._queued.discard(ticket_id)
+            now = self._clock()
+            claimed = await self.collection.find_one_and_update(
+                {"id": ticket_id, "status": "open", "assigned_to": None},
+                {"$set": {"assigned_to": admin_id, "auto_assigned_at": now, "updated_at": now}},
+                projection={"_id": 1},
+            )
+            if claimed is None:
+                # Assigned manually or by another worker, or closed meanwhile
+                self.lost_claims += 1
+                continue
+            self.ticket_assigned(admin_id)
+            self.assigned += 1
+            return ticket_id, admin_id
+        return None
+
+    async def run(self):
+        """Background job: assign queued tickets as they come, resync every sync_interval"""
+        await self.sync()
+        next_sync = asyncio.get_running_loop().time() + self.sync_interval
+        while True:
+            try:
+                while await self.assign_next():
+                    pass
+            except Exception:
+                logger.exception("Ticket auto-assignment failed")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(next_sync - asyncio.get_running_loop().time(), 0))
+            except asyncio.TimeoutError:
+                pass
+            if asyncio.get_running_loop().time() >= next_sync:
+                try:
+                    await self.sync()
+                except Exception:
+                    logger.exception("Ticket assignment sync failed")
+                next_sync = asyncio.get_running_loop().time() + self.sync_interval
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": len(self._queued),
+            "admins": len(self.loads),
+            "open_tickets_assigned": sum(self.loads.values()),
+            "assigned": self.assigned,
+            "lost_claims": self.lost_claims,
+            "syncs": self.syncs,
+        }
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Support ticket messages
+
+Messages are stored in the `ticket_messages` collection and read a page at
+a time through the (ticket_id, created_at, id) index. The ticket keeps a
+`message_count` and a `last_message` preview, set by the same update that
+bumps `updated_at`, which is all the ticket list shows.
+
+Tickets created before this stored their messages in an embedded
+`messages` array. Move them out (idempotent, can be re-run):
+
+    python -m backend.ticket_messages --migrate
+
+An embedded message whose id is already taken by a message of another
+ticket (ids copied between tickets) is not moved, and its ticket keeps the
+whole array for manual review.
+"""
+
+import argparse
+import asyncio
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from backend.pagination import paginate
+
+MESSAGE_PROJECTION = {"_id": 0}
+MAX_MESSAGES_PAGE = 100
+PREVIEW_LENGTH = 140
+MIGRATION_BATCH_SIZE = int(os.getenv("TICKET_MESSAGES_MIGRATION_BATCH_SIZE", "500"))
+
+_DUPLICATE_KEY = 11000
+
+
+def message_preview(message: Dict[str, Any]) -> Dict[str, Any]:
+    text = message.get("message") or ""
+    return {
+        "id": message["id"],
+        "message": text if len(text) <= PREVIEW_LENGTH else text[:PREVIEW_LENGTH - 1] + "…",
+        "sender_id": message.get("sender_id"),
+        "sender_type": message.get("sender_type"),
+        "sender_name": message.get("sender_name"),
+        "created_at": message["created_at"],
+    }
+
+
+class TicketMessageStore:
+    def __init__(self, db):
+        self.db = db
+
+    async def add(self, ticket_id: str, message: str, sender_id: str, sender_type: str,
+                  **extra: Any) -> Dict[str, Any]:
+        doc = {
+            "id": str(uuid.uuid4()),
+            "ticket_id": ticket_id,
+            "message": message,
+            "sender_id": sender_id,
+            "sender_type": sender_type,
+            "created_at": datetime.utcnow(),
+            **extra,
+        }
+        await self.db.ticket_messages.insert_one(doc)
+        await self.db.support_tickets.update_one(
+            {"id": ticket_id},
+            {
+                "$inc": {"message_count": 1},
+                "$set": {"last_message": message_preview(doc), "updated_at": doc["created_at"]},
+            }
+        )
+        doc.pop("_id", None)
+        return doc
+
+    async def page(self, ticket_id: str, limit: int, cursor: Optional[str] = None) -> Dict[str, Any]:
+        return await paginate(self.db.ticket_messages, {"ticket_id": ticket_id}, limit, cursor=cursor,
+                              projection=MESSAGE_PROJECTION)
+
+    async def recount(self, ticket_ids: List[str]) -> int:
+        """Recompute message_count and last_message from the ticket_messages collection"""
+        if not ticket_ids:
+            return 0
+        totals = {ticket_id: (0, None) for ticket_id in ticket_ids}
+        async for row in self.db.ticket_messages.aggregate([
+            {"$match": {"ticket_id": {"$in": ticket_ids}}},
+            {"$sort": {"ticket_id": 1, "created_at": 1, "id": 1}},
+            {"$group": {"_id": "$ticket_id", "count": {"$sum": 1}, "last": {"$last": "$$ROOT"}}},
+        ]):
+            totals[row["_id"]] = (row["count"], message_preview(row["last"]))
+        result = await self.db.support_tickets.bulk_write([
+            UpdateOne({"id": ticket_id}, {"$set": {"message_count": count, "last_message": last}})
+            for ticket_id, (count, last) in totals.items()
+        ], ordered=False)
+        return result.modified_count
+
+
+def _embedded_message(ticket: Dict[str, Any], index: int, embedded: Dict[str, Any]) -> Dict[str, Any]:
+    # Ids derived from the position keep a re-run from inserting copies
+    return {
+        **embedded,
+        "id": embedded.get("id") or str(uuid.uuid5(uuid.NAMESPACE_URL, f"ticket-message:{ticket['id']}:{index}")),
+        "ticket_id": ticket["id"],
+        "created_at": embedded.get("created_at") or ticket.get("created_at") or datetime.utcnow(),
+    }
+
+
+async def _migrate_batch(store: TicketMessageStore, tickets: List[Dict[str, Any]]) -> Dict[str, int]:
+    messages = [
+        _embedded_message(ticket, index, embedded)
+        for ticket in tickets
+        for index, embedded in enumerate(ticket["messages"])
+    ]
+    skipped: List[Dict[str, Any]] = []
+    try:
+        await store.db.ticket_messages.insert_many(messages, ordered=False)
+    except BulkWriteError as exc:
+        errors = exc.details.get("writeErrors", [])
+        if any(error.get("code") != _DUPLICATE_KEY for error in errors):
+            raise
+        skipped = [messages[error["index"]] for error in errors]
+    # Only a message stored under its id for its own ticket was moved by an
+    # earlier run; the others collided with a message of another ticket
+    moved = set()
+    if skipped:
+        moved = {(doc["id"], doc["ticket_id"]) async for doc in store.db.ticket_messages.find(
+            {"id": {"$in": [message["id"] for message in skipped]}}, {"_id": 0, "id": 1, "ticket_id": 1})}
+    unmigrated = [message for message in skipped if (message["id"], message["ticket_id"]) not in moved]
+    kept = {message["ticket_id"] for message in unmigrated}
+
+    await store.recount([ticket["id"] for ticket in tickets])
+    # Only unset arrays the batch read: a message pushed meanwhile stays for the next run
+    unset = [
+        UpdateOne({"_id": ticket["_id"], "messages": {"$size": len(ticket["messages"])}},
+                  {"$unset": {"messages": ""}})
+        for ticket in tickets if ticket["id"] not in kept
+    ]
+    if unset:
+        await store.db.support_tickets.bulk_write(unset, ordered=False)
+    return {"tickets": len(tickets) - len(kept), "messages": len(messages) - len(skipped),
+            "duplicates": len(skipped) - len(unmigrated), "unmigrated": len(unmigrated), "kept_tickets": len(kept)}
+
+
+async def migrate_embedded_messages(db, batch_size: int = MIGRATION_BATCH_SIZE) -> Dict[str, int]:
+    """Stream embedded SupportTicket.messages into ticket_messages, `batch_size` messages at a time"""
+    store = TicketMessageStore(db)
+    totals = {"tickets": 0, "messages": 0, "duplicates": 0, "unmigrated": 0, "kept_tickets": 0}
+    # Tickets whose array is empty only lose the field
+    await db.support_tickets.update_many({"messages": {"$size": 0}}, {"$unset": {"messages": ""}})
+    cursor = db.support_tickets.find({"messages.0": {"$exists": True}},
+                                     {"_id": 1, "id": 1, "created_at": 1, "messages": 1})
+    batch: List[Dict[str, Any]] = []
+    pending = 0
+    async for ticket in cursor:
+        batch.append(ticket)
+        pending += len(ticket["messages"])
+        if pending >= batch_size:
+            for key, count in (await _migrate_batch(store, batch)).items():
+                totals[key] += count
+            batch, pending = [], 0
+    if batch:
+        for key, count in (await _migrate_batch(store, batch)).items():
+            totals[key] += count
+    return totals
+
+
+async def main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[os.getenv("DB_NAME", "test_database")]
+    try:
+        totals = await migrate_embedded_messages(db)
+        print(f"{totals['tickets']} tickets migrés, {totals['messages']} messages déplacés, "
+              f"{totals['duplicates']} doublons ignorés")
+        if totals["unmigrated"]:
+            print(f"{totals['unmigrated']} messages en conflit non déplacés : "
+                  f"{totals['kept_tickets']} tickets gardent leur tableau `messages`")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--migrate", action="store_true", help="move embedded SupportTicket.messages to their collection")
+    args = parser.parse_args()
+    if args.migrate:
+        asyncio.run(main())
+    else:
+        parser.print_help()
@@ -1,43 +0,0 @@
-# --- WebSocket notifications (après app) ---
-from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, List
-
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, List[WebSocket]] = {}
-
-    async def connect(self, user_id: str, websocket: WebSocket):
-        await websocket.accept()
-        if user_id not in self.active_connections:
-            self.active_connections[user_id] = []
-        self.active_connections[user_id].append(websocket)
-
-    def disconnect(self, user_id: str, websocket: WebSocket):
-        if user_id in self.active_connections:
-            self.active_connections[user_id].remove(websocket)
-            if not self.active_connections[user_id]:
-                del self.active_connections[user_id]
-
-    async def send_personal_message(self, user_id: str, message: dict):
-        if user_id in self.active_connections:
-            for ws in self.active_connections[user_id]:
-                await ws.send_json(message)
-
-    async def broadcast(self, message: dict):
-        for user_ws_list in self.active_connections.values():
-            for ws in user_ws_list:
-                await ws.send_json(message)
-
-manager = ConnectionManager()
-
-@app.websocket("/ws/notifications/{user_id}")
-async def websocket_notifications(websocket: WebSocket, user_id: str):
-    await manager.connect(user_id, websocket)
-    try:
-        while True:
-            await websocket.receive_text()
-    except WebSocketDisconnect:
-        manager.disconnect(user_id, websocket)
-
-async def push_realtime_notification(user_id: str, payload: dict):
-    await manager.send_personal_message(user_id, payload)
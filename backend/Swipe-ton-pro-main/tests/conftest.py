@@ -0,0 +1,29 @@
+import os
+
+import pytest
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """backend.server with its module-level `db`, and the services holding it, on an in-memory database"""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "test_database")
+    from backend import server
+
+    database = mongomock_motor.AsyncMongoMockClient()["test_database"]
+    for service in list(vars(server).values()):
+        if getattr(service, "db", None) is server.db:
+            monkeypatch.setattr(service, "db", database)
+        # Services built on single collections, e.g. the idempotency store or the ticket assigner
+        for name, value in list(getattr(service, "__dict__", {}).items()):
+            if getattr(value, "database", None) is server.db:
+                monkeypatch.setattr(service, name, database[value.name])
+    monkeypatch.setattr(server, "db", database)
+    # Import-time caches would carry state from one test to the next
+    fresh_deck_cache = server.DeckCache()
+    monkeypatch.setattr(server, "deck_cache", fresh_deck_cache)
+    monkeypatch.setattr(server.deck_service, "cache", fresh_deck_cache)
+    server.seen_store.cache.clear()
+    monkeypatch.setattr(server, "ticket_assigner", server.TicketAssigner(database.support_tickets, database.admins))
+    return server
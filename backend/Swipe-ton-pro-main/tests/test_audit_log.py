@@ -0,0 +1,52 @@
+import asyncio
+
+from backend.audit_log import AuditLogWriter
+
+
+class FakeCollection:
+    def __init__(self):
+        self.batches = []
+
+    async def insert_many(self, docs, ordered=True):
+        self.batches.append(list(docs))
+
+
+def test_batches_by_size_and_flushes_on_stop():
+    collection = FakeCollection()
+    writer = AuditLogWriter(collection, batch_size=3, flush_interval=10)
+
+    async def scenario():
+        writer.start()
+        for i in range(7):
+            await writer.enqueue({"action": f"a{i}"})
+        await asyncio.sleep(0.01)
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert [len(batch) for batch in collection.batches] == [3, 3, 1]
+    assert writer.stats()["written"] == 7
+
+
+def test_drop_policy_when_queue_is_full():
+    collection = FakeCollection()
+    writer = AuditLogWriter(collection, max_queue=2, batch_size=10, flush_interval=10)
+
+    async def scenario():
+        writer.start()
+        for i in range(5):
+            await writer.enqueue({"action": f"a{i}"})
+        stats = writer.stats()
+        await writer.stop()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert stats["dropped"] == 3
+    assert stats["queue_depth"] == 2
+    assert sum(len(batch) for batch in collection.batches) == 2
+
+
+def test_writes_directly_when_not_started():
+    collection = FakeCollection()
+    writer = AuditLogWriter(collection)
+    asyncio.run(writer.enqueue({"action": "login_success"}))
+    assert collection.batches == [[{"action": "login_success"}]]
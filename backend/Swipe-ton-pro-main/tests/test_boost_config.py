@@ -0,0 +1,62 @@
+import asyncio
+
+from backend.boost_config import BoostConfigCache
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield dict(doc)
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = []
+
+    def find(self, query, projection=None):
+        wanted = query["pro_id"]["$in"]
+        self.queries.append(wanted)
+        return FakeCursor([doc for doc in self.docs if doc.get("pro_id") in wanted])
+
+
+DEFAULTS = {"cost": 5, "enabled": False}
+
+
+def test_bulk_lookup_is_one_query_then_served_from_cache():
+    collection = FakeCollection([{"pro_id": None, "enabled": True}, {"pro_id": "p2", "cost": 9}])
+    cache = BoostConfigCache(collection, DEFAULTS)
+
+    async def scenario():
+        first = await cache.get_many(["p1", "p2", "p3"])
+        second = await cache.get_many(["p2", "p3"])
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == {
+        "p1": {"cost": 5, "enabled": True},
+        "p2": {"cost": 9, "enabled": True},
+        "p3": {"cost": 5, "enabled": True},
+    }
+    assert second == {"p2": first["p2"], "p3": first["p3"]}
+    assert collection.queries == [[None, "p1", "p2", "p3"]]
+
+
+def test_invalidate_reloads_only_the_changed_override():
+    collection = FakeCollection([{"pro_id": "p1", "cost": 9}])
+    cache = BoostConfigCache(collection, DEFAULTS)
+
+    async def scenario():
+        await cache.get_many(["p1", "p2"])
+        collection.docs[0]["cost"] = 12
+        cache.invalidate("p1")
+        return await cache.get_many(["p1", "p2"])
+
+    assert asyncio.run(scenario())["p1"]["cost"] == 12
+    assert collection.queries[-1] == ["p1"]
@@ -0,0 +1,92 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from backend.boost_scheduler import BoostScheduler
+
+T0 = datetime(2024, 6, 1, 12, 0)
+
+
+class Clock:
+    def __init__(self):
+        self.now = T0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield dict(doc)
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = []
+
+    async def insert_one(self, doc):
+        self.docs.append(doc)
+
+    def find(self, query, projection=None):
+        after = query["ends_at"]["$gt"]
+        return FakeCursor([doc for doc in self.docs if doc["ends_at"] > after])
+
+
+def boost(boost_id, pro_id, start_minutes, end_minutes):
+    return {"id": boost_id, "pro_id": pro_id,
+            "starts_at": T0 + timedelta(minutes=start_minutes), "ends_at": T0 + timedelta(minutes=end_minutes)}
+
+
+def test_boosts_activate_and_expire_in_time_order():
+    clock = Clock()
+    scheduler = BoostScheduler(FakeCollection(), clock=clock)
+    scheduler.schedule(boost("b1", "p1", 0, 30))
+    scheduler.schedule(boost("b2", "p2", 10, 20))
+
+    assert scheduler.advance() == T0 + timedelta(minutes=10)
+    assert scheduler.active == {"p1"}
+
+    clock.now = T0 + timedelta(minutes=15)
+    assert scheduler.advance() == T0 + timedelta(minutes=20)
+    assert scheduler.active == {"p1", "p2"}
+
+    clock.now = T0 + timedelta(minutes=45)
+    assert scheduler.advance() is None
+    assert scheduler.active == set()
+
+
+def test_overlapping_boosts_keep_pro_active_until_last_one_ends():
+    clock = Clock()
+    scheduler = BoostScheduler(FakeCollection(), clock=clock)
+    scheduler.schedule(boost("b1", "p1", 0, 10))
+    scheduler.schedule(boost("b2", "p1", 5, 20))
+
+    clock.now = T0 + timedelta(minutes=12)
+    scheduler.advance()
+    assert scheduler.is_boosted("p1")
+
+    clock.now = T0 + timedelta(minutes=20)
+    scheduler.advance()
+    assert not scheduler.is_boosted("p1")
+
+
+def test_schedule_is_rebuilt_from_persisted_boosts():
+    clock = Clock()
+    collection = FakeCollection()
+
+    async def scenario():
+        await BoostScheduler(collection, clock=clock).add(boost("b1", "p1", 0, 30))
+        await BoostScheduler(collection, clock=clock).add(boost("b0", "p0", -60, -30))
+        restarted = BoostScheduler(collection, clock=clock)
+        await restarted.load()
+        return restarted
+
+    restarted = asyncio.run(scenario())
+    assert restarted.active == {"p1"}
+    assert restarted.stats()["scheduled"] == 1
@@ -0,0 +1,159 @@
+import asyncio
+import random
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from backend.credits import CreditLedger, InsufficientCredits
+
+
+def matches(doc, query):
+    for field, condition in query.items():
+        if isinstance(condition, dict) and "$gte" in condition:
+            if doc.get(field, 0) < condition["$gte"]:
+                return False
+        elif isinstance(condition, dict) and "$exists" in condition:
+            if bool(doc.get(field.split(".")[0])) != condition["$exists"]:
+                return False
+        elif doc.get(field) != condition:
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs.sort(key=lambda doc: doc[field], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+
+class FakeCollection:
+    """Atomic per operation, but yields to the event loop (randomly) before each one"""
+
+    def __init__(self, docs=(), key="_id"):
+        self.docs = [dict(doc) for doc in docs]
+        self.key = key
+
+    async def _yield(self):
+        for _ in range(random.randint(1, 3)):
+            await asyncio.sleep(0)
+
+    def _find(self, query):
+        return next((doc for doc in self.docs if matches(doc, query)), None)
+
+    async def find_one(self, query, projection=None):
+        await self._yield()
+        doc = self._find(query)
+        return dict(doc) if doc else None
+
+    async def find_one_and_update(self, query, update, projection=None, return_document=None):
+        await self._yield()
+        doc = self._find(query)
+        if doc is None:
+            return None
+        for field, n in update.get("$inc", {}).items():
+            doc[field] = doc.get(field, 0) + n
+        for field, value in update.get("$push", {}).items():
+            doc.setdefault(field, []).append(value)
+        doc.update(update.get("$set", {}))
+        return dict(doc)
+
+    async def update_one(self, query, update):
+        await self._yield()
+        doc = self._find(query)
+        for field, condition in update["$pull"].items():
+            doc[field] = [item for item in doc[field] if item["id"] != condition["id"]]
+
+    async def insert_one(self, doc):
+        await self._yield()
+        if any(other[self.key] == doc[self.key] for other in self.docs):
+            raise DuplicateKeyError("duplicate")
+        self.docs.append(doc)
+
+    def find(self, query, projection=None):
+        return FakeCursor([doc for doc in self.docs if matches(doc, query)])
+
+
+class FakeDB:
+    def __init__(self, users=()):
+        self.users = FakeCollection(users, key="id")
+        self.credit_balances = FakeCollection()
+        self.credit_ledger = FakeCollection(key="id")
+
+
+def test_account_opens_from_legacy_credits_field():
+    db = FakeDB([{"id": "pro1", "credits": 12}])
+    ledger = CreditLedger(db)
+
+    assert asyncio.run(ledger.balance("pro1")) == 12
+    assert asyncio.run(ledger.balance("pro1")) == 12
+    assert [entry["reason"] for entry in db.credit_ledger.docs] == ["opening_balance"]
+
+
+def test_insufficient_balance_is_not_debited():
+    db = FakeDB([{"id": "pro1", "credits": 2}])
+    ledger = CreditLedger(db)
+
+    with pytest.raises(InsufficientCredits):
+        asyncio.run(ledger.debit("pro1", 5, "boost"))
+    assert asyncio.run(ledger.balance("pro1")) == 2
+    assert len(db.credit_ledger.docs) == 1
+
+
+def test_concurrent_debits_never_overdraw():
+    db = FakeDB([{"id": "pro1", "credits": 100}])
+    ledger = CreditLedger(db)
+
+    async def debit():
+        try:
+            return await ledger.debit("pro1", 3, "boost")
+        except InsufficientCredits:
+            return None
+
+    async def run():
+        return await asyncio.gather(*(debit() for _ in range(500)))
+
+    results = asyncio.run(run())
+
+    assert sum(result is not None for result in results) == 33
+    assert asyncio.run(ledger.balance("pro1")) == 1
+    # The ledger adds up to the materialized balance and nothing is left pending
+    assert sum(entry["delta"] for entry in db.credit_ledger.docs) == 1
+    assert db.credit_balances.docs[0]["pending"] == []
+    assert sorted(entry["balance_after"] for entry in db.credit_ledger.docs if entry["delta"] < 0) == \
+        list(range(1, 100, 3))
+
+
+def test_repair_appends_entries_left_pending():
+    db = FakeDB([{"id": "pro1", "credits": 10}])
+    ledger = CreditLedger(db)
+    asyncio.run(ledger.balance("pro1"))
+
+    async def crash(doc):
+        raise ConnectionError("lost")
+
+    insert_one, db.credit_ledger.insert_one = db.credit_ledger.insert_one, crash
+    with pytest.raises(ConnectionError):
+        asyncio.run(ledger.debit("pro1", 4, "unlock", ref="m1"))
+    db.credit_ledger.insert_one = insert_one
+
+    assert asyncio.run(ledger.repair()) == 1
+    assert asyncio.run(ledger.repair()) == 0
+    assert [entry["ref"] for entry in db.credit_ledger.docs] == [None, "m1"]
+    assert sum(entry["delta"] for entry in db.credit_ledger.docs) == asyncio.run(ledger.balance("pro1")) == 6
@@ -0,0 +1,81 @@
+import asyncio
+from datetime import datetime, timedelta
+
+
+async def seed(db):
+    now = datetime.utcnow()
+    await db.users.insert_many([
+        {"id": "u1", "user_type": "artisan", "status": "active", "created_at": now},
+        {"id": "u2", "user_type": "artisan", "status": "suspended", "created_at": now - timedelta(days=3)},
+        {"id": "u3", "user_type": "particulier", "status": "active", "created_at": now - timedelta(days=1)},
+        {"id": "u4", "user_type": "particulier", "status": "banned", "created_at": now},
+        {"id": "u5", "user_type": "particulier", "status": "active", "created_at": now - timedelta(days=9)},
+    ])
+    await db.support_tickets.insert_many([
+        {"id": "t1", "status": "open"}, {"id": "t2", "status": "open"}, {"id": "t3", "status": "closed"},
+    ])
+    await db.payments.insert_many([
+        {"id": "p1", "status": "completed", "amount": 30.0, "paid_at": now},
+        {"id": "p2", "status": "completed", "amount": 12.5, "paid_at": now - timedelta(days=2)},
+        {"id": "p3", "status": "pending", "amount": 99.0, "paid_at": now},
+    ])
+    await db.matches.insert_many([{"id": "m1"}, {"id": "m2"}])
+    await db.projects.insert_many([{"id": "pr1"}])
+
+
+async def per_count_dashboard(db):
+    """The dashboard numbers as the per-count queries computed them before the $facet rewrite"""
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    total_payments = await db.payments.aggregate([
+        {"$match": {"status": "completed"}},
+        {"$group": {"_id": None, "total": {"$sum": "$amount"}}},
+    ]).to_list(1)
+    revenue_today = await db.payments.aggregate([
+        {"$match": {"status": "completed", "paid_at": {"$gte": today}}},
+        {"$group": {"_id": None, "total": {"$sum": "$amount"}}},
+    ]).to_list(1)
+    return {
+        "users": {
+            "total": await db.users.count_documents({}),
+            "artisans": await db.users.count_documents({"user_type": "artisan"}),
+            "particuliers": await db.users.count_documents({"user_type": "particulier"}),
+            "active": await db.users.count_documents({"status": "active"}),
+            "new_today": await db.users.count_documents({"created_at": {"$gte": today}}),
+        },
+        "business": {
+            "total_matches": await db.matches.count_documents({}),
+            "total_projects": await db.projects.count_documents({}),
+            "total_revenue": total_payments[0]["total"] if total_payments else 0,
+            "revenue_today": revenue_today[0]["total"] if revenue_today else 0,
+        },
+        "support": {
+            "total_tickets": await db.support_tickets.count_documents({}),
+            "open_tickets": await db.support_tickets.count_documents({"status": "open"}),
+        },
+    }
+
+
+def super_admin(server):
+    return server.Admin(email="root@example.com", name="Root", password_hash="x", role=server.AdminRole.SUPER_ADMIN)
+
+
+def test_facet_dashboard_matches_per_count_queries(server):
+    async def scenario():
+        await seed(server.db)
+        dashboard = await server.get_admin_dashboard(estimated_totals=False, current_admin=super_admin(server))
+        return dashboard, await per_count_dashboard(server.db)
+
+    dashboard, expected = asyncio.run(scenario())
+    dashboard.pop("updated_at")
+    assert dashboard == expected
+    assert expected["users"]["new_today"] == 2 and expected["business"]["revenue_today"] == 30.0
+
+
+def test_facet_dashboard_on_empty_collections(server):
+    async def scenario():
+        dashboard = await server.get_admin_dashboard(estimated_totals=False, current_admin=super_admin(server))
+        return dashboard, await per_count_dashboard(server.db)
+
+    dashboard, expected = asyncio.run(scenario())
+    dashboard.pop("updated_at")
+    assert dashboard == expected
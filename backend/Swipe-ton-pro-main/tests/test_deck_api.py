@@ -0,0 +1,89 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.ranking import load_weights
+
+CREATED = datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def api(server):
+    testclient = pytest.importorskip("fastapi.testclient")
+    return testclient.TestClient(server.app)
+
+
+def artisan(artisan_id, rating, **extra):
+    return {"id": artisan_id, "email": f"{artisan_id}@example.com", "name": artisan_id, "user_type": "artisan",
+            "status": "active", "rating": rating, "categories": ["plomberie"], "created_at": CREATED, **extra}
+
+
+def seed(server):
+    asyncio.run(server.db.users.insert_many([
+        {"id": "p1", "email": "p1@example.com", "name": "P1", "user_type": "particulier", "status": "active",
+         "blocked_users": ["blocked"], "created_at": CREATED},
+        *(artisan(f"a{i}", 5.0 - i * 0.5) for i in range(7)),
+        artisan("blocked", 5.0),
+        artisan("suspended", 5.0, status="suspended"),
+        artisan("electricien", 5.0, categories=["electricite"]),
+    ]))
+    token = server.create_access_token({"sub": "p1", "scope": server.USER_TOKEN_SCOPE}, timedelta(minutes=5))
+    return {"Authorization": f"Bearer {token}"}
+
+
+def read_deck(api, headers, **params):
+    """Every page of the deck, following next_cursor"""
+    pages, cursor = [], None
+    while True:
+        response = api.get("/api/swipe/deck", headers=headers, params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        body = response.json()
+        pages.append([card["id"] for card in body["cards"]])
+        cursor = body["next_cursor"]
+        if not body["has_more"]:
+            return pages
+
+
+def test_deck_pages_across_pools_without_repeats(server, api, monkeypatch):
+    headers = seed(server)
+    # Pools of 3 cards: seven artisans take three pools
+    monkeypatch.setattr(server.deck_service, "pool_size", 3)
+
+    pages = read_deck(api, headers, category="plomberie", limit=2)
+
+    cards = [card for page in pages for card in page]
+    assert sorted(cards) == [f"a{i}" for i in range(7)]
+    assert all(len(page) <= 2 for page in pages) and len(pages) >= 4
+
+
+def test_deck_skips_swiped_artisans(server, api):
+    headers = seed(server)
+    asyncio.run(server.seen_store.add("p1", ["a0", "a3"]))
+
+    [cards] = read_deck(api, headers, category="plomberie", limit=20)
+
+    assert cards == ["a1", "a2", "a4", "a5", "a6"]
+
+
+def test_boost_reranks_the_cached_deck(server, api, monkeypatch):
+    headers = seed(server)
+    monkeypatch.setattr(server.deck_service, "weights", load_weights({"boost": 10.0}))
+    monkeypatch.setattr(server.boost_scheduler, "active", set())
+    monkeypatch.setattr(server.boost_scheduler, "version", 0)
+    before = read_deck(api, headers, category="plomberie")[0]
+
+    # The pool is cached now; a new boost version re-ranks it in place
+    server.boost_scheduler.active.add("a6")
+    server.boost_scheduler.version += 1
+    after = read_deck(api, headers, category="plomberie")[0]
+
+    assert before[0] == "a0" and before[-1] == "a6"
+    assert after[0] == "a6" and sorted(after) == sorted(before)
+
+
+def test_deck_requires_a_user_token(server, api):
+    seed(server)
+
+    assert api.get("/api/swipe/deck").status_code in (401, 403)
+    assert api.get("/api/swipe/deck", headers={"Authorization": "Bearer nope"}).status_code == 401
@@ -0,0 +1,75 @@
+from backend.deck_cache import CachedPool, DeckCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def pool(ids, loaded_at=1000.0, boost_version=0):
+    return CachedPool([{"id": doc_id, "score": 0.5} for doc_id in ids], None, False, boost_version, loaded_at)
+
+
+def test_hit_after_put_and_miss_after_expiry():
+    clock = FakeClock()
+    cache = DeckCache(ttl=60, clock=clock)
+    cache.put("p1", ("plomberie", 0), pool(["a1", "a2"]))
+
+    assert cache.get("p1", ("plomberie", 0)).cards[0]["id"] == "a1"
+    assert cache.get("p1", ("plomberie", 1)) is None
+    clock.now += 61
+    assert cache.get("p1", ("plomberie", 0)) is None
+    assert cache.stats()["hit_ratio"] == round(1 / 3, 4)
+    assert cache.size == 0
+
+
+def test_oversized_pool_is_not_cached_and_entry_stays_under_cap():
+    small = pool(["a1"])
+    cache = DeckCache(max_entry_bytes=small.size * 2)
+
+    cache.put("p1", "big", pool([f"a{i}" for i in range(50)]))
+    assert cache.get("p1", "big") is None and cache.oversized == 1
+
+    for key in ("k1", "k2", "k3"):
+        cache.put("p1", key, pool(["a1"]))
+    # The oldest pool of the user made room for the newest one
+    assert cache.get("p1", "k1") is None
+    assert cache.get("p1", "k3") is not None
+    assert cache.size == small.size * 2
+
+
+def test_least_recently_used_user_is_evicted():
+    cache = DeckCache(maxsize=2)
+    cache.put("p1", "k", pool(["a1"]))
+    cache.put("p2", "k", pool(["a1"]))
+    cache.get("p1", "k")
+    cache.put("p3", "k", pool(["a1"]))
+
+    assert cache.get("p2", "k") is None
+    assert cache.get("p1", "k") is not None and cache.evictions == 1
+
+
+def test_removed_artisan_is_hidden_from_pools_loaded_before():
+    clock = FakeClock()
+    cache = DeckCache(clock=clock)
+    before = pool(["a1", "a2"], loaded_at=clock.now)
+    clock.now += 1
+    cache.invalidate_artisan("a1")
+    clock.now += 1
+    after = pool(["a1", "a3"], loaded_at=clock.now)
+
+    assert [card["id"] for card in cache.visible(before)] == ["a2"]
+    # Loaded after the removal (e.g. reactivated since): kept
+    assert [card["id"] for card in cache.visible(after)] == ["a1", "a3"]
+
+
+def test_invalidate_user_drops_every_pool():
+    cache = DeckCache()
+    cache.put("p1", "k1", pool(["a1"]))
+    cache.put("p1", "k2", pool(["a2"]))
+
+    assert cache.invalidate_user("p1")
+    assert cache.get("p1", "k1") is None and cache.size == 0
@@ -0,0 +1,53 @@
+import pytest
+
+from backend.geo import (DEFAULT_POSTAL_CODES_FILE, geocode, haversine_km, location_geo,
+                         load_postal_codes, postal_code_table, within_bbox, within_radius)
+
+
+def test_geocode_prefers_explicit_coordinates():
+    assert geocode({"lat": "45.0", "lon": "5.0", "postal_code": "75001"}) == (5.0, 45.0)
+
+
+def test_geocode_falls_back_to_city_then_department():
+    assert geocode({"postal_code": "69999", "city": "Paris"}) == geocode({"city": "Paris"})
+    lon, lat = geocode({"postal_code": "69009"})
+    assert 45.7 < lat < 45.8 and 4.8 < lon < 4.9
+    assert geocode({"city": "Saint Etienne"}) == geocode({"city": "Saint-Étienne"})
+    assert geocode({"postal_code": "99999"}) is None
+
+
+def test_location_geo_is_geojson():
+    assert location_geo({"lat": "48.85", "lon": "2.35"}) == {"type": "Point", "coordinates": [2.35, 48.85]}
+    assert location_geo(None) is None
+
+
+def test_queries_and_distance():
+    paris, lyon = geocode({"city": "Paris"}), geocode({"city": "Lyon"})
+    assert 380 < haversine_km(paris, lyon) < 410
+    radius = within_radius(paris, 20)["geo"]["$geoWithin"]["$centerSphere"]
+    assert radius[0] == list(paris)
+    ring = within_bbox(2.2, 48.8, 2.5, 48.9)["geo"]["$geoWithin"]["$geometry"]["coordinates"][0]
+    assert ring[0] == ring[-1]
+
+
+def test_negative_radius_is_rejected():
+    with pytest.raises(ValueError):
+        within_radius((2.35, 48.85), -5)
+
+
+def test_bundled_table_is_used_with_a_warning(monkeypatch, caplog):
+    monkeypatch.delenv("POSTAL_CODES_FILE", raising=False)
+    postal_code_table.cache_clear()
+
+    table = load_postal_codes()
+
+    assert table is postal_code_table() and "75001" in table.by_postal_code
+    assert "POSTAL_CODES_FILE is not set" in caplog.text
+
+
+def test_configured_table_loads_quietly(monkeypatch, caplog):
+    monkeypatch.setenv("POSTAL_CODES_FILE", str(DEFAULT_POSTAL_CODES_FILE))
+    postal_code_table.cache_clear()
+
+    assert "75001" in load_postal_codes().by_postal_code
+    assert "POSTAL_CODES_FILE" not in caplog.text
@@ -0,0 +1,60 @@
+import asyncio
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+from backend.indexes import INDEXES, QUERY_SHAPES, IndexSpec, apply_indexes, index_name, plan_stages
+
+
+def test_every_query_shape_targets_an_indexed_collection():
+    for shape in QUERY_SHAPES:
+        assert shape.collection in INDEXES
+
+
+def test_index_names_are_unique_per_collection():
+    for collection, specs in INDEXES.items():
+        names = [index_name(spec.keys) for spec in specs]
+        assert len(names) == len(set(names)), collection
+
+
+def test_plan_stages_walks_nested_plans():
+    plan = {
+        "stage": "SORT",
+        "inputStage": {"stage": "OR", "inputStages": [{"stage": "IXSCAN"}, {"stage": "COLLSCAN"}]},
+    }
+    assert list(plan_stages(plan)) == ["SORT", "OR", "IXSCAN", "COLLSCAN"]
+
+
+class FakeCollection:
+    def __init__(self, name, created, conflicting):
+        self.name = name
+        self.created = created
+        self.conflicting = conflicting
+
+    async def create_index(self, keys, name, **options):
+        if (self.name, name) in self.conflicting:
+            raise OperationFailure("E11000 duplicate key error", code=11000)
+        self.created.append((self.name, name))
+
+
+class FakeDB:
+    def __init__(self, conflicting):
+        self.created = []
+        self.conflicting = conflicting
+
+    def __getitem__(self, name):
+        return FakeCollection(name, self.created, self.conflicting)
+
+
+def test_conflicting_index_does_not_skip_the_others_of_its_collection():
+    registry = {
+        "admins": [IndexSpec([("id", ASCENDING)], unique=True), IndexSpec([("email", ASCENDING)], unique=True),
+                   IndexSpec([("role", ASCENDING)])],
+        "logs": [IndexSpec([("timestamp", DESCENDING)])],
+    }
+    db = FakeDB(conflicting={("admins", "email_1")})
+
+    failures = asyncio.run(apply_indexes(db, registry))
+
+    assert [(collection, name) for collection, name, _ in failures] == [("admins", "email_1")]
+    assert db.created == [("admins", "id_1"), ("admins", "role_1"), ("logs", "timestamp_-1")]
@@ -0,0 +1,261 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from backend.lead_fanout import LEAD_FANOUT_MAX_ATTEMPTS, LeadFanout, LeadQuota
+
+NOW = datetime(2024, 6, 1, 9)
+
+
+class FakeQuotas:
+    """Applies the conditional upserts like MongoDB with a unique (artisan_id, day) index"""
+
+    def __init__(self, counts=None):
+        self.counts = dict(counts or {})
+
+    async def bulk_write(self, ops, ordered=True):
+        errors = []
+        for index, op in enumerate(ops):
+            key = (op._filter["artisan_id"], op._filter["day"])
+            delta = op._doc["$inc"]["count"]
+            count = self.counts.get(key)
+            if delta < 0:
+                if count:
+                    self.counts[key] = count + delta
+            elif count is None:
+                self.counts[key] = 1
+            elif count < op._filter["count"]["$lt"]:
+                self.counts[key] = count + 1
+            else:
+                errors.append({"index": index, "code": 11000})
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, *args):
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, length=None):
+        return list(self.docs)
+
+
+class FakeUsers:
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = []
+
+    def find(self, query, projection=None):
+        self.queries.append(query)
+        return FakeCursor(self.docs)
+
+
+class FakeProjects:
+    def __init__(self, project):
+        self.project = project
+
+    async def find_one_and_update(self, query, update, projection=None):
+        if self.project["fanout_status"] != query["fanout_status"]:
+            return None
+        # The document before the update, MongoDB's default
+        before = dict(self.project)
+        self.project.update(update["$set"])
+        for field, delta in update.get("$inc", {}).items():
+            self.project[field] = self.project.get(field, 0) + delta
+        return before
+
+    async def update_one(self, query, update):
+        self.project.update(update["$set"])
+
+
+class FakeLeads:
+    """Unique (project_id, artisan_id), as the leads index; `error` fails every insert"""
+
+    def __init__(self, error=None):
+        self.docs = []
+        self.error = error
+
+    async def insert_many(self, docs, ordered=True):
+        if self.error:
+            raise self.error
+        stored = {(doc["project_id"], doc["artisan_id"]) for doc in self.docs}
+        errors = []
+        for index, doc in enumerate(docs):
+            if (doc["project_id"], doc["artisan_id"]) in stored:
+                errors.append({"index": index, "code": 11000})
+            else:
+                self.docs.append(doc)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+class FakeDB:
+    def __init__(self, project, artisans, quotas=None):
+        self.projects = FakeProjects(project)
+        self.users = FakeUsers(artisans)
+        self.leads = FakeLeads()
+        self.lead_quotas = FakeQuotas(quotas)
+
+
+def artisan(doc_id, rating):
+    return {"id": doc_id, "rating": rating, "verified": False, "created_at": NOW}
+
+
+def test_quota_refuses_artisans_at_the_cap():
+    quota = LeadQuota(FakeQuotas({("a1", "2024-06-01"): 1}), cap=2)
+
+    async def scenario():
+        first = await quota.reserve(["a1", "a2"], "2024-06-01")
+        second = await quota.reserve(["a1", "a2"], "2024-06-01")
+        await quota.release(["a2"], "2024-06-01")
+        return first, second, await quota.reserve(["a2"], "2024-06-01")
+
+    assert asyncio.run(scenario()) == (["a1", "a2"], ["a2"], ["a2"])
+    assert quota.collection.counts == {("a1", "2024-06-01"): 2, ("a2", "2024-06-01"): 2}
+
+
+def test_capped_artisans_are_replaced_by_the_next_candidates():
+    project = {"id": "p1", "user_id": "u1", "title": "Fuite", "category": "plomberie",
+               "location": None, "fanout_status": "pending"}
+    artisans = [artisan("a1", 5.0), artisan("a2", 4.5), artisan("a3", 4.0), artisan("a4", 3.0)]
+    db = FakeDB(project, artisans, quotas={("a1", "2024-06-01"): 3})
+    published = []
+
+    async def publish_many(messages):
+        published.append(messages)
+
+    fanout = LeadFanout(db, publish_many, leads_per_project=2, daily_cap=3, clock=lambda: NOW)
+
+    async def scenario():
+        return await fanout.process("p1"), await fanout.process("p1")
+
+    assert asyncio.run(scenario()) == (2, 0)
+    assert sorted(lead["artisan_id"] for lead in db.leads.docs) == ["a2", "a3"]
+    assert len(published) == 1
+    assert sorted(user_id for user_id, _ in published[0]) == ["a2", "a3"]
+    assert db.users.queries[0]["categories"] == "plomberie"
+    assert project["fanout_status"] == "done" and project["leads_sent"] == 2
+
+
+def test_submit_defers_to_the_sweep_when_the_queue_is_full():
+    fanout = LeadFanout(FakeDB({"fanout_status": "done"}, []), None, workers=1, max_queue=1)
+
+    async def scenario():
+        fanout.start()
+        try:
+            # The worker has not run yet: the first id fills the queue
+            return fanout.submit("p1"), fanout.submit("p2")
+        finally:
+            await fanout.stop()
+
+    assert asyncio.run(scenario()) == (True, False)
+    assert fanout.stats()["deferred"] == 1
+
+
+def plumbing_project(**fields):
+    return {"id": "p1", "user_id": "u1", "title": "Fuite", "category": "plomberie",
+            "location": None, "fanout_status": "pending", **fields}
+
+
+async def no_publish(messages):
+    pass
+
+
+def test_project_claimed_by_another_worker_is_left_to_it():
+    project = plumbing_project()
+    db = FakeDB(project, [artisan("a1", 5.0), artisan("a2", 4.0)])
+    fanout = LeadFanout(db, no_publish, clock=lambda: NOW)
+
+    async def scenario():
+        # Both workers race for the claim, the loser sends nothing
+        return await asyncio.gather(fanout.process("p1"), fanout.process("p1"))
+
+    assert sorted(asyncio.run(scenario())) == [0, 2]
+    assert len(db.leads.docs) == 2 and len(db.users.queries) == 1
+    assert project["fanout_attempts"] == 1 and project["fanout_status"] == "done"
+
+    project.update(fanout_status="running")
+    assert asyncio.run(fanout.process("p1")) == 0
+    assert len(db.users.queries) == 1
+
+
+def test_failing_project_is_retried_then_marked_failed():
+    project = plumbing_project()
+    db = FakeDB(project, [artisan("a1", 5.0)])
+    db.leads.error = RuntimeError("primary stepped down")
+    fanout = LeadFanout(db, no_publish, daily_cap=0, clock=lambda: NOW)
+
+    statuses = []
+    for _ in range(LEAD_FANOUT_MAX_ATTEMPTS + 1):
+        with pytest.raises(RuntimeError):
+            asyncio.run(fanout.process("p1"))
+        statuses.append(project["fanout_status"])
+        if project["fanout_status"] == "failed":
+            break
+
+    assert statuses == ["pending"] * (LEAD_FANOUT_MAX_ATTEMPTS - 1) + ["failed"]
+    assert project["fanout_attempts"] == LEAD_FANOUT_MAX_ATTEMPTS
+    assert fanout.stats()["failed"] == LEAD_FANOUT_MAX_ATTEMPTS
+    # A failed project is no longer claimed
+    assert asyncio.run(fanout.process("p1")) == 0
+
+
+def test_retried_project_releases_the_quota_of_duplicate_leads():
+    project = plumbing_project(fanout_status="running")
+    db = FakeDB(project, [artisan("a1", 5.0), artisan("a2", 4.0)])
+    # A worker died after storing a1's lead, the sweep put the project back
+    db.leads.docs.append({"id": "l0", "project_id": "p1", "artisan_id": "a1"})
+    db.lead_quotas.counts[("a1", "2024-06-01")] = 1
+    project.update(fanout_status="pending")
+    published = []
+
+    async def publish_many(messages):
+        published.extend(user_id for user_id, _ in messages)
+
+    fanout = LeadFanout(db, publish_many, daily_cap=5, clock=lambda: NOW)
+
+    assert asyncio.run(fanout.process("p1")) == 1
+    assert published == ["a2"]
+    assert sorted(lead["artisan_id"] for lead in db.leads.docs) == ["a1", "a2"]
+    assert db.lead_quotas.counts == {("a1", "2024-06-01"): 1, ("a2", "2024-06-01"): 1}
+    assert project["leads_sent"] == 1
+
+
+def test_sweep_requeues_projects_of_dead_workers():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["test_database"]
+    fanout = LeadFanout(db, no_publish, workers=0, sweep_interval=3600, clock=lambda: NOW)
+
+    async def scenario():
+        await db.projects.insert_many([
+            # Running for three hours: its worker died
+            {"id": "stale", "fanout_status": "running", "fanout_started_at": NOW - timedelta(hours=3),
+             "created_at": NOW - timedelta(hours=3)},
+            {"id": "busy", "fanout_status": "running", "fanout_started_at": NOW - timedelta(minutes=1),
+             "created_at": NOW - timedelta(minutes=1)},
+            {"id": "deferred", "fanout_status": "pending", "created_at": NOW - timedelta(minutes=10)},
+            # Most likely still in the queue
+            {"id": "fresh", "fanout_status": "pending", "created_at": NOW - timedelta(seconds=1)},
+        ])
+        fanout.start()
+        try:
+            requeued = await fanout.sweep()
+            queued = [fanout._queue.get_nowait() for _ in range(fanout._queue.qsize())]
+        finally:
+            await fanout.stop()
+        statuses = {doc["id"]: doc["fanout_status"] async for doc in db.projects.find({})}
+        return requeued, queued, statuses
+
+    requeued, queued, statuses = asyncio.run(scenario())
+    assert requeued == 2 and queued == ["stale", "deferred"]
+    assert statuses == {"stale": "pending", "busy": "running", "deferred": "pending", "fresh": "pending"}
+    assert fanout.stats()["swept"] == 2
@@ -0,0 +1,208 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from backend.credits import InsufficientCredits
+from backend.idempotency import IdempotencyKeyInProgress, IdempotencyKeyReused, IdempotencyStore
+from backend.match_unlock import MatchUnlocker, UnlockForbidden, UnlockInProgress
+
+
+def matches(doc, query):
+    for field, condition in query.items():
+        if isinstance(condition, dict) and "$in" in condition:
+            if doc.get(field) not in condition["$in"]:
+                return False
+        elif doc.get(field) != condition:
+            return False
+    return True
+
+
+class FakeCollection:
+    """Atomic per operation, but yields to the event loop before each one"""
+
+    def __init__(self, docs=()):
+        self.docs = [dict(doc) for doc in docs]
+        self.fail_updates = 0
+
+    def _find(self, query):
+        return next((doc for doc in self.docs if matches(doc, query)), None)
+
+    async def find_one(self, query, projection=None):
+        await asyncio.sleep(0)
+        doc = self._find(query)
+        return dict(doc) if doc else None
+
+    async def find_one_and_update(self, query, update, return_document=None):
+        await asyncio.sleep(0)
+        doc = self._find(query)
+        if doc is None:
+            return None
+        doc.update(update["$set"])
+        return dict(doc)
+
+    async def update_one(self, query, update, upsert=False):
+        await asyncio.sleep(0)
+        if self.fail_updates:
+            self.fail_updates -= 1
+            raise ConnectionError("lost")
+        doc = self._find(query)
+        if doc is None and upsert:
+            self.docs.append(dict(update["$setOnInsert"]))
+        elif doc is not None:
+            doc.update(update.get("$set", {}))
+
+    async def insert_one(self, doc):
+        await asyncio.sleep(0)
+        if self._find({"_id": doc["_id"]}):
+            raise DuplicateKeyError("duplicate")
+        self.docs.append(doc)
+
+    async def replace_one(self, query, doc, upsert=False):
+        await asyncio.sleep(0)
+        self.docs = [other for other in self.docs if not matches(other, query)] + [dict(doc)]
+
+    async def delete_one(self, query):
+        await asyncio.sleep(0)
+        doc = self._find(query)
+        if doc is not None:
+            self.docs.remove(doc)
+
+
+class FakeLedger:
+    def __init__(self, balance):
+        self.balance = balance
+        self.refs = []
+
+    async def has_entry(self, user_id, ref):
+        return ref in self.refs
+
+    async def debit(self, user_id, cost, reason, ref=None):
+        await asyncio.sleep(0)
+        if self.balance < cost:
+            raise InsufficientCredits(self.balance, cost)
+        self.balance -= cost
+        self.refs.append(ref)
+
+
+class FakeDB:
+    def __init__(self):
+        self.matches = FakeCollection([{
+            "id": "m1", "particulier_id": "p1", "artisan_id": "a1", "unlocked": False, "unlock_payment_id": None,
+        }])
+        self.payments = FakeCollection()
+
+
+def make_unlocker(balance=10, lease_seconds=30):
+    db = FakeDB()
+    ledger = FakeLedger(balance)
+    store = IdempotencyStore(FakeCollection(), lease_seconds=lease_seconds)
+    return db, ledger, MatchUnlocker(db, ledger, store, cost=3)
+
+
+def test_double_taps_charge_once():
+    db, ledger, unlocker = make_unlocker()
+
+    async def run():
+        return await asyncio.gather(*(unlocker.unlock("m1", "a1", "key-1") for _ in range(20)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert ledger.balance == 7
+    succeeded = [result for result in results if isinstance(result, dict)]
+    assert [result["replayed"] for result in succeeded] == [False]
+    assert all(isinstance(result, IdempotencyKeyInProgress) for result in results if not isinstance(result, dict))
+    assert db.matches.docs[0]["unlocked"] is True
+    assert db.matches.docs[0]["unlock_payment_id"] == succeeded[0]["unlock_payment_id"]
+
+    # A retry after completion gets the same response back
+    replay = asyncio.run(unlocker.unlock("m1", "a1", "key-1"))
+    assert replay == {**succeeded[0], "replayed": True}
+    assert ledger.balance == 7
+
+
+def test_different_keys_unlock_once():
+    db, ledger, unlocker = make_unlocker()
+
+    async def run():
+        return await asyncio.gather(*(unlocker.unlock("m1", "a1", f"key-{i}") for i in range(10)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert ledger.balance == 7
+    charged = [result for result in results if isinstance(result, dict) and result["charged_with"]]
+    assert len(charged) == 1
+    assert all(isinstance(result, (dict, UnlockInProgress)) for result in results)
+
+
+def test_rejected_unlock_releases_key_and_match():
+    db, ledger, unlocker = make_unlocker(balance=2)
+
+    with pytest.raises(InsufficientCredits):
+        asyncio.run(unlocker.unlock("m1", "a1", "key-1"))
+    assert db.matches.docs[0]["unlock_payment_id"] is None
+
+    ledger.balance = 5
+    result = asyncio.run(unlocker.unlock("m1", "a1", "key-1"))
+    assert result["charged_with"] == "credits" and ledger.balance == 2
+
+
+def test_retry_after_failure_does_not_charge_again():
+    db, ledger, unlocker = make_unlocker(lease_seconds=0)
+    # The debit succeeds, then the write flipping `unlocked` fails
+    db.matches.fail_updates = 1
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(unlocker.unlock("m1", "a1", "key-1"))
+    assert ledger.balance == 7 and db.matches.docs[0]["unlocked"] is False
+
+    result = asyncio.run(unlocker.unlock("m1", "a1", "key-1"))
+    assert ledger.balance == 7
+    assert result["charged_with"] == "credits" and db.matches.docs[0]["unlocked"] is True
+
+
+def test_key_reused_for_another_request_is_rejected():
+    db, ledger, unlocker = make_unlocker()
+    asyncio.run(unlocker.unlock("m1", "a1", "key-1"))
+
+    with pytest.raises(IdempotencyKeyReused):
+        asyncio.run(unlocker.unlock("m2", "a1", "key-1"))
+
+
+def test_only_the_artisan_can_unlock():
+    db, ledger, unlocker = make_unlocker()
+
+    with pytest.raises(UnlockForbidden):
+        asyncio.run(unlocker.unlock("m1", "p1", "key-1"))
+    assert ledger.balance == 10
+
+
+def test_forged_payment_does_not_unlock_through_the_api(server):
+    testclient = pytest.importorskip("fastapi.testclient")
+    api = testclient.TestClient(server.app)
+    token = server.create_access_token({"sub": "a1", "scope": server.USER_TOKEN_SCOPE}, timedelta(minutes=5))
+    headers = {"Authorization": f"Bearer {token}", "Idempotency-Key": "key-12345678"}
+
+    async def seed():
+        await server.db.users.insert_one({"id": "a1", "email": "a1@example.com", "name": "A1",
+                                          "user_type": "artisan", "status": "active"})
+        await server.db.matches.insert_one({"id": "m1", "particulier_id": "p1", "artisan_id": "a1",
+                                            "unlocked": False, "unlock_payment_id": None})
+        await server.credit_ledger.credit("a1", 5, "purchase", ref="checkout-1")
+
+    asyncio.run(seed())
+    forged = {"payment": {"amount": 0.01, "currency": "EUR", "payment_method": "card", "transaction_id": "made-up"}}
+
+    rejected = api.post("/api/matches/m1/unlock", json=forged, headers=headers)
+    assert rejected.status_code == 402
+    match = asyncio.run(server.db.matches.find_one({"id": "m1"}))
+    assert match["unlocked"] is False and match["unlock_payment_id"] is None
+    assert asyncio.run(server.db.payments.count_documents({})) == 0
+
+    unlocked = api.post("/api/matches/m1/unlock", json={}, headers=headers)
+    assert unlocked.status_code == 200, unlocked.text
+    assert unlocked.json()["charged_with"] == "credits"
+    assert asyncio.run(server.credit_ledger.balance("a1")) == 5 - server.MATCH_UNLOCK_COST
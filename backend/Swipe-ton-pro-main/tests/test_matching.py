@@ -0,0 +1,124 @@
+import asyncio
+
+from pymongo.errors import DuplicateKeyError
+
+from backend.matching import MatchMaker, pair_key
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+
+class FakeCollection:
+    """Atomic per operation, but yields to the event loop before each one"""
+
+    def __init__(self, docs=(), unique=None):
+        self.docs = [dict(doc) for doc in docs]
+        self.unique = unique
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        await asyncio.sleep(0)
+        doc = next((doc for doc in self.docs if doc["_id"] == query["_id"]), None)
+        if doc is None:
+            if not upsert:
+                return None
+            doc = {"_id": query["_id"], **update.get("$setOnInsert", {})}
+            self.docs.append(doc)
+        doc.update(update["$set"])
+        return dict(doc)
+
+    async def insert_one(self, doc):
+        await asyncio.sleep(0)
+        if self.unique and any(other[self.unique] == doc[self.unique] for other in self.docs):
+            raise DuplicateKeyError("duplicate")
+        self.docs.append(doc)
+
+    def find(self, query, projection=None):
+        wanted = query["id"]["$in"]
+        return FakeCursor([doc for doc in self.docs if doc["id"] in wanted])
+
+    async def update_many(self, query, update):
+        await asyncio.sleep(0)
+
+
+class FakeDB:
+    def __init__(self, users):
+        self.users = FakeCollection(users)
+        self.swipe_pairs = FakeCollection()
+        self.matches = FakeCollection(unique="pair_key")
+
+
+def test_pair_key_is_independent_of_who_swipes():
+    assert pair_key("p1", "a1")[0] == pair_key("a1", "p1")[0] == "a1:p1"
+    assert pair_key("a1", "p1")[1] == "a" and pair_key("p1", "a1")[1] == "b"
+
+
+def test_concurrent_mutual_swipes_create_each_match_exactly_once():
+    pairs = [(f"p{i}", f"a{i}") for i in range(50)]
+    users = [{"id": p, "user_type": "particulier"} for p, _ in pairs] + \
+            [{"id": a, "user_type": "artisan"} for _, a in pairs]
+    db = FakeDB(users)
+    notified = []
+
+    async def notify(user_id, payload):
+        notified.append((user_id, payload["match_id"]))
+
+    async def scenario():
+        # Two workers, both sides swiping right on every pair at the same time
+        makers = [MatchMaker(db, notify), MatchMaker(db, notify)]
+        swipes = []
+        for i, (particulier, artisan) in enumerate(pairs):
+            swipes.append(makers[i % 2].record_swipe(particulier, artisan, "right"))
+            swipes.append(makers[(i + 1) % 2].record_swipe(artisan, particulier, "right"))
+            swipes.append(makers[i % 2].record_swipe(artisan, particulier, "right"))
+        return await asyncio.gather(*swipes)
+
+    created = [match for match in asyncio.run(scenario()) if match]
+    assert len(created) == len(db.matches.docs) == 50
+    assert sorted(match["pair_key"] for match in db.matches.docs) == sorted(pair_key(p, a)[0] for p, a in pairs)
+    assert len(notified) == 100
+    assert {user for user, _ in notified} == {user["id"] for user in users}
+
+
+def test_left_swipe_never_matches():
+    db = FakeDB([{"id": "p1", "user_type": "particulier"}, {"id": "a1", "user_type": "artisan"}])
+    maker = MatchMaker(db)
+
+    async def scenario():
+        await maker.record_swipe("p1", "a1", "right")
+        return await maker.record_swipe("a1", "p1", "left")
+
+    assert asyncio.run(scenario()) is None
+    assert db.matches.docs == []
+
+
+class SlowFirstSwipePairs(FakeCollection):
+    """The first upsert takes longer than the following ones"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        self.calls += 1
+        if self.calls == 1:
+            await asyncio.sleep(0.01)
+        return await super().find_one_and_update(query, update, upsert, return_document)
+
+
+def test_latest_swipe_of_a_pair_wins_within_a_batch():
+    db = FakeDB([{"id": "p1", "user_type": "particulier"}, {"id": "a1", "user_type": "artisan"}])
+    db.swipe_pairs = SlowFirstSwipePairs()
+    maker = MatchMaker(db)
+
+    asyncio.run(maker.record_many([
+        {"user_id": "p1", "target_id": "a1", "direction": "right"},
+        {"user_id": "p1", "target_id": "a1", "direction": "left"},
+    ]))
+
+    [pair] = db.swipe_pairs.docs
+    assert pair["b"] == "left"
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from backend.notification_bus import InProcessBus, NotificationBus, build_notification_bus
+
+
+def test_every_subscriber_receives_messages_in_order():
+    bus = InProcessBus()
+    received = {"worker-a": [], "worker-b": []}
+
+    def handler(worker):
+        async def deliver(user_id, payload):
+            received[worker].append((user_id, payload["n"]))
+        return deliver
+
+    async def scenario():
+        tasks = [asyncio.create_task(bus.run(handler(w))) for w in received]
+        await asyncio.sleep(0)
+        for n in range(5):
+            await bus.publish("user-1", {"n": n})
+        await asyncio.sleep(0.01)
+        for task in tasks:
+            task.cancel()
+
+    asyncio.run(scenario())
+    expected = [("user-1", n) for n in range(5)]
+    assert received == {"worker-a": expected, "worker-b": expected}
+    stats = bus.stats()
+    assert stats["published"] == 5
+    assert stats["received"] == 10
+    assert stats["latency_max_ms"] is not None
+
+
+def test_handler_errors_do_not_stop_the_subscriber():
+    bus = InProcessBus()
+    delivered = []
+
+    async def flaky(user_id, payload):
+        if payload["n"] == 0:
+            raise RuntimeError("boom")
+        delivered.append(payload["n"])
+
+    async def scenario():
+        task = asyncio.create_task(bus.run(flaky))
+        await asyncio.sleep(0)
+        await bus.publish("u", {"n": 0})
+        await bus.publish("u", {"n": 1})
+        await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(scenario())
+    assert delivered == [1]
+    assert bus.stats()["handler_errors"] == 1
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        build_notification_bus("redis")
+
+
+def test_bus_without_publish_and_run_cannot_be_built():
+    class Incomplete(NotificationBus):
+        async def publish(self, user_id, payload):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.received = []
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, message):
+        self.received.append(message)
+
+
+def test_server_match_reaches_the_matched_users_sockets(server, monkeypatch):
+    monkeypatch.setattr(server.match_maker, "db", server.db)
+    sockets = {"u1": FakeWebSocket(), "a1": FakeWebSocket()}
+
+    async def scenario():
+        await server.db.users.insert_many([
+            {"id": "u1", "user_type": "particulier"}, {"id": "a1", "user_type": "artisan"},
+        ])
+        await server.start_notification_bus()
+        await asyncio.sleep(0)
+        for user_id, websocket in sockets.items():
+            await server.connection_manager.connect(user_id, websocket)
+        try:
+            await server.match_maker.record_swipe("u1", "a1", "right")
+            match = await server.match_maker.record_swipe("a1", "u1", "right")
+            await asyncio.sleep(0.01)
+        finally:
+            server.app.state.notification_bus_task.cancel()
+            for user_id, websocket in sockets.items():
+                server.connection_manager.disconnect(user_id, websocket)
+        return match
+
+    match = asyncio.run(scenario())
+    assert sockets["u1"].received == [{"type": "match", "match_id": match["id"], "with_user_id": "a1"}]
+    assert sockets["a1"].received == [{"type": "match", "match_id": match["id"], "with_user_id": "u1"}]
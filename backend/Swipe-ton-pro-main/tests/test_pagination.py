@@ -0,0 +1,44 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from backend.pagination import InvalidCursor, after_cursor, decode_cursor, encode_cursor, paginate
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123000)
+    cursor = encode_cursor({"created_at": created_at, "id": "user-42"})
+    assert decode_cursor(cursor) == (created_at, "user-42")
+
+
+def test_invalid_cursor():
+    with pytest.raises(InvalidCursor):
+        decode_cursor("not-a-cursor")
+
+
+def test_after_cursor_keeps_filters():
+    created_at = datetime(2024, 5, 1)
+    cursor = encode_cursor({"created_at": created_at, "id": "r-1"})
+    query = after_cursor({"status": "pending"}, cursor)
+    assert query["$and"][0] == {"status": "pending"}
+    assert query["$and"][1]["$or"][1] == {"created_at": created_at, "id": {"$lt": "r-1"}}
+
+
+def test_documents_without_created_at_page_after_the_dated_ones():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    collection = mongomock_motor.AsyncMongoMockClient()["test_database"].users
+    docs = [{"id": f"u{i}", "created_at": datetime(2024, 5, i)} for i in range(1, 4)]
+    docs += [{"id": "legacy-a"}, {"id": "legacy-b", "created_at": None}, {"id": "legacy-c"}]
+
+    async def scenario():
+        await collection.insert_many([dict(doc) for doc in docs])
+        ids, cursor = [], None
+        while True:
+            page = await paginate(collection, {}, 2, cursor=cursor, projection={"_id": 0})
+            ids += [doc["id"] for doc in page["items"]]
+            if not page["has_more"]:
+                return ids
+            cursor = page["next_cursor"]
+
+    assert asyncio.run(scenario()) == ["u3", "u2", "u1", "legacy-c", "legacy-b", "legacy-a"]
@@ -0,0 +1,45 @@
+import asyncio
+import threading
+
+import pytest
+
+from backend.passwords import AsyncPasswordHasher, PasswordServiceBusy
+
+
+class BlockingContext:
+    def __init__(self):
+        self.release = threading.Event()
+
+    def verify(self, plain, hashed):
+        self.release.wait(5)
+        return plain == hashed
+
+    def hash(self, password):
+        return password
+
+
+def test_verify_runs_off_the_event_loop():
+    context = BlockingContext()
+    context.release.set()
+    hasher = AsyncPasswordHasher(context, max_workers=2, max_pending=4)
+    assert asyncio.run(hasher.verify("secret", "secret")) is True
+    assert asyncio.run(hasher.hash("secret")) == "secret"
+    hasher.shutdown()
+
+
+def test_rejects_when_queue_is_full():
+    context = BlockingContext()
+    hasher = AsyncPasswordHasher(context, max_workers=1, max_pending=2)
+
+    async def scenario():
+        first = asyncio.create_task(hasher.verify("a", "a"))
+        second = asyncio.create_task(hasher.verify("b", "b"))
+        await asyncio.sleep(0)
+        with pytest.raises(PasswordServiceBusy):
+            await hasher.verify("c", "c")
+        context.release.set()
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(scenario()) == [True, True]
+    assert hasher.stats()["rejected"] == 1
+    hasher.shutdown()
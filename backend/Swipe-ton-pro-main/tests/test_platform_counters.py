@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from backend.platform_counters import PlatformCounters, counter_value
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+def new_counters():
+    return PlatformCounters(mongomock_motor.AsyncMongoMockClient()["test_database"])
+
+
+async def stored(counters, scope):
+    doc = await counters.collection.find_one({"_id": scope}, {"_id": 0, "updated_at": 0, "reconciled_at": 0})
+    return doc
+
+
+def test_insert_and_delete_move_total_and_dimensions():
+    counters = new_counters()
+    artisan = {"id": "u1", "user_type": "artisan", "status": "active", "is_professional": True}
+
+    async def scenario():
+        await counters.record_insert("users", artisan)
+        # Missing dimensions count under their default value
+        await counters.record_insert("users", {"id": "u2"})
+        after_inserts = await stored(counters, "users")
+        await counters.record_delete("users", artisan)
+        return after_inserts, await stored(counters, "users")
+
+    after_inserts, after_delete = asyncio.run(scenario())
+    assert after_inserts == {
+        "total": 2,
+        "user_type": {"artisan": 1, "particulier": 1},
+        "status": {"active": 2},
+        "is_professional": {"true": 1, "false": 1},
+    }
+    assert after_delete["total"] == 1
+    assert after_delete["user_type"] == {"artisan": 0, "particulier": 1}
+
+
+def test_update_moves_only_the_changed_dimension_bucket():
+    counters = new_counters()
+    before = {"id": "u1", "user_type": "particulier", "status": "active", "is_professional": False}
+
+    async def scenario():
+        await counters.record_insert("users", before)
+        await counters.record_update("users", before, {"status": "suspended", "name": "unchanged dimension"})
+        return await stored(counters, "users")
+
+    doc = asyncio.run(scenario())
+    assert doc["total"] == 1
+    assert doc["status"] == {"active": 0, "suspended": 1}
+    assert doc["user_type"] == {"particulier": 1}
+
+
+def test_reconcile_scope_recounts_from_the_collection():
+    counters = new_counters()
+
+    async def scenario():
+        await counters.db.reports.insert_many([
+            {"id": "r1", "status": "pending"}, {"id": "r2", "status": "resolved"}, {"id": "r3"},
+        ])
+        # Drifted counters are replaced by the recount
+        await counters.record_insert("reports", {"id": "ghost", "status": "resolved"})
+        reconciled = await counters.reconcile_scope("reports")
+        return reconciled, await stored(counters, "reports")
+
+    reconciled, doc = asyncio.run(scenario())
+    assert doc == {"total": 3, "status": {"pending": 2, "resolved": 1}}
+    assert reconciled["_id"] == "reports" and reconciled["total"] == 3
+
+
+def test_counter_value_reads_totals_and_buckets():
+    counters = {"users": {"total": 5, "is_professional": {"true": 2}, "status": {"banned": -1}}}
+
+    assert counter_value(counters, "users") == 5
+    assert counter_value(counters, "users", "is_professional", True) == 2
+    assert counter_value(counters, "users", "status", "active") == 0
+    # Transient negative counts (delete before reconciliation) read as zero
+    assert counter_value(counters, "users", "status", "banned") == 0
+    assert counter_value(counters, "admins") == 0
+
+
+def test_ticket_routes_keep_the_ticket_counters(server):
+    user = server.User(id="u1", email="u1@example.com", name="U1", user_type=server.UserType.PARTICULIER)
+    admin = server.Admin(email="root@example.com", name="Root", password_hash="x", role=server.AdminRole.SUPER_ADMIN)
+    counters = server.platform_counters
+
+    async def scenario():
+        created = await server.create_support_ticket(
+            server.TicketCreate(title="Paiement", description="Refusé", category="billing", priority="urgent"),
+            current_user=user,
+        )
+        await server.create_support_ticket(
+            server.TicketCreate(title="Profil", description="Photo", category="account"), current_user=user)
+        await server.update_ticket(created["ticket_id"], server.TicketUpdate(status="resolved", priority="high"),
+                                   current_admin=admin)
+        incremental = await server.get_platform_stats(current_admin=admin)
+        await counters.reconcile_scope("support_tickets")
+        return incremental, await server.get_platform_stats(current_admin=admin)
+
+    incremental, reconciled = asyncio.run(scenario())
+    for stats in (incremental, reconciled):
+        assert (stats["total_tickets"], stats["open_tickets"], stats["urgent_tickets"]) == (2, 1, 0)
@@ -0,0 +1,162 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from backend.proposals import DuplicateProposal, ProposalStore, _embedded_proposal, migrate_embedded_proposals
+
+CREATED = datetime(2024, 1, 1)
+
+
+class AsyncRows:
+    def __init__(self, rows):
+        self.rows = iter(rows)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self.rows)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class BulkResult:
+    def __init__(self, modified_count):
+        self.modified_count = modified_count
+
+
+class FakeProposals:
+    def __init__(self):
+        self.docs = {}
+        self.batches = []
+
+    async def insert_one(self, doc):
+        key = (doc["project_id"], doc["artisan_id"])
+        if key in self.docs:
+            raise DuplicateKeyError("duplicate")
+        self.docs[key] = doc
+
+    async def insert_many(self, docs, ordered=True):
+        self.batches.append(len(docs))
+        errors = []
+        for index, doc in enumerate(docs):
+            key = (doc["project_id"], doc["artisan_id"])
+            if key in self.docs:
+                errors.append({"index": index, "code": 11000})
+            else:
+                self.docs[key] = doc
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+    def find(self, query, projection=None):
+        ids = set(query["id"]["$in"])
+        return AsyncRows([{"id": doc["id"]} for doc in self.docs.values() if doc["id"] in ids])
+
+    def aggregate(self, pipeline):
+        project_ids = pipeline[0]["$match"]["project_id"]["$in"]
+        rows = {}
+        for doc in self.docs.values():
+            if doc["project_id"] in project_ids:
+                count, best = rows.get(doc["project_id"], (0, None))
+                rows[doc["project_id"]] = (count + 1, doc["price"] if best is None else min(best, doc["price"]))
+        return AsyncRows([{"_id": key, "count": count, "best_price": best} for key, (count, best) in rows.items()])
+
+
+class FakeProjects:
+    def __init__(self, projects=()):
+        self.projects = {project["id"]: project for project in projects}
+        self.updates = []
+
+    async def update_one(self, query, update):
+        self.updates.append((query, update))
+
+    async def update_many(self, query, update):
+        for project in self.projects.values():
+            if project.get("proposals") == []:
+                del project["proposals"]
+
+    def find(self, query, projection=None):
+        return AsyncRows([dict(project) for project in self.projects.values() if project.get("proposals")])
+
+    async def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            update = op._doc
+            project = self.projects.get(op._filter.get("id")) or next(
+                project for project in self.projects.values() if project["_id"] == op._filter["_id"])
+            if "$set" in update:
+                project.update(update["$set"])
+            elif len(project.get("proposals", [])) == op._filter["proposals"]["$size"]:
+                del project["proposals"]
+        return BulkResult(len(ops))
+
+
+class FakeDB:
+    def __init__(self, projects=()):
+        self.proposals = FakeProposals()
+        self.projects = FakeProjects(projects)
+
+
+def test_second_proposal_of_an_artisan_is_rejected():
+    db = FakeDB()
+    store = ProposalStore(db)
+
+    async def scenario():
+        await store.submit("p1", "a1", 120.0, "Disponible lundi")
+        with pytest.raises(DuplicateProposal):
+            await store.submit("p1", "a1", 90.0, "Moins cher")
+
+    asyncio.run(scenario())
+    # One totals update, for the accepted proposal only
+    [(query, update)] = db.projects.updates
+    assert query == {"id": "p1"}
+    assert update[0]["$set"]["best_price"] == {"$min": ["$best_price", 120.0]}
+
+
+def test_embedded_proposal_ids_are_stable_across_runs():
+    project = {"id": "p1", "created_at": CREATED}
+    first = _embedded_proposal(project, 0, {"user_id": "a1", "amount": 80})
+    again = _embedded_proposal(project, 0, {"user_id": "a1", "amount": 80})
+
+    assert first == again
+    assert (first["artisan_id"], first["price"], first["created_at"]) == ("a1", 80, CREATED)
+
+
+def test_migration_moves_embedded_proposals_in_batches():
+    projects = [
+        {"_id": i, "id": f"p{i}", "created_at": CREATED,
+         "proposals": [{"artisan_id": f"a{j}", "price": 100 + i * 10 + j} for j in range(3)]}
+        for i in range(3)
+    ] + [{"_id": 9, "id": "p9", "proposals": []}]
+    db = FakeDB(projects)
+
+    totals = asyncio.run(migrate_embedded_proposals(db, batch_size=5))
+    rerun = asyncio.run(migrate_embedded_proposals(db, batch_size=5))
+
+    assert totals == {"projects": 3, "proposals": 9, "duplicates": 0, "unmigrated": 0, "kept_projects": 0}
+    assert rerun == {"projects": 0, "proposals": 0, "duplicates": 0, "unmigrated": 0, "kept_projects": 0}
+    assert db.proposals.batches == [6, 3]
+    assert all("proposals" not in project for project in db.projects.projects.values())
+    assert (db.projects.projects["p2"]["proposal_count"], db.projects.projects["p2"]["best_price"]) == (3, 120)
+
+
+def test_migration_keeps_arrays_with_colliding_proposals():
+    projects = [
+        {"_id": 1, "id": "p1", "created_at": CREATED, "proposals": [
+            {"artisan_id": "a1", "price": 100}, {"artisan_id": "a1", "price": 90}]},
+        {"_id": 2, "id": "p2", "created_at": CREATED, "proposals": [{"price": 80}, {"price": 70}]},
+        {"_id": 3, "id": "p3", "created_at": CREATED, "proposals": [{"artisan_id": "a1", "price": 60}]},
+    ]
+    db = FakeDB(projects)
+
+    totals = asyncio.run(migrate_embedded_proposals(db))
+    rerun = asyncio.run(migrate_embedded_proposals(db))
+
+    assert totals == {"projects": 1, "proposals": 3, "duplicates": 0, "unmigrated": 2, "kept_projects": 2}
+    # The moved proposals are recognized by id, the colliding ones are still not moved
+    assert rerun == {"projects": 0, "proposals": 0, "duplicates": 2, "unmigrated": 2, "kept_projects": 2}
+    assert len(db.projects.projects["p1"]["proposals"]) == 2
+    assert len(db.projects.projects["p2"]["proposals"]) == 2
+    assert "proposals" not in db.projects.projects["p3"]
@@ -0,0 +1,68 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.ranking import DEFAULT_WEIGHTS, load_weights, rank, score_python
+
+NOW = datetime(2024, 6, 1)
+CENTER = (2.35, 48.85)
+
+
+def make_candidates(n, seed=7):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"a{i:04d}",
+            "rating": None if i % 11 == 0 else round(rng.uniform(0, 5), 1),
+            "verified": rng.random() < 0.3,
+            "geo": None if i % 13 == 0 else {
+                "type": "Point", "coordinates": [CENTER[0] + rng.uniform(-1, 1), CENTER[1] + rng.uniform(-1, 1)]},
+            "profile_data": {"experience_years": rng.randint(0, 40)},
+            "created_at": NOW - timedelta(days=rng.uniform(0, 400)),
+        }
+        for i in range(n)
+    ]
+
+
+def test_vectorized_scores_match_reference_scorer():
+    docs = make_candidates(500)
+    boosted = {"a0003", "a0042"}
+    affinity = {"a0007": 1.0, "a0100": 0.25}
+    expected = {doc["id"]: score_python(doc, DEFAULT_WEIGHTS, CENTER, boosted, NOW, affinity) for doc in docs}
+
+    ranked = rank(docs, DEFAULT_WEIGHTS, CENTER, boosted, NOW, affinity)
+
+    assert len(ranked) == 500
+    for doc in ranked:
+        assert doc["score"] == pytest.approx(expected[doc["id"]], abs=1e-5)
+    assert ranked == sorted(ranked, key=lambda doc: (-doc["score"], doc["id"]))
+
+
+def test_boost_weight_lifts_boosted_candidate_to_the_top():
+    docs = make_candidates(50)
+    weights = load_weights({"boost": 10.0})
+    assert rank(docs, weights, CENTER, {"a0020"}, NOW)[0]["id"] == "a0020"
+
+
+def test_unknown_weight_is_rejected():
+    with pytest.raises(ValueError):
+        load_weights({"popularity": 1.0})
+
+
+def test_rank_leaves_its_input_untouched():
+    docs = make_candidates(20)
+    before = [dict(doc) for doc in docs]
+
+    ranked = rank(docs, DEFAULT_WEIGHTS, CENTER, None, NOW)
+
+    assert docs == before
+    assert all("score" in doc for doc in ranked)
+
+
+def test_partial_weights_keep_the_other_defaults():
+    docs = make_candidates(50)
+    weights = {**DEFAULT_WEIGHTS, "boost": 10.0}
+
+    assert rank(docs, {"boost": 10.0}, CENTER, {"a0020"}, NOW) == rank(docs, weights, CENTER, {"a0020"}, NOW)
+    assert score_python(docs[0], {"boost": 10.0}, CENTER, now=NOW) == score_python(docs[0], weights, CENTER, now=NOW)
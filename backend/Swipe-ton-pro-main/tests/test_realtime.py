@@ -0,0 +1,73 @@
+import asyncio
+
+from backend.realtime import ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.received = []
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, message):
+        if self.fail:
+            raise RuntimeError("connection reset")
+        await asyncio.sleep(self.delay)
+        self.received.append(message)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def test_slow_client_does_not_delay_others():
+    manager = ConnectionManager(max_queue=10, send_timeout=0.05)
+    fast, slow = FakeWebSocket(), FakeWebSocket(delay=1)
+
+    async def scenario():
+        await manager.connect("fast", fast)
+        await manager.connect("slow", slow)
+        report = await manager.broadcast({"type": "ping"})
+        await asyncio.sleep(0.01)
+        return report
+
+    report = asyncio.run(scenario())
+    assert fast.received == [{"type": "ping"}]
+    assert report["delivered"] == 1
+    assert report["failed"] == 1
+    assert "slow" not in manager.active_connections
+    assert slow.closed_with == 1013
+    assert manager.evicted["timeout"] == 1
+
+
+def test_dead_socket_is_evicted_without_breaking_delivery():
+    manager = ConnectionManager()
+    dead, alive = FakeWebSocket(fail=True), FakeWebSocket()
+
+    async def scenario():
+        await manager.connect("user", dead)
+        await manager.connect("user", alive)
+        await manager.send_personal_message("user", {"n": 1})
+        await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    assert alive.received == [{"n": 1}]
+    assert [c.websocket for c in manager.active_connections["user"]] == [alive]
+
+
+def test_queue_overflow_evicts_connection():
+    manager = ConnectionManager(max_queue=2, send_timeout=5)
+    slow = FakeWebSocket(delay=1)
+
+    async def scenario():
+        await manager.connect("user", slow)
+        for i in range(4):
+            await manager.send_personal_message("user", {"n": i})
+        await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    assert manager.evicted["queue_full"] == 1
+    assert "user" not in manager.active_connections
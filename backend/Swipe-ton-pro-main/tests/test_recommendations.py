@@ -0,0 +1,111 @@
+import asyncio
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from backend.recommendations import InteractionMatrix, RecommendationJob, affinity_scores, top_n, truncated_svd
+
+
+def dense(matrix):
+    out = np.zeros(matrix.shape)
+    out[matrix.rows, matrix.cols] = matrix.values
+    return out
+
+
+def test_duplicate_interactions_are_summed():
+    matrix = InteractionMatrix.from_triples(["u2", "u1", "u2"], ["a1", "a2", "a1"], [1.0, -0.5, 2.0])
+
+    assert list(matrix.user_ids) == ["u1", "u2"] and list(matrix.artisan_ids) == ["a1", "a2"]
+    assert dense(matrix).tolist() == [[0.0, -0.5], [3.0, 0.0]]
+
+
+def test_known_artisan_ids_drop_unknown_artisans():
+    matrix = InteractionMatrix.from_triples(["u1", "u1"], ["a2", "new"], [1.0, 1.0],
+                                            artisan_ids=np.array(["a1", "a2"], dtype=object))
+
+    assert dense(matrix).tolist() == [[0.0, 1.0]]
+
+
+def test_sparse_products_match_dense():
+    rng = np.random.default_rng(3)
+    users = [f"u{i}" for i in rng.integers(0, 20, 200)]
+    artisans = [f"a{i}" for i in rng.integers(0, 15, 200)]
+    matrix = InteractionMatrix.from_triples(users, artisans, rng.standard_normal(200))
+    factors = rng.standard_normal((15, 4))
+
+    assert matrix.matmul(factors) == pytest.approx(dense(matrix) @ factors)
+    assert matrix.rmatmul(np.ones((20, 2))) == pytest.approx(dense(matrix).T @ np.ones((20, 2)))
+
+
+def test_truncated_svd_recovers_a_low_rank_matrix():
+    rng = np.random.default_rng(5)
+    low_rank = rng.standard_normal((30, 3)) @ rng.standard_normal((3, 25))
+    rows, cols = np.nonzero(np.ones_like(low_rank))
+    matrix = InteractionMatrix.from_triples([f"u{r:02d}" for r in rows], [f"a{c:02d}" for c in cols],
+                                            low_rank[rows, cols])
+
+    u, sigma, v = truncated_svd(matrix, 3)
+
+    assert (u * sigma) @ v.T == pytest.approx(low_rank, abs=1e-8)
+
+
+def test_top_n_skips_artisans_already_interacted_with():
+    # Two taste groups: u0/u1 like a0-a2, u2 likes a3-a4
+    matrix = InteractionMatrix.from_triples(
+        ["u0", "u0", "u1", "u1", "u1", "u2", "u2"],
+        ["a0", "a1", "a0", "a1", "a2", "a3", "a4"],
+        [1.0] * 7,
+    )
+    _, _, v = truncated_svd(matrix, 2)
+
+    recommended = {matrix.user_ids[row]: list(matrix.artisan_ids[artisans]) for row, artisans, _ in top_n(matrix, v, 3)}
+
+    assert recommended["u0"] == ["a2"]
+    assert recommended["u1"] == [] and recommended["u2"] == []
+
+
+def test_affinity_decreases_with_position():
+    assert affinity_scores(["a", "b", "c", "d"]) == {"a": 1.0, "b": 0.75, "c": 0.5, "d": 0.25}
+
+
+async def seed_swipes(db, swipes):
+    artisans = sorted({artisan_id for _, artisan_id in swipes})
+    await db.users.insert_many([{"id": artisan_id, "user_type": "artisan"} for artisan_id in artisans])
+    await db.swipes.insert_many([
+        {"user_id": user_id, "target_id": artisan_id, "direction": "right", "created_at": datetime.utcnow()}
+        for user_id, artisan_id in swipes
+    ])
+
+
+def test_full_run_drops_lists_of_the_previous_model():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["test_database"]
+
+    async def scenario():
+        await seed_swipes(db, [("u0", "a0"), ("u0", "a1"), ("u1", "a0")])
+        # A particulier whose swipes were deleted since the previous run
+        await db.recommendations.insert_one({"user_id": "gone", "artisan_ids": ["a0"], "model_id": "old"})
+        await RecommendationJob(db, factors=2).run(full=True)
+        return {doc["user_id"] async for doc in db.recommendations.find({})}
+
+    assert asyncio.run(scenario()) == {"u0", "u1"}
+
+
+def test_incremental_run_drops_lists_with_nothing_left_to_fold_in():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["test_database"]
+
+    async def scenario():
+        await seed_swipes(db, [("u0", "a0"), ("u0", "a1"), ("u1", "a0")])
+        job = RecommendationJob(db, factors=2)
+        await job.run(full=True)
+        # u1's only swipe is gone and they swiped an artisan the model does not know yet
+        await db.swipes.delete_many({"user_id": "u1"})
+        await seed_swipes(db, [("u1", "new")])
+        result = await job.run()
+        return result, {doc["user_id"] async for doc in db.recommendations.find({})}
+
+    result, users = asyncio.run(scenario())
+    assert result["mode"] == "incremental" and result["changed_users"] == 2
+    assert users == {"u0"}
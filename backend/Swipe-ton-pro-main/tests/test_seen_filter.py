@@ -0,0 +1,78 @@
+import asyncio
+
+from backend.seen_filter import SeenFilter, SeenSetStore
+
+
+def test_no_false_negatives_and_bounded_false_positives():
+    seen = SeenFilter(error_rate=0.01, initial_capacity=500)
+    swiped = [f"artisan-{i}" for i in range(5000)]
+    seen.update(swiped)
+
+    assert all(target in seen for target in swiped)
+    assert len(seen.layers) == 4
+    false_positives = sum(f"other-{i}" in seen for i in range(20000))
+    assert false_positives / 20000 < 0.01
+
+
+def test_filter_round_trips_through_its_document():
+    seen = SeenFilter(error_rate=0.01, initial_capacity=10)
+    seen.update(f"a{i}" for i in range(25))
+    seen.version = 3
+
+    restored = SeenFilter.from_document({**seen.to_document(), "version": 3})
+
+    assert all(f"a{i}" in restored for i in range(25))
+    assert restored.memory_bytes == seen.memory_bytes
+    assert len(restored) == len(seen)
+    assert not restored.add("a3")
+
+
+class UpdateResult:
+    def __init__(self, matched_count, upserted_id=None):
+        self.matched_count = matched_count
+        self.upserted_id = upserted_id
+
+
+class FlakySeenFilters:
+    """seen_filters collection whose first `failures` writes raise"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.docs = {}
+
+    async def find_one(self, query, projection=None):
+        return self.docs.get(query["user_id"])
+
+    async def update_one(self, query, update, upsert=False):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("primary stepped down")
+        self.docs[query["user_id"]] = {**update["$set"], "user_id": query["user_id"]}
+        return UpdateResult(1)
+
+
+class NoSwipes:
+    async def distinct(self, key, query):
+        return []
+
+
+class FakeDB:
+    def __init__(self, failures):
+        self.seen_filters = FlakySeenFilters(failures)
+        self.swipes = NoSwipes()
+
+
+def test_failed_flush_keeps_the_user_dirty_for_the_next_one():
+    db = FakeDB(failures=1)
+    store = SeenSetStore(db, initial_capacity=10)
+
+    async def scenario():
+        store.mark("u1", ["a1", "a2"])
+        await store.flush()
+        assert store.stats()["dirty_users"] == 1
+        await store.flush()
+
+    asyncio.run(scenario())
+    assert store.stats()["dirty_users"] == 0
+    saved = SeenFilter.from_document(db.seen_filters.docs["u1"])
+    assert "a1" in saved and "a2" in saved
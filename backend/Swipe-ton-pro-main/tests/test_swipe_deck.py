@@ -0,0 +1,28 @@
+from backend.swipe_deck import after_deck_cursor, after_ranked, candidate_query, up_to_deck_position
+
+
+def test_candidate_query_excludes_seen_and_blocked():
+    query = candidate_query("plomberie", "Lyon", {"a2", "a1"}, viewer_id="p1")
+    assert query == {
+        "user_type": "artisan",
+        "status": "active",
+        "categories": "plomberie",
+        "location.city": "Lyon",
+        "id": {"$nin": ["a1", "a2"]},
+        "blocked_users": {"$ne": "p1"},
+    }
+
+
+def test_deck_cursor_after_unrated_artisan_stays_in_unrated_tail():
+    query = after_deck_cursor({"user_type": "artisan"}, {"r": None, "i": "a9"})
+    assert query["$and"][1] == {"rating": None, "id": {"$gt": "a9"}}
+
+
+def test_pool_upper_bound_includes_every_rated_artisan_before_unrated_end():
+    query = up_to_deck_position({}, {"r": None, "i": "a9"})
+    assert query["$and"][1] == {"$or": [{"rating": {"$ne": None}}, {"rating": None, "id": {"$lte": "a9"}}]}
+
+
+def test_ranked_page_resumes_after_score_and_id():
+    cards = [{"id": "a", "score": 0.9}, {"id": "b", "score": 0.7}, {"id": "c", "score": 0.7}, {"id": "d", "score": 0.5}]
+    assert [card["id"] for card in after_ranked(cards, 0.7, "b")] == ["c", "d"]
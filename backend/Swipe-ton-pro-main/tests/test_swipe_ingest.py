@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from backend.swipe_ingest import SwipeIngestor, SwipeQuotaExceeded
+
+
+class FakeCollection:
+    def __init__(self):
+        self.batches = []
+        self.bulk = []
+
+    async def insert_many(self, docs, ordered=True):
+        self.batches.append(list(docs))
+
+    async def find_one(self, query, projection=None):
+        return None
+
+    async def bulk_write(self, ops, ordered=True):
+        self.bulk.append(ops)
+
+
+class FakeDB:
+    def __init__(self):
+        self.swipes = FakeCollection()
+        self.swipe_quotas = FakeCollection()
+
+
+class FakeSeenStore:
+    def __init__(self):
+        self.added = {}
+
+    def mark(self, user_id, target_ids):
+        self.added.setdefault(user_id, []).extend(target_ids)
+
+
+def swipes(*targets):
+    return [{"target_id": target, "direction": "right"} for target in targets]
+
+
+def test_swipes_are_written_in_batches_with_seen_and_quota_updates():
+    db, seen = FakeDB(), FakeSeenStore()
+    ingestor = SwipeIngestor(db, seen, batch_size=4, flush_interval=10)
+
+    async def scenario():
+        ingestor.start()
+        await ingestor.submit("u1", swipes("a1", "a2", "a3"))
+        await ingestor.submit("u2", swipes("a1", "a4"))
+        await ingestor.stop()
+
+    asyncio.run(scenario())
+    assert [len(batch) for batch in db.swipes.batches] == [4, 1]
+    assert seen.added == {"u1": ["a1", "a2", "a3"], "u2": ["a1", "a4"]}
+    increments = sorted((op._filter["user_id"], op._doc["$inc"]["count"]) for ops in db.swipe_quotas.bulk for op in ops)
+    assert increments == [("u1", 3), ("u2", 1), ("u2", 1)]
+
+
+def test_daily_quota_counts_queued_swipes():
+    ingestor = SwipeIngestor(FakeDB(), FakeSeenStore(), daily_limit=3, flush_interval=10)
+
+    async def scenario():
+        ingestor.start()
+        await ingestor.submit("u1", swipes("a1", "a2"))
+        try:
+            with pytest.raises(SwipeQuotaExceeded):
+                await ingestor.submit("u1", swipes("a3", "a4"))
+            await ingestor.submit("u1", swipes("a3"))
+        finally:
+            await ingestor.stop()
+
+    asyncio.run(scenario())
+    assert ingestor.stats()["written"] == 3
+
+
+def test_durable_mode_acknowledges_after_the_write():
+    db = FakeDB()
+    ingestor = SwipeIngestor(db, FakeSeenStore(), durability="durable", flush_interval=0.01)
+
+    async def scenario():
+        ingestor.start()
+        ack = await ingestor.submit("u1", swipes("a1"))
+        written = len(db.swipes.batches)
+        await ingestor.stop()
+        return ack, written
+
+    ack, written = asyncio.run(scenario())
+    assert ack["durable"] and written == 1
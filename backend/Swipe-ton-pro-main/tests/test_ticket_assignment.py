@@ -0,0 +1,141 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from backend.ticket_assignment import TicketAssigner
+
+T0 = datetime(2024, 6, 1, 12, 0)
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield dict(doc)
+
+
+class FakeTickets:
+    def __init__(self, tickets):
+        self.tickets = {ticket["id"]: ticket for ticket in tickets}
+
+    def find(self, query, projection=None):
+        return FakeCursor([ticket for ticket in self.tickets.values()
+                           if ticket["status"] == "open" and ticket.get("assigned_to") is None])
+
+    def aggregate(self, pipeline):
+        match = pipeline[0]["$match"]
+        counts = {}
+        for ticket in self.tickets.values():
+            if ticket["status"] in match["status"]["$in"] and ticket.get("assigned_to") in match["assigned_to"]["$in"]:
+                counts[ticket["assigned_to"]] = counts.get(ticket["assigned_to"], 0) + 1
+        return FakeCursor([{"_id": admin_id, "count": count} for admin_id, count in counts.items()])
+
+    async def find_one_and_update(self, query, update, projection=None):
+        ticket = self.tickets.get(query["id"])
+        if ticket is None or ticket["status"] != "open" or ticket.get("assigned_to") is not None:
+            return None
+        ticket.update(update["$set"])
+        return {"_id": ticket["id"]}
+
+
+class FakeAdmins:
+    def __init__(self, admin_ids):
+        self.admin_ids = admin_ids
+
+    def find(self, query, projection=None):
+        return FakeCursor([{"id": admin_id} for admin_id in self.admin_ids])
+
+
+def ticket(ticket_id, priority, minutes_ago, status="open", assigned_to=None):
+    return {"id": ticket_id, "priority": priority, "created_at": T0 - timedelta(minutes=minutes_ago),
+            "status": status, "assigned_to": assigned_to}
+
+
+def assign_all(assigner):
+    async def scenario():
+        await assigner.sync()
+        assigned = []
+        while True:
+            result = await assigner.assign_next()
+            if result is None:
+                return assigned
+            assigned.append(result)
+
+    return asyncio.run(scenario())
+
+
+def test_most_urgent_oldest_ticket_goes_to_the_least_loaded_admin():
+    tickets = FakeTickets([
+        ticket("t-low", "low", 60),
+        ticket("t-urgent", "urgent", 1),
+        ticket("t-high-new", "high", 5),
+        ticket("t-high-old", "high", 30),
+        ticket("t-busy", "medium", 90, status="in_progress", assigned_to="alice"),
+    ])
+    assigner = TicketAssigner(tickets, FakeAdmins(["alice", "bob"]), clock=lambda: T0)
+
+    assert assign_all(assigner) == [
+        ("t-urgent", "bob"), ("t-high-old", "alice"), ("t-high-new", "bob"), ("t-low", "alice"),
+    ]
+    assert assigner.loads == {"alice": 3, "bob": 2}
+
+
+def test_ticket_claimed_elsewhere_is_skipped():
+    tickets = FakeTickets([ticket("t1", "high", 10), ticket("t2", "low", 10)])
+    assigner = TicketAssigner(tickets, FakeAdmins(["alice"]), clock=lambda: T0)
+
+    async def scenario():
+        await assigner.sync()
+        # Another worker assigns t1 between our sync and our claim
+        tickets.tickets["t1"]["assigned_to"] = "bob"
+        return await assigner.assign_next()
+
+    assert asyncio.run(scenario()) == ("t2", "alice")
+    assert assigner.stats()["lost_claims"] == 1
+
+
+def test_released_ticket_lowers_the_admin_load():
+    tickets = FakeTickets([ticket("t1", "high", 10, assigned_to="alice"), ticket("t2", "high", 5)])
+    assigner = TicketAssigner(tickets, FakeAdmins(["alice", "bob"]), clock=lambda: T0)
+
+    async def scenario():
+        await assigner.sync()
+        assigner.ticket_assigned("bob")
+        assigner.ticket_released("alice")
+        return await assigner.assign_next()
+
+    assert asyncio.run(scenario()) == ("t2", "alice")
+    assert assigner.loads == {"alice": 1, "bob": 1}
+
+
+def test_ticket_without_creation_date_is_queued_first():
+    undated = ticket("t-undated", "high", 0)
+    del undated["created_at"]
+    tickets = FakeTickets([ticket("t-old", "high", 30), undated, ticket("t-urgent", "urgent", 1)])
+    assigner = TicketAssigner(tickets, FakeAdmins(["alice"]), clock=lambda: T0)
+
+    assert [ticket_id for ticket_id, _ in assign_all(assigner)] == ["t-urgent", "t-undated", "t-old"]
+
+
+def test_created_ticket_is_queued_without_waiting_for_a_sync(server):
+    user = server.User(id="u1", email="u1@example.com", name="U1", user_type=server.UserType.PARTICULIER)
+    assigner = server.ticket_assigner
+
+    async def scenario():
+        await server.db.admins.insert_one({"id": "alice", "role": "support", "is_active": True,
+                                           "permissions": ["respond_tickets"]})
+        await assigner.sync()
+        created = await server.create_support_ticket(
+            server.TicketCreate(title="Paiement", description="Refusé", category="billing", priority="urgent"),
+            current_user=user,
+        )
+        queued = assigner.stats()["queued"]
+        return created["ticket_id"], queued, await assigner.assign_next()
+
+    ticket_id, queued, assigned = asyncio.run(scenario())
+    assert queued == 1 and assigned == (ticket_id, "alice")
+    assert assigner.stats()["syncs"] == 1
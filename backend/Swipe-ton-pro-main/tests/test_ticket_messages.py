@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from backend.ticket_messages import (
+    PREVIEW_LENGTH, TicketMessageStore, _embedded_message, message_preview, migrate_embedded_messages,
+)
+
+
+class FakeCollection:
+    def __init__(self):
+        self.inserted = []
+        self.updates = []
+
+    async def insert_one(self, doc):
+        self.inserted.append(doc)
+
+    async def update_one(self, query, update):
+        self.updates.append((query, update))
+
+
+class FakeDB:
+    def __init__(self):
+        self.ticket_messages = FakeCollection()
+        self.support_tickets = FakeCollection()
+
+
+def test_message_is_stored_apart_and_summarized_on_the_ticket():
+    db = FakeDB()
+    store = TicketMessageStore(db)
+
+    message = asyncio.run(store.add("t1", "Bonjour", "adm1", "admin", sender_name="Alice"))
+
+    assert db.ticket_messages.inserted == [message]
+    [(query, update)] = db.support_tickets.updates
+    assert query == {"id": "t1"}
+    assert update["$inc"] == {"message_count": 1}
+    assert update["$set"]["last_message"]["message"] == "Bonjour"
+    assert update["$set"]["last_message"]["sender_name"] == "Alice"
+
+
+def test_preview_is_truncated():
+    preview = message_preview({"id": "m1", "message": "x" * 500, "created_at": datetime(2024, 1, 1)})
+
+    assert len(preview["message"]) == PREVIEW_LENGTH and preview["message"].endswith("…")
+
+
+def test_embedded_message_ids_are_stable_across_runs():
+    ticket = {"id": "t1", "created_at": datetime(2024, 1, 1)}
+    first = _embedded_message(ticket, 3, {"message": "Bonjour", "sender_type": "user"})
+
+    assert first == _embedded_message(ticket, 3, {"message": "Bonjour", "sender_type": "user"})
+    assert first["ticket_id"] == "t1" and first["created_at"] == ticket["created_at"]
+
+
+def test_migration_keeps_arrays_with_colliding_messages():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["test_database"]
+    created = datetime(2024, 1, 1)
+
+    async def scenario():
+        await db.ticket_messages.create_index("id", unique=True)
+        await db.support_tickets.insert_many([
+            {"id": "t1", "created_at": created, "messages": [{"id": "m1", "message": "Bonjour"}]},
+            # m1 was copied from t1 when this ticket was split off
+            {"id": "t2", "created_at": created, "messages": [{"id": "m1", "message": "Bonjour"},
+                                                               {"message": "Toujours en panne"}]},
+            {"id": "t3", "created_at": created, "messages": [{"message": "Merci"}]},
+        ])
+        totals = await migrate_embedded_messages(db)
+        rerun = await migrate_embedded_messages(db)
+        tickets = {ticket["id"]: ticket async for ticket in db.support_tickets.find({})}
+        return totals, rerun, tickets
+
+    totals, rerun, tickets = asyncio.run(scenario())
+
+    assert totals == {"tickets": 2, "messages": 3, "duplicates": 0, "unmigrated": 1, "kept_tickets": 1}
+    # t2's own message is recognized as moved, the copied one is still not moved
+    assert rerun == {"tickets": 0, "messages": 0, "duplicates": 1, "unmigrated": 1, "kept_tickets": 1}
+    assert len(tickets["t2"]["messages"]) == 2
+    assert "messages" not in tickets["t1"] and "messages" not in tickets["t3"]
+    assert tickets["t2"]["message_count"] == 1
@@ -0,0 +1,169 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+
+def bearer(token):
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+async def add_user(server, user_id, status="active", user_type="particulier", password="secret123"):
+    await server.db.users.insert_one({
+        "id": user_id, "email": f"{user_id}@example.com", "name": user_id, "user_type": user_type,
+        "status": status, "password_hash": await server.get_password_hash(password),
+    })
+
+
+def test_login_token_resolves_to_the_user(server):
+    async def scenario():
+        await add_user(server, "u1")
+        token = await server.user_login(server.UserLogin(email="u1@example.com", password="secret123"))
+        return await server.get_current_user(bearer(token["access_token"]))
+
+    user = asyncio.run(scenario())
+    assert user.id == "u1" and user.user_type == server.UserType.PARTICULIER
+
+
+def test_wrong_password_is_rejected(server):
+    async def scenario():
+        await add_user(server, "u1")
+        await server.user_login(server.UserLogin(email="u1@example.com", password="wrong"))
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(scenario())
+    assert exc.value.status_code == 401
+
+
+def test_admin_token_is_not_a_user_token(server):
+    token = server.create_access_token({"sub": "u1"}, timedelta(minutes=5))
+
+    async def scenario():
+        await add_user(server, "u1")
+        await server.get_current_user(bearer(token))
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(scenario())
+    assert exc.value.status_code == 401
+
+
+def test_user_token_is_not_an_admin_token(server):
+    token = server.create_access_token({"sub": "u1", "scope": server.USER_TOKEN_SCOPE}, timedelta(minutes=5))
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(server.get_current_admin(bearer(token)))
+    assert exc.value.status_code == 401
+
+
+def test_suspended_user_is_refused_after_the_token_was_issued(server):
+    async def scenario():
+        await add_user(server, "u1")
+        token = await server.user_login(server.UserLogin(email="u1@example.com", password="secret123"))
+        await server.db.users.update_one({"id": "u1"}, {"$set": {"status": "suspended"}})
+        await server.get_current_user(bearer(token["access_token"]))
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(scenario())
+    assert exc.value.status_code == 403
+
+
+def test_artisan_has_no_swipe_deck(server):
+    async def scenario():
+        await add_user(server, "a1", user_type="artisan")
+        token = server.create_access_token({"sub": "a1", "scope": server.USER_TOKEN_SCOPE}, timedelta(minutes=5))
+        artisan = await server.get_current_user(bearer(token))
+        await server.get_swipe_deck(current_user=artisan)
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(scenario())
+    assert exc.value.status_code == 403
+
+
+def test_swipes_are_attributed_to_the_token_holder(server):
+    async def scenario():
+        await add_user(server, "u1")
+        token = server.create_access_token({"sub": "u1", "scope": server.USER_TOKEN_SCOPE}, timedelta(minutes=5))
+        user = await server.get_current_user(bearer(token))
+        # The swiping user is the token holder, so swiping on u1 is a self-swipe
+        await server.create_swipe(server.SwipeTarget(target_id="u1", direction="right"), current_user=user)
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(scenario())
+    assert exc.value.status_code == 400
+
+
+def test_match_is_unlocked_for_the_token_holder(server, monkeypatch):
+    calls = []
+
+    async def unlock(match_id, user_id, idempotency_key):
+        calls.append((match_id, user_id, idempotency_key))
+        return {"unlocked": True}
+
+    monkeypatch.setattr(server.match_unlocker, "unlock", unlock)
+
+    async def scenario():
+        await add_user(server, "a1", user_type="artisan")
+        token = server.create_access_token({"sub": "a1", "scope": server.USER_TOKEN_SCOPE}, timedelta(minutes=5))
+        artisan = await server.get_current_user(bearer(token))
+        return await server.unlock_match("m1", server.MatchUnlock(), "key-12345678", current_user=artisan)
+
+    assert asyncio.run(scenario()) == {"unlocked": True}
+    assert calls == [("m1", "a1", "key-12345678")]
+
+
+def test_project_is_published_for_the_token_holder(server):
+    testclient = pytest.importorskip("fastapi.testclient")
+    api = testclient.TestClient(server.app)
+    asyncio.run(add_user(server, "u1"))
+    asyncio.run(add_user(server, "a1", user_type="artisan"))
+    project = {"user_id": "someone-else", "title": "Fuite", "description": "Sous l'évier", "category": "plomberie"}
+
+    def publish(user_id):
+        token = server.create_access_token({"sub": user_id, "scope": server.USER_TOKEN_SCOPE}, timedelta(minutes=5))
+        return api.post("/api/projects", json=project, headers={"Authorization": f"Bearer {token}"})
+
+    assert api.post("/api/projects", json=project).status_code in (401, 403)
+    assert publish("a1").status_code == 403
+    response = publish("u1")
+    assert response.status_code == 200, response.text
+    stored = asyncio.run(server.db.projects.find_one({"id": response.json()["id"]}))
+    assert stored["user_id"] == "u1"
+    assert asyncio.run(server.db.users.find_one({"id": "u1"}))["total_projects"] == 1
+
+
+def test_proposals_are_sent_and_read_by_the_token_holders(server):
+    testclient = pytest.importorskip("fastapi.testclient")
+    api = testclient.TestClient(server.app)
+
+    async def seed():
+        for user_id, user_type in (("u1", "particulier"), ("u2", "particulier"), ("a1", "artisan"), ("a2", "artisan")):
+            await add_user(server, user_id, user_type=user_type)
+        await server.db.projects.insert_one({"id": "p1", "user_id": "u1", "title": "Fuite", "status": "open"})
+
+    def headers(user_id):
+        token = server.create_access_token({"sub": user_id, "scope": server.USER_TOKEN_SCOPE}, timedelta(minutes=5))
+        return {"Authorization": f"Bearer {token}"}
+
+    asyncio.run(seed())
+    quote = {"artisan_id": "a2", "price": 120.0, "message": "Disponible lundi"}
+
+    assert api.post("/api/projects/p1/proposals", json=quote).status_code in (401, 403)
+    assert api.post("/api/projects/p1/proposals", json=quote, headers=headers("u2")).status_code == 403
+    sent = api.post("/api/projects/p1/proposals", json=quote, headers=headers("a1"))
+    assert sent.status_code == 200, sent.text
+    assert sent.json()["artisan_id"] == "a1"
+    assert api.post("/api/projects/p1/proposals", json={**quote, "price": 90.0}, headers=headers("a2")).status_code == 200
+
+    def read(user_id=None):
+        return api.get("/api/projects/p1/proposals", headers=headers(user_id) if user_id else None)
+
+    assert read().status_code in (401, 403)
+    assert read("u2").status_code == 403
+    owner = read("u1").json()
+    assert sorted(proposal["artisan_id"] for proposal in owner["proposals"]) == ["a1", "a2"]
+    assert owner["best_price"] == 90.0
+    artisan = read("a1").json()
+    assert [proposal["artisan_id"] for proposal in artisan["proposals"]] == ["a1"]
+    assert "best_price" not in artisan